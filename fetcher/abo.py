@@ -1,17 +1,93 @@
-from datasource import DataSource
+from datasource import AsyncDataSource, DataSource, add_async_args, add_cache_args, async_kwargs, cache_kwargs
 
+import asyncio
+import functools
 import json
 import logging
 import os
 import shutil
-import tqdm
 
+import catalog
+import profiling
 import utils
 
 PROJECT_ID = "ABO"
 SOURCE_ID = "iiif.onb.ac.at"
 IIIF_MANIFEST_URL = f"https://{SOURCE_ID}" + "/presentation/{project}/{id}/manifest"
 
+MANIFEST_CACHE_SIZE = 64
+
+@functools.lru_cache(maxsize=MANIFEST_CACHE_SIZE)
+def load_manifest_index(manifest_path: str) -> dict:
+    """
+    Load a stored ABO manifest once and index its canvases by label.
+    Results are memoized per manifest path, keeping the most recently used titles.
+
+    :param manifest_path: Path to the manifest.json file
+    :return: Dict with the manifest 'title_full' and a 'canvases' map of label to (remote text URL, image URL)
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+
+    canvases = {}
+    for sequence in manifest['sequences']:
+        for canvas in sequence['canvases']:
+            remote_path = None
+            image_url = None
+            for content in canvas.get('otherContent', []):
+                for resource in content.get('resources', []):
+                    if resource['resource']['format'] == 'text/plain':
+                        remote_path = resource['resource']['@id']
+                        break
+            for image in canvas['images']:
+                original_image_url = image['resource']['@id']
+                image_url = original_image_url.replace('/full/full/', '/full/,2400/')
+                break
+            canvases[canvas['label']] = (remote_path, image_url)
+
+    return {
+        'title_full': manifest['label'],
+        'canvases': canvases,
+    }
+
+def save_manifest(manifest: dict, output_dir: str, item_id: str):
+    """
+    Store a fetched manifest as json/manifest.json in the item directory.
+    :raises ValueError: if ABO answered with an error message instead of a manifest; the item directory is removed
+    """
+    if "sequences" not in manifest:
+        if "message" in manifest:
+            # Remove the output directory if the manifest is not valid
+            logging.debug(f"Removing output directory due to invalid manifest for {item_id}")
+            shutil.rmtree(output_dir)
+            raise ValueError(f"Error fetching manifest: {manifest['message']}")
+
+    json_dir = os.path.join(output_dir, 'json')
+    os.makedirs(json_dir, exist_ok=True)
+    manifest_filename = os.path.join(output_dir, 'json', 'manifest.json')
+    with open(manifest_filename, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=4)
+    load_manifest_index.cache_clear()
+
+def manifest_jobs(manifest: dict, output_dir: str, resource_format: str) -> list[tuple[str, str]]:
+    """
+    Return (remote URL, local path) download jobs for the canvas resources of a manifest in the given format.
+    """
+    extension = 'txt' if resource_format == 'text/plain' else 'html'
+    jobs = []
+    for sequence in manifest['sequences']:
+        for canvas in sequence['canvases']:
+            label = canvas['label']
+            for content in canvas.get('otherContent', []):
+                for resource in content.get('resources', []):
+                    resource_id = resource['resource']['@id']
+                    format = resource['resource']['format']
+
+                    if format == resource_format:
+                        filename = os.path.join(output_dir, extension, f"{label}.{extension}")
+                        jobs.append((resource_id, filename))
+    return jobs
+
 class ABODataSource(DataSource):
     """
     Data source for fetching IIIF manifests and resources from the 
@@ -21,7 +97,9 @@ class ABODataSource(DataSource):
                  source_id: str = SOURCE_ID, 
                  manifest_url: str = IIIF_MANIFEST_URL, 
                  project_id: str = PROJECT_ID, 
-                 cache_name: str = "devel"):
+                 cache_name: str = "devel",
+                 max_workers: int = 4,
+                 **kwargs):
         """
         Initialize the data source
 
@@ -29,32 +107,54 @@ class ABODataSource(DataSource):
         :param source_id: Source ID for the data source
         :param project_id: Project ID for the data source
         :param cache_name: Name of the cache for requests
+        :param max_workers: Maximum number of concurrent canvas downloads
+        :param kwargs: HTTP cache options passed on to DataSource
         """
 
         self.source_id = source_id
         self.manifest_url = manifest_url
         self.project_id = project_id
 
-        super().__init__(source_id, cache_name)
+        super().__init__(source_id, cache_name, max_workers, **kwargs)
 
     def fetch(self, item_id: str):
         
         os.makedirs(f"data/{self.source_id}/{self.project_id}", exist_ok=True)
-        
-        item_dir = os.path.join('data', self.source_id, self.project_id)
-        os.makedirs(item_dir, exist_ok=True)
 
-        # Check if item_id directories already exist
-        already = utils.list_directories(f"data/{self.source_id}/{self.project_id}")
-        if item_id not in already:
-            item_dir = os.path.join('data', self.source_id, self.project_id, item_id)
-            try:
-                self._download_files(item_id, item_dir, resource_format="text/plain")
-            except (TypeError, ValueError) as e:
-                logging.error(f"Failed to download files for item ID {item_id}: {e}")
+        # Skip items whose journal says every canvas was downloaded; resume the others
+        item_dir = os.path.join('data', self.source_id, self.project_id, item_id)
+        journal = utils.DownloadJournal(os.path.join(item_dir, utils.JOURNAL_FILENAME))
+        refetch = False
+        if journal.is_complete():
+            if not self.refresh or not self._manifest_changed(item_id, item_dir):
+                return
+            # The manifest changed upstream: download every canvas again instead of trusting the journal
+            logging.info(f"Manifest of {item_id} changed, downloading it again")
+            journal.reset()
+            # Canvases dropped from the manifest must not keep their old pages
+            utils.remove_files(os.path.join(item_dir, 'txt'), '*.txt')
+            refetch = True
+
+        try:
+            self._download_files(item_id, item_dir, resource_format="text/plain", journal=journal, refetch=refetch)
+        except (TypeError, ValueError) as e:
+            logging.error(f"Failed to download files for item ID {item_id}: {e}")
 
 
-    def _download_files(self, item_id, output_dir, resource_format):
+    def item_directory(self, item_id: str) -> str:
+        return os.path.join('data', self.source_id, self.project_id, item_id, 'txt')
+
+    def _manifest_changed(self, item_id, item_dir) -> bool:
+        manifest_url = self.manifest_url.format(project=self.project_id, id=item_id)
+        validators = utils.ValidatorStore(os.path.join(item_dir, utils.VALIDATORS_FILENAME))
+        changed = self.revalidate(manifest_url, validators) is not None
+        validators.save()
+        return changed
+
+    def _download_files(self, item_id, output_dir, resource_format, journal=None, refetch=False):
+        """
+        :param refetch: Bypass the HTTP cache for the canvases, because the manifest changed upstream
+        """
         os.makedirs(output_dir, exist_ok=True)
 
         manifest_url = self.manifest_url.format(project=self.project_id, id=item_id)
@@ -62,42 +162,22 @@ class ABODataSource(DataSource):
         if self.session is None:
             raise ValueError("Session is not initialized. Call connect() first.")
         
-        manifest = self.session.get(manifest_url).json()
-
-        if "sequences" not in manifest:
-            if "message" in manifest:
-                # Remove the output directory if the manifest is not valid
-                logging.debug(f"Removing output directory due to invalid manifest for {item_id}")
-                shutil.rmtree(output_dir)
-                raise ValueError(f"Error fetching manifest: {manifest['message']}")
-
-        json_dir = os.path.join(output_dir, 'json')
-        os.makedirs(json_dir, exist_ok=True)
-        manifest_filename = os.path.join(output_dir, 'json', 'manifest.json')
-        with open(manifest_filename, 'w', encoding='utf-8') as manifest_file:
-            json.dump(manifest, manifest_file, ensure_ascii=False, indent=4)
-
-        for sequence in manifest['sequences']:
-            for canvas in tqdm.tqdm(sequence['canvases']):
-                label = canvas['label']
-                for content in canvas.get('otherContent', []):
-                    for resource in content.get('resources', []):
-                        resource_id = resource['resource']['@id']
-                        format = resource['resource']['format']
-
-                        if format == resource_format:
-                            response = self.session.get(resource_id)
-                            extension = 'txt' if resource_format == 'text/plain' else 'html'
-                            
-                            ext_dir = os.path.join(output_dir, extension)
-                            os.makedirs(ext_dir, exist_ok=True)
-                            
-                            filename = os.path.join(output_dir, extension, f"{label}.{extension}")
-                            
-                            with open(filename, 'wb') as file:
-                                file.write(response.content)
-                            
-                            logging.debug(f"Downloaded {extension.upper()} file for {label} to {filename}")
+        response = self.session.get(manifest_url)
+        manifest = response.json()
+        save_manifest(manifest, output_dir, item_id)
+
+        validators = utils.ValidatorStore(os.path.join(output_dir, utils.VALIDATORS_FILENAME))
+        validators.update(manifest_url, response)
+        validators.save()
+
+        jobs = manifest_jobs(manifest, output_dir, resource_format)
+
+        request_kwargs = utils.refresh_kwargs(self.session) if refetch else {}
+        failed = utils.download_remote_files(jobs, session=self.session, max_workers=self.max_workers, desc=f"Downloading {item_id}", journal=journal, **request_kwargs)
+        catalog.get_catalog().replace_directory(os.path.join(output_dir, 'txt'))
+
+        if journal is not None and not failed:
+            journal.mark_complete()
 
     @staticmethod
     def process(file_path, data_directory):
@@ -108,28 +188,12 @@ class ABODataSource(DataSource):
         project_id = parts[2]
         label = parts[-1].split('.')[0]
         
-        with open(os.path.join(data_directory, SOURCE_ID, project_id, title_id, 'json', 'manifest.json'), 'r', encoding='utf-8') as file:
-            manifest = json.load(file)
-        
-        title_full = manifest['label']
-
-        remote_path = None
-        image_url = None
-        for sequence in manifest['sequences']:
-            for canvas in sequence['canvases']:
-                if label == canvas['label']:
-                    for content in canvas.get('otherContent', []):
-                        for resource in content.get('resources', []):
-                            if resource['resource']['format'] == 'text/plain':
-                                remote_path = resource['resource']['@id']
-                                break
-                    for image in canvas['images']:
-                        original_image_url = image['resource']['@id']
-                        image_url = original_image_url.replace('/full/full/', '/full/,2400/')
-                        break
+        manifest_index = load_manifest_index(os.path.join(data_directory, SOURCE_ID, project_id, title_id, 'json', 'manifest.json'))
 
-        with open(file_path, 'r') as file:
-            ocr_text = file.read()
+        title_full = manifest_index['title_full']
+        remote_path, image_url = manifest_index['canvases'].get(label, (None, None))
+
+        ocr_text, encoding = utils.read_text(file_path)
 
         ocr_text_stripped = utils.remove_newlines(ocr_text)
 
@@ -143,8 +207,64 @@ class ABODataSource(DataSource):
             "image_url": image_url,
             "ocr_text_original": ocr_text,
             "ocr_text_stripped": ocr_text_stripped,
+            "encoding": encoding,
         }
     
+class AsyncABODataSource(AsyncDataSource):
+    """
+    asyncio port of ABODataSource.
+    """
+
+    def __init__(self,
+                 source_id: str = SOURCE_ID,
+                 manifest_url: str = IIIF_MANIFEST_URL,
+                 project_id: str = PROJECT_ID,
+                 **kwargs):
+        """
+        :param kwargs: Client and concurrency options passed on to AsyncDataSource
+        """
+        self.manifest_url = manifest_url
+        self.project_id = project_id
+
+        super().__init__(source_id, **kwargs)
+
+    async def fetch(self, item_id: str):
+        item_dir = os.path.join('data', self.source_id, self.project_id, item_id)
+        manifest_url = self.manifest_url.format(project=self.project_id, id=item_id)
+        # File and catalog access runs in threads, so it does not stall the other titles on the event loop
+        validators = await asyncio.to_thread(utils.ValidatorStore, os.path.join(item_dir, utils.VALIDATORS_FILENAME))
+
+        journal = await asyncio.to_thread(utils.DownloadJournal, os.path.join(item_dir, utils.JOURNAL_FILENAME))
+        if journal.is_complete():
+            if not self.refresh:
+                return
+            changed = await self.revalidate(manifest_url, validators)
+            await asyncio.to_thread(validators.save)
+            if changed is None:
+                return
+            logging.info(f"Manifest of {item_id} changed, downloading it again")
+            await asyncio.to_thread(journal.reset)
+            await asyncio.to_thread(utils.remove_files, os.path.join(item_dir, 'txt'), '*.txt')
+
+        try:
+            response = await self.client.get(manifest_url, source=self.source_id)
+            manifest = response.json()
+            os.makedirs(item_dir, exist_ok=True)
+            await asyncio.to_thread(save_manifest, manifest, item_dir, item_id)
+        except (TypeError, ValueError) as e:
+            logging.error(f"Failed to download files for item ID {item_id}: {e}")
+            return
+
+        validators.update(manifest_url, response)
+        await asyncio.to_thread(validators.save)
+
+        failed = await self.download_files(manifest_jobs(manifest, item_dir, "text/plain"), journal=journal)
+        await asyncio.to_thread(catalog.get_catalog().replace_directory, os.path.join(item_dir, 'txt'))
+        if not failed:
+            await asyncio.to_thread(journal.mark_complete)
+
+    process = staticmethod(ABODataSource.process)
+
 
 if __name__ == "__main__":
     import argparse
@@ -152,7 +272,19 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Download HOCR files for given item ID.")
     parser.add_argument("item_id", type=str, help="The item ID to download HOCR files for.")
+    parser.add_argument("--max-workers", type=int, default=4, help="Maximum number of concurrent canvas downloads.")
+    add_cache_args(parser)
+    add_async_args(parser)
+    profiling.add_profile_args(parser)
     args = parser.parse_args()
 
-    data_source = ABODataSource(manifest_url=IIIF_MANIFEST_URL, project_id=PROJECT_ID, source_id=SOURCE_ID)
-    data_source.fetch(args.item_id)
+    with profiling.profiled(os.path.join('data', SOURCE_ID), **profiling.profile_kwargs(args)), profiling.stage('fetch'):
+        if args.use_async:
+            data_source = AsyncABODataSource(manifest_url=IIIF_MANIFEST_URL, project_id=PROJECT_ID, source_id=SOURCE_ID, max_workers=args.max_workers, **async_kwargs(args))
+            data_source.run(args.item_id)
+            data_source.log_failures()
+        else:
+            data_source = ABODataSource(manifest_url=IIIF_MANIFEST_URL, project_id=PROJECT_ID, source_id=SOURCE_ID, max_workers=args.max_workers, **cache_kwargs(args))
+            data_source.fetch(args.item_id)
+            data_source.log_cache_stats()
+            data_source.log_failures()
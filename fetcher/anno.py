@@ -1,12 +1,26 @@
-from datasource import DataSource
+from datasource import AsyncDataSource, DataSource, DATA_DIRECTORY, add_async_args, add_cache_args, async_kwargs, cache_kwargs, write_file
 
+import asyncio
+import collections
+import json
 import logging
 import os
+import requests
+import time
 import tqdm
 
+import catalog
+import metrics
+import profiling
 import utils 
 
+from concurrent.futures import ThreadPoolExecutor
+
 SOURCE_ID = "anno.onb.ac.at"
+DATUM_INDEX_FILENAME = "datums.json"
+DATUM_INDEX_TTL = 24 * 60 * 60
+# Downloaded text of a whole issue, kept while it has no page files; not a .txt file, so the page catalog skips it
+ISSUE_FILENAME = "issue.raw"
 
 class AnnoDataSource(DataSource):
     """
@@ -15,7 +29,11 @@ class AnnoDataSource(DataSource):
 
     def __init__(self,
                  source_id: str = SOURCE_ID, 
-                 cache_name: str = "devel"):
+                 cache_name: str = "devel",
+                 max_workers: int = 4,
+                 datum_index_ttl: int = DATUM_INDEX_TTL,
+                 recheck_years: int = 1,
+                 **kwargs):
         """
         Initialize the data source
         
@@ -23,13 +41,20 @@ class AnnoDataSource(DataSource):
         :param source_id: Source ID for the data source
         :param project_id: Project ID for the data source
         :param cache_name: Name of the cache for requests
+        :param max_workers: Maximum number of year pages crawled concurrently
+        :param datum_index_ttl: Seconds for which a title's stored datum index is used without recrawling
+        :param recheck_years: Number of most recent years recrawled once the datum index has expired
+        :param kwargs: HTTP cache options passed on to DataSource
         """
 
         self.base_url = f"https://{source_id}"
         self.text_url = "{base_url}/cgi-content/annoshow?text={title_id}|{datum}|{page_number}"
         self.image_url = "{base_url}/cgi-content/annoshow?call={title_id}|{datum}|{page_number}|{zoom_level}"
 
-        super().__init__(source_id=source_id, cache_name=cache_name)
+        self.datum_index_ttl = datum_index_ttl
+        self.recheck_years = recheck_years
+
+        super().__init__(source_id=source_id, cache_name=cache_name, max_workers=max_workers, **kwargs)
     
     def fetch(self, 
               title_id: str,
@@ -37,63 +62,316 @@ class AnnoDataSource(DataSource):
               maximum: int, 
               list_available: bool = False):
         
-        valid_datums = self._get_valid_datums(title_id)
-
-        if minimum:
-            valid_datums = [d for d in valid_datums if d >= minimum]
-        if maximum:
-            valid_datums = [d for d in valid_datums if d <= maximum]
-
         if list_available:
+            valid_datums = self._filter_datums(self._get_valid_datums(title_id), minimum, maximum)
             valid_datums.sort()
             for datum in valid_datums:
                 logging.info(datum)
             return
-        
+
+        for _, pages in self._fetch_datums(title_id, minimum, maximum):
+            collections.deque(pages, maxlen=0)
+
+    def fetch_records(self, title_id: str, minimum: int = None, maximum: int = None, page_files: bool = True):
+        """
+        Fetch missing issues of a title and yield a record for each page, issue by issue as they are downloaded.
+        Records of downloaded issues are built straight from the split text; issues fetched by earlier runs
+        are read back from their page files, or split again from their kept issue text.
+        :param page_files: Also write the pages of downloaded issues to per-page .txt files
+        """
+        for datum, pages in self._fetch_datums(title_id, minimum, maximum, include_existing=True, page_files=page_files):
+            if pages is None:
+                for file_path in catalog.get_catalog().pages(f"data/{self.source_id}/{title_id}/{datum}/txt"):
+                    yield self.process(file_path, DATA_DIRECTORY)
+                continue
+            for page_number, ocr_text, encoding in pages:
+                local_path = f"data/{self.source_id}/{title_id}/{datum}/txt/{page_number}.txt"
+                yield self.page_record(local_path, title_id, datum, str(page_number), ocr_text, encoding)
+
+    @staticmethod
+    def _filter_datums(datums, minimum, maximum):
+        if minimum:
+            datums = [d for d in datums if d >= minimum]
+        if maximum:
+            datums = [d for d in datums if d <= maximum]
+        return datums
+
+    def _fetch_datums(self, title_id, minimum, maximum, include_existing=False, page_files=True):
+        """
+        Download the issues of a title that are not fetched yet, yielding (datum, pages) for each issue.
+        `pages` is a generator of (page_number, text, encoding) split out of the downloaded issue, which must be
+        exhausted before the next issue is requested; it is None for unchanged issues read from their page files.
+        In refresh mode issues downloaded by earlier runs are revalidated and split again if they changed.
+        :param include_existing: Also yield unchanged issues downloaded by earlier runs
+        :param page_files: Write the pages to per-page .txt files. Without them, the text of each issue is kept
+            (see ISSUE_FILENAME), so later runs can rebuild its pages without downloading it again.
+        """
+        valid_datums = self._filter_datums(self._get_valid_datums(title_id), minimum, maximum)
+
         folder = f"data/{self.source_id}/{title_id}"
         os.makedirs(folder, exist_ok=True)
 
-        already = utils.list_directories(folder)
-        already = [int(d) for d in already if d.isdigit()]
-        missing = list(set(valid_datums) - set(already))
+        validators = utils.ValidatorStore(os.path.join(folder, utils.VALIDATORS_FILENAME))
+        # An issue counts as fetched only while its pages can be rebuilt, from page files or its kept text
+        on_disk = set(self._fetched_datums(folder))
+        kept = set(self._kept_datums(self.source_id, title_id, set(valid_datums) - on_disk))
+        missing = list(set(valid_datums) - on_disk - kept)
+        existing = sorted(set(valid_datums) & (on_disk | kept))
 
-        if len(missing) == 0:
-            return
-        
-        for vd in tqdm.tqdm(missing):
-            try:
-                path_on_disk = self._get_text_for_datum(title_id, vd, page_number='x')
-                utils.split_anno_x_file(path_on_disk, f"{folder}/{vd}/txt")
-                utils.delete_file(path_on_disk)
-            except FileNotFoundError as e:
-                logging.error(f"File disappeared while processing {path_on_disk}")
-                logging.error(e)
+        try:
+            if self.refresh:
+                existing = tqdm.tqdm(existing, desc=f"Revalidating {title_id}")
+            for vd in existing:
+                # Issues with page files keep them up to date, so they do not go stale
+                pages = self._refresh_datum(title_id, vd, validators, page_files or vd in on_disk) if self.refresh else None
+                if pages is None and vd in kept and (include_existing or page_files):
+                    pages = self._split_issue_file(self.source_id, title_id, vd, page_files)
+                if pages is not None:
+                    yield vd, pages
+                elif include_existing:
+                    yield vd, None
+
+            if len(missing) == 0:
+                return
+
+            for vd in tqdm.tqdm(missing):
+                path_on_disk = self._get_text_for_datum(title_id, vd, page_number='x', validators=validators)
+                if not os.path.exists(path_on_disk):
+                    logging.error(f"Text of {title_id} {vd} was not downloaded")
+                    continue
+                yield vd, self._split_issue_file(self.source_id, title_id, vd, page_files)
+        finally:
+            validators.save()
+
+    def _text_uri(self, title_id, datum, page_number='x') -> str:
+        return self.text_url.format(base_url=self.base_url, title_id=title_id, datum=datum, page_number=page_number)
+
+    def _refresh_datum(self, title_id, datum, validators, page_files=True):
+        """
+        Revalidate the text of an issue and split it again if it changed upstream.
+        :return: Generator of the pages of the changed issue (see _split_issue), or None if it is unchanged
+        """
+        response = self.revalidate(self._text_uri(title_id, datum), validators)
+        if response is None:
+            return None
+
+        issue_path = self._issue_path(self.source_id, title_id, datum)
+        if not page_files or os.path.exists(issue_path):
+            # The kept text must not go stale either
+            write_file(issue_path, response.content)
+            return self._split_issue_file(self.source_id, title_id, datum, page_files)
+        return self._split_issue(self.source_id, title_id, datum, utils.iter_anno_pages(response.content), page_files)
+
+    @staticmethod
+    def _fetched_datums(folder) -> list[int]:
+        # An issue only counts as fetched once its split pages were registered in the page catalog
+        directories = catalog.get_catalog().directories(folder)
+        datums = [os.path.basename(os.path.dirname(d)) for d in directories if os.path.basename(d) == 'txt']
+        return [int(d) for d in datums if d.isdigit()]
+
+    @staticmethod
+    def _issue_path(source_id, title_id, datum) -> str:
+        # Kept out of the txt folder, whose old pages are removed before the new ones are split out
+        return f"data/{source_id}/{title_id}/{datum}/{ISSUE_FILENAME}"
+
+    @staticmethod
+    def _kept_datums(source_id, title_id, datums) -> list[int]:
+        """
+        Return the datums among `datums` whose issue text was kept by a run without page files.
+        """
+        return [d for d in datums if os.path.exists(AnnoDataSource._issue_path(source_id, title_id, d))]
+
+    @staticmethod
+    def _split_issue_file(source_id, title_id, datum, page_files=True):
+        """
+        Split the downloaded text of an issue, see _split_issue.
+        With page_files the text is removed once all pages were written, otherwise it is kept to rebuild them later.
+        """
+        issue_path = AnnoDataSource._issue_path(source_id, title_id, datum)
+        yield from AnnoDataSource._split_issue(source_id, title_id, datum, utils.iter_anno_file_pages(issue_path), page_files)
+        if page_files:
+            utils.delete_file(issue_path)
+
+    @staticmethod
+    def _split_issue(source_id, title_id, datum, pages, page_files=True):
+        """
+        Pass on the pages split out of the downloaded text of an issue, timing the split as 'convert'.
+        With page_files, the page files of the issue are replaced by the new pages and registered in the page catalog.
+        :param pages: Generator of (page_number, text, encoding), see utils.iter_anno_pages
+        :return: Generator of (page_number, text, encoding)
+        """
+        folder = f"data/{source_id}/{title_id}/{datum}/txt"
+        if page_files:
+            os.makedirs(folder, exist_ok=True)
+            # Remove the old pages, so an issue that lost pages upstream does not keep stale ones
+            utils.remove_files(folder, '*.txt')
+
+        # Only the time spent splitting and writing counts, not the time the consumer holds on to a page
+        pages = iter(pages)
+        while True:
+            with metrics.registry.timer('convert', source=source_id):
+                page = next(pages, None)
+                if page is None:
+                    break
+                page_number, text, encoding = page
+                if page_files:
+                    with open(os.path.join(folder, f"{page_number}.txt"), 'w', encoding='utf-8') as file:
+                        file.write(text)
+            yield page_number, text, encoding
+
+        if page_files:
+            catalog.get_catalog().replace_directory(folder)
+
+    @staticmethod
+    def _write_issue(source_id, title_id, datum, content: bytes):
+        """
+        Replace the page files of an issue with those split out of its downloaded text.
+        """
+        collections.deque(AnnoDataSource._split_issue(source_id, title_id, datum, utils.iter_anno_pages(content)), maxlen=0)
 
     def _get_valid_datums(self, title_id: str):
+        """
+        Return the issue datums available for a title.
+        Datums found per year page are kept in a per-title index on disk. While the index is younger
+        than the TTL it is used as-is; after that only the most recent years (and any new ones) are recrawled.
+        """
+        index_path = os.path.join('data', self.source_id, title_id, DATUM_INDEX_FILENAME)
+        index = self._load_datum_index(index_path)
+
+        if index and time.time() - index['updated'] < self.datum_index_ttl:
+            return self._datums_from_index(index)
+
         title_url = self.base_url + f"/cgi-content/anno?apm=0&aid={title_id}"
-        all_hrefs = utils.get_all_hrefs(title_url, session=self.session)
-        year_hrefs = [f"{self.base_url}{h}" for h in all_hrefs if ('datum=' in h)]
+        try:
+            all_hrefs = utils.get_all_hrefs(title_url, session=self.session, match='datum=')
+        except requests.RequestException as e:
+            logging.error(f"Could not list the years of {title_id}: {e}")
+            all_hrefs = []
+        to_crawl = self._years_to_crawl(title_id, all_hrefs, index)
+        if to_crawl is None:
+            return self._datums_from_index(index) if index else []
 
-        all_ymd_hrefs = []
-        for yh in year_hrefs:
-            ah = utils.get_all_hrefs(yh, session=self.session)
-            all_ymd_hrefs.extend(h for h in ah if ('datum=' in h))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            crawled = dict(zip(to_crawl, executor.map(self._get_datums_for_year, to_crawl)))
 
-        valid_datums = [utils.get_query_value(u, key='datum') for u in all_ymd_hrefs]
-        valid_datums = list(set(valid_datums))
-        valid_datums = [int(d) for d in valid_datums if d.isdigit()]
+        index = self._update_datum_index(index_path, index, crawled)
+        return self._datums_from_index(index)
 
-        return valid_datums
+    def _get_datums_for_year(self, year_href: str) -> list[int] | None:
+        """
+        Return the datums listed on a year page, or None if the page could not be fetched.
+        """
+        try:
+            ah = utils.get_all_hrefs(year_href, session=self.session, match='datum=')
+        except requests.RequestException as e:
+            logging.error(f"Could not crawl {year_href}: {e}")
+            return None
+        return self._parse_year_datums(ah)
 
-    def _get_text_for_datum(self, title_id, datum, page_number='x'):
-        vd_uri = self.text_url.format(base_url=self.base_url, title_id=title_id, datum=datum, page_number=page_number)
-        folder = f"data/{self.source_id}/{title_id}/{datum}/txt"
-        path_on_disk = folder + '/' + f"{self.source_id}_{title_id}_{datum}.txt"
-        utils.download_remote_file(vd_uri, path=path_on_disk, session=self.session)
+    @staticmethod
+    def _parse_year_datums(hrefs) -> list[int]:
+        datums = [utils.get_query_value(h, key='datum') for h in hrefs]
+        return sorted(set(int(d) for d in datums if d and d.isdigit()))
+
+    def _years_to_crawl(self, title_id: str, title_hrefs, index):
+        """
+        Return the year pages to crawl: the recent ones and those missing from the index.
+        :param title_hrefs: Links to year pages found on the title page
+        :param index: Stored datum index, or None
+        :return: List of year page URLs, or None if the title page listed no years (e.g. it failed to load)
+        """
+        year_hrefs = set(f"{self.base_url}{h}" for h in title_hrefs)
+        if not year_hrefs:
+            logging.warning(f"No year pages found for {title_id}; keeping the stored datum index")
+            return None
+        year_hrefs = sorted(year_hrefs, key=lambda h: utils.get_query_value(h, key='datum') or '')
+
+        years = index['years'] if index else {}
+        recent = set(year_hrefs[-self.recheck_years:]) if self.recheck_years else set()
+        return [yh for yh in year_hrefs if yh in recent or yh not in years]
+
+    @staticmethod
+    def _update_datum_index(index_path: str, index, crawled: dict):
+        """
+        Store freshly crawled year pages in the datum index.
+        Year pages that failed or listed no issues keep their previous entry (or stay missing), and the
+        index is then not marked as updated, so they are crawled again on the next run instead of being
+        hidden until the TTL expires.
+        :param index: Stored datum index, or None
+        :param crawled: Mapping of year page URL to its datums, or None if the crawl failed
+        :return: The updated index
+        """
+        years = index['years'] if index else {}
+        missing = []
+        for yh, datums in crawled.items():
+            if datums:
+                years[yh] = datums
+            else:
+                missing.append(yh)
+
+        if missing:
+            logging.warning(f"{len(missing)} year pages failed or listed no issues and are crawled again next run: {', '.join(missing)}")
+            updated = index['updated'] if index else 0
+        else:
+            updated = time.time()
+
+        index = {'updated': updated, 'years': years}
+        AnnoDataSource._save_datum_index(index_path, index)
+        return index
+
+    @staticmethod
+    def _datums_from_index(index) -> list[int]:
+        return list(set(d for datums in index['years'].values() for d in datums))
+
+    @staticmethod
+    def _load_datum_index(index_path: str):
+        try:
+            with open(index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+        except FileNotFoundError:
+            return None
+        except json.JSONDecodeError as e:
+            logging.error(f"Ignoring unreadable datum index {index_path}: {e}")
+            return None
+
+        if not isinstance(index, dict) or 'updated' not in index or 'years' not in index:
+            logging.error(f"Ignoring malformed datum index {index_path}")
+            return None
+        return index
+
+    @staticmethod
+    def _save_datum_index(index_path: str, index):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(index, file)
+        os.replace(tmp_path, index_path)
+
+    def _get_text_for_datum(self, title_id, datum, page_number='x', validators=None):
+        vd_uri = self._text_uri(title_id, datum, page_number)
+        path_on_disk = self._issue_path(self.source_id, title_id, datum)
+        downloaded = utils.download_remote_file(vd_uri, path=path_on_disk, session=self.session)
+        if downloaded and validators is not None:
+            # Remember the content hash, so a later refresh only splits issues that changed
+            with open(path_on_disk, 'rb') as file:
+                validators.remember(vd_uri, file.read())
         return path_on_disk
 
     @staticmethod
     def process(file_path, data_directory):
+        parts = file_path.split(os.sep)
+        title_id = parts[2]
+        datum = int(parts[3])
+        page_number = parts[-1].split('.')[0]
+
+        ocr_text, encoding = utils.read_text(file_path)
+        return AnnoDataSource.page_record(file_path, title_id, datum, page_number, ocr_text, encoding)
+
+    @staticmethod
+    def page_record(local_path, title_id, datum, page_number, ocr_text, encoding):
+        """
+        Build the record of one page, from a page file or straight from a split issue.
+        """
         SOURCE_ID = "anno.onb.ac.at"
         TEXT_URL = "https://anno.onb.ac.at/cgi-content/annoshow?text={title_id}|{datum}|{page_number}"
         IMAGE_URL= "https://anno.onb.ac.at/cgi-content/annoshow?call={title_id}|{datum}|{page_number}|{zoom_level}"
@@ -103,19 +381,11 @@ class AnnoDataSource(DataSource):
             'vlb': 'Vaterländische Blätter'
         }
 
-        parts = file_path.split(os.sep)
-        title_id = parts[2]
-        datum = parts[3]
-        page_number = parts[-1].split('.')[0]
-
         remote_path = TEXT_URL.format(title_id=title_id, datum=datum, page_number=page_number)
         image_url = IMAGE_URL.format(title_id=title_id, datum=datum, page_number=page_number, zoom_level='100')
 
-        ocr_text = utils.read_multi_encoding(file_path)
-        ocr_text_stripped = utils.remove_newlines(ocr_text)
-
         return {
-            "local_path": file_path,
+            "local_path": local_path,
             "source": SOURCE_ID,
             "title_id": title_id,
             "title_full": TITLE_MAP[title_id],
@@ -124,10 +394,124 @@ class AnnoDataSource(DataSource):
             "remote_path": remote_path,
             "image_url": image_url,
             "ocr_text_original": ocr_text,
-            "ocr_text_stripped": ocr_text_stripped,
+            "ocr_text_stripped": utils.remove_newlines(ocr_text),
+            "encoding": encoding,
         }
 
 
+class AsyncAnnoDataSource(AsyncDataSource):
+    """
+    asyncio port of AnnoDataSource. Year pages and issues of a title are fetched concurrently.
+    """
+
+    def __init__(self,
+                 source_id: str = SOURCE_ID,
+                 datum_index_ttl: int = DATUM_INDEX_TTL,
+                 recheck_years: int = 1,
+                 **kwargs):
+        """
+        :param datum_index_ttl: Seconds for which a title's stored datum index is used without recrawling
+        :param recheck_years: Number of most recent years recrawled once the datum index has expired
+        :param kwargs: Client and concurrency options passed on to AsyncDataSource
+        """
+        self.base_url = f"https://{source_id}"
+        self.text_url = "{base_url}/cgi-content/annoshow?text={title_id}|{datum}|{page_number}"
+
+        self.datum_index_ttl = datum_index_ttl
+        self.recheck_years = recheck_years
+
+        super().__init__(source_id, **kwargs)
+
+    async def fetch(self,
+                    title_id: str,
+                    minimum: int = None,
+                    maximum: int = None,
+                    list_available: bool = False):
+        valid_datums = AnnoDataSource._filter_datums(await self._get_valid_datums(title_id), minimum, maximum)
+
+        if list_available:
+            for datum in sorted(valid_datums):
+                logging.info(datum)
+            return
+
+        folder = f"data/{self.source_id}/{title_id}"
+        os.makedirs(folder, exist_ok=True)
+
+        # Catalog and file access runs in threads, so it does not stall the other titles on the event loop
+        already = await asyncio.to_thread(AnnoDataSource._fetched_datums, folder)
+        # Issues kept without page files by a pipeline run get their page files without being downloaded again
+        kept = await asyncio.to_thread(AnnoDataSource._kept_datums, self.source_id, title_id, set(valid_datums) - set(already))
+        for vd in kept:
+            await asyncio.to_thread(collections.deque, AnnoDataSource._split_issue_file(self.source_id, title_id, vd), 0)
+        missing = sorted(set(valid_datums) - set(already) - set(kept))
+        existing = sorted(set(valid_datums) & (set(already) | set(kept)))
+
+        semaphore = asyncio.Semaphore(self.max_workers)
+        validators = await asyncio.to_thread(utils.ValidatorStore, os.path.join(folder, utils.VALIDATORS_FILENAME))
+        try:
+            if self.refresh:
+                await asyncio.gather(*(self._fetch_datum(title_id, vd, validators, semaphore, revalidate=True) for vd in existing))
+            await asyncio.gather(*(self._fetch_datum(title_id, vd, validators, semaphore) for vd in missing))
+        finally:
+            await asyncio.to_thread(validators.save)
+
+    async def _fetch_datum(self, title_id, datum, validators, semaphore, revalidate=False):
+        vd_uri = self.text_url.format(base_url=self.base_url, title_id=title_id, datum=datum, page_number='x')
+        async with semaphore:
+            if revalidate:
+                response = await self.revalidate(vd_uri, validators)
+                if response is None:
+                    return
+            else:
+                try:
+                    response = await self.client.get(vd_uri, source=self.source_id)
+                    response.raise_for_status()
+                except requests.RequestException as e:
+                    logging.error(f"Error downloading {vd_uri}: {e}")
+                    return
+                validators.update(vd_uri, response)
+
+        await asyncio.to_thread(AnnoDataSource._write_issue, self.source_id, title_id, datum, response.content)
+
+    async def _get_valid_datums(self, title_id: str):
+        """
+        Async counterpart of AnnoDataSource._get_valid_datums, crawling the year pages concurrently.
+        """
+        index_path = os.path.join('data', self.source_id, title_id, DATUM_INDEX_FILENAME)
+        index = await asyncio.to_thread(AnnoDataSource._load_datum_index, index_path)
+
+        if index and time.time() - index['updated'] < self.datum_index_ttl:
+            return AnnoDataSource._datums_from_index(index)
+
+        title_url = self.base_url + f"/cgi-content/anno?apm=0&aid={title_id}"
+        try:
+            all_hrefs = await self.get_hrefs(title_url, match='datum=')
+        except requests.RequestException as e:
+            logging.error(f"Could not list the years of {title_id}: {e}")
+            all_hrefs = []
+        to_crawl = AnnoDataSource._years_to_crawl(self, title_id, all_hrefs, index)
+        if to_crawl is None:
+            return AnnoDataSource._datums_from_index(index) if index else []
+
+        crawled = dict(zip(to_crawl, await asyncio.gather(*(self._get_datums_for_year(yh) for yh in to_crawl))))
+
+        index = await asyncio.to_thread(AnnoDataSource._update_datum_index, index_path, index, crawled)
+        return AnnoDataSource._datums_from_index(index)
+
+    async def _get_datums_for_year(self, year_href: str) -> list[int] | None:
+        """
+        Async counterpart of AnnoDataSource._get_datums_for_year.
+        """
+        try:
+            ah = await self.get_hrefs(year_href, match='datum=')
+        except requests.RequestException as e:
+            logging.error(f"Could not crawl {year_href}: {e}")
+            return None
+        return AnnoDataSource._parse_year_datums(ah)
+
+    process = staticmethod(AnnoDataSource.process)
+
+
 if __name__ == "__main__":
     import argparse
     logging.basicConfig(level=logging.INFO)
@@ -137,12 +521,29 @@ if __name__ == "__main__":
     parser.add_argument("--min", type=int, help="The minimum date in YYYYMMDD format.", default=None)
     parser.add_argument("--max", type=int, help="The maximum date in YYYYMMDD format.", default=None)
     parser.add_argument("--list-available", action="store_true", help="List all valid datums in alphabetical order.")
+    parser.add_argument("--datum-index-ttl", type=int, default=DATUM_INDEX_TTL, help="Seconds for which the stored list of datums is reused without recrawling.")
+    
+    add_cache_args(parser)
+    add_async_args(parser)
+    profiling.add_profile_args(parser)
     
     args = parser.parse_args()
     
-    data_source = AnnoDataSource(source_id=SOURCE_ID)
-    data_source.fetch(
-        args.title_id, 
-        minimum=args.min, 
-        maximum=args.max,
-        list_available=args.list_available)
+    with profiling.profiled(os.path.join('data', SOURCE_ID), **profiling.profile_kwargs(args)), profiling.stage('fetch'):
+        if args.use_async:
+            data_source = AsyncAnnoDataSource(source_id=SOURCE_ID, datum_index_ttl=args.datum_index_ttl, **async_kwargs(args))
+            data_source.run(
+                args.title_id,
+                minimum=args.min,
+                maximum=args.max,
+                list_available=args.list_available)
+            data_source.log_failures()
+        else:
+            data_source = AnnoDataSource(source_id=SOURCE_ID, datum_index_ttl=args.datum_index_ttl, **cache_kwargs(args))
+            data_source.fetch(
+                args.title_id, 
+                minimum=args.min, 
+                maximum=args.max,
+                list_available=args.list_available)
+            data_source.log_cache_stats()
+            data_source.log_failures()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import utils
+
+RESULTS_FILE = os.path.join("data", "benchmarks.jsonl")
+REGRESSION_THRESHOLD = 0.1
+
+WORDS = [
+    "der", "die", "das", "und", "in", "zu", "den", "von", "mit", "für", "auf", "Wien", "Zeitung",
+    "Österreich", "Kaiser", "März", "Straße", "Gemeinde", "Bürger", "Nachricht", "größer", "Theater",
+    "Anzeige", "Preis", "Gulden", "Kreuzer", "heute", "Sonntag", "Herrn", "Fräulein", "täglich",
+]
+
+def best_of(fn, repeat: int) -> float:
+    """
+    Run fn `repeat` times and return the fastest wall-clock time in seconds.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def peak_memory(fn) -> int:
+    """
+    Run fn once under tracemalloc and return the peak of Python allocations in bytes.
+    Kept apart from the timed runs, because tracing slows allocation-heavy code down considerably.
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def report(name: str, seconds: float, pages: int, size: int, peak: int | None = None) -> dict:
+    """
+    Print throughput for one benchmark run and return it as a result dict.
+    """
+    result = {
+        'seconds': seconds,
+        'pages_per_s': pages / seconds,
+        'mb_per_s': size / seconds / 1e6,
+        'pages': pages,
+        'bytes': size,
+    }
+    line = f"{name:<28} {seconds:8.4f}s  {result['pages_per_s']:10.1f} pages/s  {result['mb_per_s']:8.2f} MB/s"
+    if peak is not None:
+        result['peak_mb'] = peak / 1e6
+        line += f"  {result['peak_mb']:8.2f} MB peak"
+    print(line)
+    return result
+
+def measure(name: str, fn, pages: int, size: int, repeat: int) -> dict:
+    """
+    Time fn (best of `repeat`), measure its peak memory and report the throughput.
+    """
+    return report(name, best_of(fn, repeat), pages, size, peak_memory(fn))
+
+def bench_hrefs(paths: list[str], repeat: int = 5, match: str | None = None):
+    """
+    Compare the streaming href extractor in utils with a BeautifulSoup tree on saved HTML pages.
+    :param paths: Saved HTML pages
+    :param repeat: Number of runs per implementation (the fastest is reported)
+    :param match: Optional substring filter passed to the streaming extractor
+    """
+    import bs4
+
+    pages = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            pages.append(file.read().decode('utf-8', errors='replace'))
+    size = sum(len(p.encode('utf-8')) for p in pages)
+
+    def soup_hrefs(html):
+        soup = bs4.BeautifulSoup(html, 'html.parser')
+        hrefs = [a.get('href') for a in soup.find_all('a', href=True)]
+        return [h for h in hrefs if match is None or match in h]
+
+    def streaming_hrefs(html):
+        return utils.extract_hrefs(html, match=match)
+
+    for page in pages:
+        if soup_hrefs(page) != streaming_hrefs(page):
+            print("Warning: implementations disagree on at least one page")
+            break
+
+    print(f"{len(pages)} pages, {size / 1e6:.2f} MB, best of {repeat}")
+    report("BeautifulSoup html.parser", best_of(lambda: [soup_hrefs(p) for p in pages], repeat), len(pages), size)
+    report("utils.extract_hrefs", best_of(lambda: [streaming_hrefs(p) for p in pages], repeat), len(pages), size)
+
+def collect_files(inputs: list[str], extensions: tuple[str, ...]) -> list[str]:
+    """
+    Expand directories in `inputs` to the files under them with one of the given extensions.
+    """
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for extension in extensions:
+                files.extend(glob.glob(os.path.join(path, '**', f'*{extension}'), recursive=True))
+        else:
+            files.append(path)
+    return sorted(files)
+
+def synthetic_lines(rng: random.Random, lines: int, words_per_line: int = 9) -> list[str]:
+    return [' '.join(rng.choice(WORDS) for _ in range(words_per_line)) for _ in range(lines)]
+
+def synthetic_manifest(item_id: str, pages: int, text_url: str | None = None, hocr_url: str | None = None) -> dict:
+    """
+    Build a IIIF presentation v2 manifest with `pages` canvases, shaped like the ABO and MDZ manifests.
+    :param text_url: Template for a text/plain resource per canvas (ABO), formatted with the label
+    :param hocr_url: Template for a seeAlso hOCR link per canvas (MDZ), formatted with the label
+    """
+    canvases = []
+    for page in range(1, pages + 1):
+        label = f"{page:08d}"
+        canvas = {
+            'label': label,
+            'images': [{'resource': {'@id': f"https://example.org/iiif/{item_id}/{label}/full/full/0/default.jpg"}}],
+        }
+        if text_url:
+            canvas['otherContent'] = [{'resources': [{'resource': {'@id': text_url.format(label=label), 'format': 'text/plain'}}]}]
+        if hocr_url:
+            canvas['seeAlso'] = {'@id': hocr_url.format(label=label)}
+        canvases.append(canvas)
+    return {'label': f"Synthetic item {item_id}", 'sequences': [{'canvases': canvases}]}
+
+def synthetic_hocr(lines: list[str]) -> str:
+    body = []
+    for i, line in enumerate(lines):
+        words = ''.join(f"<span class='ocrx_word' title='bbox 0 0 10 10'>{word}</span> " for word in line.split())
+        body.append(f"<span class='ocr_line' id='line_{i}' title='bbox 0 {i * 20} 1000 {i * 20 + 18}'>{words}</span>")
+    return ("<?xml version='1.0' encoding='UTF-8'?>\n<html xmlns='http://www.w3.org/1999/xhtml'><head><title></title>"
+            "<meta name='ocr-system' content='synthetic'/></head><body><div class='ocr_page'><p class='ocr_par'>"
+            + '\n'.join(body) + "</p></div></body></html>\n")
+
+def write_text(path: str, text: str, encoding: str = 'utf-8'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding=encoding) as file:
+        file.write(text)
+
+def make_fixtures(root: str, items: int = 4, pages: int = 50, lines: int = 40, seed: int = 0) -> dict:
+    """
+    Generate a synthetic data directory under `root`, laid out like the fetcher's own `data` directory:
+    ANNO issues (x files and split pages, every fourth issue Latin-1 encoded), ABO items with manifests
+    and text pages (every fourth item Latin-1 encoded), and MDZ items with manifests, hOCR pages and converted text pages.
+
+    :param items: Number of issues or items per source
+    :param pages: Number of pages per issue or item
+    :param lines: Number of text lines per page
+    :return: Dict listing the generated 'x_files', 'hocr_files' and 'page_files'
+    """
+    rng = random.Random(seed)
+    data = os.path.join(root, 'data')
+    fixtures = {'x_files': [], 'hocr_files': [], 'page_files': []}
+
+    for issue in range(items):
+        datum = f"{18200101 + issue}"
+        page_texts = ['\n'.join(synthetic_lines(rng, lines)) for _ in range(pages)]
+        x_text = ''.join(f"[ Seite {p} ]\n{text}\n" for p, text in enumerate(page_texts, start=1))
+        x_file = os.path.join(root, 'x', f"anno.onb.ac.at_sam_{datum}.txt")
+        write_text(x_file, x_text, encoding='latin-1' if issue % 4 == 3 else 'utf-8')
+        fixtures['x_files'].append(x_file)
+        for p, text in enumerate(page_texts, start=1):
+            page_file = os.path.join(data, 'anno.onb.ac.at', 'sam', datum, 'txt', f"{p}.txt")
+            write_text(page_file, text)
+            fixtures['page_files'].append(page_file)
+
+    for item in range(items):
+        item_id = f"Z{item:09d}"
+        item_dir = os.path.join(data, 'iiif.onb.ac.at', 'ABO', item_id)
+        manifest = synthetic_manifest(item_id, pages, text_url=f"https://example.org/ABO/{item_id}/{{label}}.txt")
+        write_text(os.path.join(item_dir, 'json', 'manifest.json'), json.dumps(manifest))
+        for canvas in manifest['sequences'][0]['canvases']:
+            page_file = os.path.join(item_dir, 'txt', f"{canvas['label']}.txt")
+            write_text(page_file, '\n'.join(synthetic_lines(rng, lines)), encoding='latin-1' if item % 4 == 3 else 'utf-8')
+            fixtures['page_files'].append(page_file)
+
+    for item in range(items):
+        item_id = f"bsb{item:08d}"
+        item_dir = os.path.join(data, 'api.digitale-sammlungen.de', item_id)
+        manifest = synthetic_manifest(item_id, pages, hocr_url=f"https://example.org/mdz/{item_id}/{{label}}.hocr")
+        write_text(os.path.join(item_dir, 'json', 'manifest.json'), json.dumps(manifest))
+        for canvas in manifest['sequences'][0]['canvases']:
+            page_lines = synthetic_lines(rng, lines)
+            hocr_file = os.path.join(item_dir, 'hocr', f"{canvas['label']}.hocr")
+            write_text(hocr_file, synthetic_hocr(page_lines))
+            fixtures['hocr_files'].append(hocr_file)
+            page_file = os.path.join(item_dir, 'txt', f"{canvas['label']}.txt")
+            write_text(page_file, '\n'.join(page_lines) + '\n')
+            fixtures['page_files'].append(page_file)
+
+    return fixtures
+
+class NullTypesenseClient:
+    """
+    Stand-in for typesense.Client that accepts every import, so insert batching can be measured offline.
+    """
+
+    class _Documents:
+        def import_(self, body: str, params: dict | None = None) -> str:
+            return '\n'.join('{"success": true}' for _ in range(body.count('\n')))
+
+    class _Collection:
+        def __init__(self):
+            self.documents = NullTypesenseClient._Documents()
+
+    class _Collections(dict):
+        def __missing__(self, name):
+            return NullTypesenseClient._Collection()
+
+    def __init__(self):
+        self.collections = self._Collections()
+
+def two_pass_read(path: str) -> str:
+    """
+    The earlier text loader, kept as a baseline for utils.read_text: read as UTF-8 and,
+    if that fails, read the file again as Latin-1.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
+    except UnicodeDecodeError:
+        with open(path, 'r', encoding='latin-1') as file:
+            return file.read()
+
+def file_size(paths: list[str]) -> int:
+    return sum(os.path.getsize(path) for path in paths)
+
+def run_suite(root: str, repeat: int = 3, only: list[str] | None = None, batch_size: int = 256, concurrency: int = 2) -> dict:
+    """
+    Run the ingest benchmarks on fixtures generated by make_fixtures.
+    Paths are resolved relative to `root`, since the process functions expect the 'data/<source>/...' layout.
+    :param only: Names of the benchmarks to run (default all)
+    :return: Mapping of benchmark name to its result dict
+    """
+    import gather
+    import insert
+    from anno import AnnoDataSource
+
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        page_files = sorted(os.path.relpath(p) for p in glob.glob(os.path.join('data', '**', 'txt', '*.txt'), recursive=True))
+        x_files = sorted(glob.glob(os.path.join('x', '*.txt')))
+        hocr_files = sorted(glob.glob(os.path.join('data', '**', 'hocr', '*.hocr'), recursive=True))
+        x_pages = len([p for p in page_files if p.startswith(os.path.join('data', 'anno.onb.ac.at'))])
+        lines = [json.dumps(gather.process_file(p)) + '\n' for p in page_files]
+        jsonl_size = sum(len(line.encode('utf-8')) for line in lines)
+        split_dir = tempfile.mkdtemp(dir='.')
+
+        def gather_pages():
+            for path in page_files:
+                json.dumps(gather.process_file(path))
+
+        def read_pages():
+            for path in x_files + page_files:
+                utils.read_text(path)
+
+        def read_pages_two_pass():
+            for path in x_files + page_files:
+                two_pass_read(path)
+
+        def split_pages():
+            for i, path in enumerate(x_files):
+                utils.split_anno_x_file(path, os.path.join(split_dir, str(i)))
+
+        def stream_records():
+            for path in x_files:
+                for page_number, text, encoding in utils.iter_anno_file_pages(path):
+                    json.dumps(AnnoDataSource.page_record(path, 'sam', 18200101, str(page_number), text, encoding))
+
+        def convert_hocr():
+            for path in hocr_files:
+                utils.hocr_to_txt(path, os.path.join(split_dir, 'page.txt'))
+
+        def insert_batches():
+            insert.import_lines(iter(lines), NullTypesenseClient(), 'benchmark', batch_size=batch_size, concurrency=concurrency)
+
+        benchmarks = {
+            'gather.process_file': (gather_pages, len(page_files), file_size(page_files)),
+            'utils.read_text': (read_pages, x_pages + len(page_files), file_size(x_files + page_files)),
+            'baseline.two_pass_read': (read_pages_two_pass, x_pages + len(page_files), file_size(x_files + page_files)),
+            'utils.split_anno_x_file': (split_pages, x_pages, file_size(x_files)),
+            'anno.stream_records': (stream_records, x_pages, file_size(x_files)),
+            'utils.hocr_to_txt': (convert_hocr, len(hocr_files), file_size(hocr_files)),
+            'insert.import_lines': (insert_batches, len(lines), jsonl_size),
+        }
+
+        print(f"{len(page_files)} pages, best of {repeat}")
+        results = {}
+        try:
+            for name, (fn, pages, size) in benchmarks.items():
+                if only and name not in only:
+                    continue
+                results[name] = measure(name, fn, pages, size, repeat)
+        finally:
+            shutil.rmtree(split_dir)
+    finally:
+        os.chdir(cwd)
+    return results
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_results(path: str) -> list[dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def save_results(path: str, run: dict):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(run) + '\n')
+
+def compare(previous: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> list[str]:
+    """
+    Print the throughput change of every benchmark against an earlier run with the same parameters.
+    :return: Names of the benchmarks whose throughput dropped by more than `threshold`
+    """
+    regressions = []
+    print(f"Compared with {previous['revision'] or 'unknown revision'} from {previous['timestamp']}:")
+    for name, result in current['results'].items():
+        before = previous['results'].get(name)
+        if not before:
+            continue
+        change = result['pages_per_s'] / before['pages_per_s'] - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<28} {change:+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the fetcher hot paths.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    parser_hrefs = subparsers.add_parser("hrefs", help="Benchmark href extraction on saved HTML pages.")
+    parser_hrefs.add_argument("pages", nargs='+', help="Saved HTML pages, or directories containing them.")
+    parser_hrefs.add_argument("--repeat", type=int, default=5, help="Number of runs per implementation.")
+    parser_hrefs.add_argument("--match", type=str, default=None, help="Substring filter, e.g. 'datum='.")
+
+    parser_fixtures = subparsers.add_parser("fixtures", help="Generate synthetic ANNO, ABO and MDZ fixtures.")
+    parser_fixtures.add_argument("directory", type=str, help="Directory to write the fixtures to.")
+
+    parser_run = subparsers.add_parser("run", help="Benchmark the ingest hot paths on synthetic fixtures.")
+    parser_run.add_argument("--fixtures", type=str, default=None, help="Use fixtures generated earlier instead of a temporary set.")
+    parser_run.add_argument("--repeat", type=int, default=3, help="Number of timed runs per benchmark (the fastest is reported).")
+    parser_run.add_argument("--only", nargs='+', default=None, help="Names of the benchmarks to run.")
+    parser_run.add_argument("--batch-size", type=int, default=256, help="Documents per import batch for insert.import_lines.")
+    parser_run.add_argument("--import-concurrency", type=int, default=2, help="Import requests in flight for insert.import_lines.")
+    parser_run.add_argument("--results", type=str, default=RESULTS_FILE, help="JSONL file the results are appended to.")
+    parser_run.add_argument("--no-save", action='store_true', help="Do not store the results.")
+    parser_run.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Throughput drop reported as a regression.")
+
+    for subparser in (parser_fixtures, parser_run):
+        subparser.add_argument("--items", type=int, default=4, help="Issues or items per source.")
+        subparser.add_argument("--pages", type=int, default=50, help="Pages per issue or item.")
+        subparser.add_argument("--lines", type=int, default=40, help="Text lines per page.")
+
+    args = parser.parse_args()
+
+    if args.command == "hrefs":
+        bench_hrefs(collect_files(args.pages, ('.html', '.htm')), repeat=args.repeat, match=args.match)
+    elif args.command == "fixtures":
+        fixtures = make_fixtures(args.directory, items=args.items, pages=args.pages, lines=args.lines)
+        print(f"{len(fixtures['page_files'])} pages written to {args.directory}")
+    elif args.command == "run":
+        params = {'items': args.items, 'pages': args.pages, 'lines': args.lines,
+                  'batch_size': args.batch_size, 'import_concurrency': args.import_concurrency}
+        if args.fixtures:
+            params = {'fixtures': os.path.abspath(args.fixtures), 'batch_size': args.batch_size,
+                      'import_concurrency': args.import_concurrency}
+            results = run_suite(args.fixtures, repeat=args.repeat, only=args.only, batch_size=args.batch_size, concurrency=args.import_concurrency)
+        else:
+            with tempfile.TemporaryDirectory() as root:
+                make_fixtures(root, items=args.items, pages=args.pages, lines=args.lines)
+                results = run_suite(root, repeat=args.repeat, only=args.only, batch_size=args.batch_size, concurrency=args.import_concurrency)
+
+        run = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'params': params,
+            'results': results,
+        }
+
+        previous = [r for r in load_results(args.results) if r['params'] == params]
+        if previous:
+            compare(previous[-1], run, threshold=args.threshold)
+        if not args.no_save:
+            save_results(args.results, run)
+            print(f"Results appended to {args.results}")
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
-from datasource import DataSource
+from datasource import AsyncDataSource, DataSource, add_async_args, add_cache_args, async_kwargs, cache_kwargs
 
+import asyncio
 import logging
 import re
 
@@ -14,17 +15,19 @@ class BSBDataSource(DataSource):
 
     def __init__(self, 
                  source_id: str = SOURCE_ID, 
-                 cache_name: str = "devel"):
+                 cache_name: str = "devel",
+                 **kwargs):
         """
         Initialize the data source
         :param source_id: Source ID for the data source
         :param cache_name: Name of the cache for requests
+        :param kwargs: HTTP cache options passed on to DataSource
         """
         self.source_id = source_id
         self.base_url = f"https://{source_id}"
         self.calendar_url = self.base_url + "/calendar/newspaper/{title_id}"
 
-        super().__init__(source_id=source_id, cache_name=cache_name)
+        super().__init__(source_id=source_id, cache_name=cache_name, **kwargs)
         
     def fetch(self, title_id: str):
         calendar_hrefs = self._get_calendar_hrefs(title_id=title_id)
@@ -35,7 +38,8 @@ class BSBDataSource(DataSource):
         for item_id in item_ids:
             print(item_id)
 
-    def _extract_bsb_id(self, url) -> str | None:
+    @staticmethod
+    def _extract_bsb_id(url) -> str | None:
         pattern = r'bsb\d+(_\d+)*_u\d+'
         match = re.search(pattern, url)
         if match:
@@ -45,12 +49,12 @@ class BSBDataSource(DataSource):
 
     def _get_calendar_hrefs(self, title_id) -> list[str]:
         calendar_url = self.calendar_url.format(title_id=title_id)
-        all_hrefs = utils.get_all_hrefs(calendar_url, session=self.session)
-        year_hrefs = [self.base_url + h for h in all_hrefs if ('calendar' in h and title_id in h)]
+        all_hrefs = utils.get_all_hrefs(calendar_url, session=self.session, match='calendar')
+        year_hrefs = [self.base_url + h for h in all_hrefs if title_id in h]
         all_calendar_hrefs = []
         for yh in year_hrefs:
-            ah = utils.get_all_hrefs(yh, session=self.session)
-            all_calendar_hrefs.extend(self.base_url + h for h in ah if ('calendar' in h and title_id in h))
+            ah = utils.get_all_hrefs(yh, session=self.session, match='calendar')
+            all_calendar_hrefs.extend(self.base_url + h for h in ah if title_id in h)
         
         all_calendar_hrefs = list(set(all_calendar_hrefs))
 
@@ -60,8 +64,8 @@ class BSBDataSource(DataSource):
         all_item_hrefs = []
         
         for ch in calendar_hrefs:
-            ah = utils.get_all_hrefs(ch, session=self.session)
-            all_item_hrefs.extend(self.base_url + h for h in ah if ('view' in h))
+            ah = utils.get_all_hrefs(ch, session=self.session, match='view')
+            all_item_hrefs.extend(self.base_url + h for h in ah)
 
         dedup_item_hrefs = list(set(all_item_hrefs))
         hrefs = [self._extract_bsb_id(href) for href in dedup_item_hrefs]
@@ -72,14 +76,68 @@ class BSBDataSource(DataSource):
         pass
 
 
+class AsyncBSBDataSource(AsyncDataSource):
+    """
+    asyncio port of BSBDataSource. Year and calendar pages are crawled concurrently.
+    """
+
+    def __init__(self,
+                 source_id: str = SOURCE_ID,
+                 **kwargs):
+        """
+        :param kwargs: Client and concurrency options passed on to AsyncDataSource
+        """
+        self.base_url = f"https://{source_id}"
+        self.calendar_url = self.base_url + "/calendar/newspaper/{title_id}"
+
+        super().__init__(source_id, **kwargs)
+
+    async def fetch(self, title_id: str):
+        calendar_url = self.calendar_url.format(title_id=title_id)
+        all_hrefs = await self.get_hrefs(calendar_url, match='calendar')
+        year_hrefs = [self.base_url + h for h in all_hrefs if title_id in h]
+
+        calendar_hrefs = set()
+        for ah in await self._gather_hrefs(year_hrefs, match='calendar'):
+            calendar_hrefs.update(self.base_url + h for h in ah if title_id in h)
+
+        item_hrefs = set()
+        for ah in await self._gather_hrefs(sorted(calendar_hrefs), match='view'):
+            item_hrefs.update(self.base_url + h for h in ah)
+
+        item_ids = [BSBDataSource._extract_bsb_id(href) for href in item_hrefs]
+        for item_id in sorted(i for i in item_ids if i is not None):
+            print(item_id)
+
+    async def _gather_hrefs(self, urls, match):
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def get(url):
+            async with semaphore:
+                return await self.get_hrefs(url, match=match)
+
+        return await asyncio.gather(*(get(url) for url in urls))
+
+    process = staticmethod(BSBDataSource.process)
+
+
 if __name__ == "__main__":
     import argparse
     logging.basicConfig(level=logging.INFO)
 
     parser = argparse.ArgumentParser(description="Fetch item_ids for a given BSB title_id, via calendar entry point.")
     parser.add_argument("title_id", type=str, help="Title ID to fetch data for.")
+    add_cache_args(parser)
+    add_async_args(parser)
     args = parser.parse_args()
 
-    data_source = BSBDataSource(source_id=SOURCE_ID)
-    data_source.fetch(args.title_id)
+    if args.use_async:
+        data_source = AsyncBSBDataSource(source_id=SOURCE_ID, **async_kwargs(args))
+        data_source.run(args.title_id)
+        data_source.log_failures()
+    else:
+        data_source = BSBDataSource(source_id=SOURCE_ID, **cache_kwargs(args))
+        data_source.fetch(args.title_id)
+        data_source.log_cache_stats()
+        data_source.log_failures()
     
\ No newline at end of file
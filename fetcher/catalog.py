@@ -0,0 +1,143 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import wait as futures_wait
+
+DATA_DIRECTORY = "data"
+CATALOG_FILE = os.path.join(DATA_DIRECTORY, "catalog.sqlite")
+PAGE_EXTENSION = ".txt"
+
+def _scan_directory(path: str) -> tuple[list[str], list[str]]:
+    """Return the page files and the subdirectories of one directory."""
+    pages, subdirectories = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.name.endswith(PAGE_EXTENSION):
+                    pages.append(entry.path)
+    except FileNotFoundError:
+        pass
+    return pages, subdirectories
+
+def scan_pages(root: str = DATA_DIRECTORY, max_workers: int = 16) -> list[str]:
+    """
+    Find all page files under `root`, listing directories concurrently with os.scandir.
+    On network storage the time goes to directory listing round trips, so these overlap in a thread pool.
+    :return: Paths of the page files, starting with `root`
+    """
+    pages = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_scan_directory, root)}
+        while pending:
+            done, pending = futures_wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                found, subdirectories = future.result()
+                pages.extend(found)
+                pending.update(executor.submit(_scan_directory, d) for d in subdirectories)
+    return pages
+
+class PageCatalog:
+    """
+    Persistent list of the page files under the data directory, stored in SQLite.
+    Data sources register the pages of an item when they write them, so that gathering and the
+    "already fetched" checks query the catalog instead of walking the whole tree.
+    A missing or unfinished catalog is rebuilt from disk with scan_pages.
+    """
+
+    def __init__(self, path: str = CATALOG_FILE, root: str = DATA_DIRECTORY, max_workers: int = 16):
+        """
+        :param path: Path of the SQLite catalog
+        :param root: Data directory the catalog describes
+        :param max_workers: Number of threads listing directories during a rebuild
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.root = root
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS pages (path TEXT PRIMARY KEY, directory TEXT NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS pages_directory ON pages (directory)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        if self._meta('built') is None:
+            self.rebuild()
+
+    def _meta(self, key: str):
+        with self._lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def rebuild(self):
+        """Replace the catalog with the page files currently on disk."""
+        start = time.perf_counter()
+        pages = scan_pages(self.root, self.max_workers)
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM pages")
+            self.connection.executemany("INSERT INTO pages VALUES (?, ?)",
+                                        ((p, os.path.dirname(p)) for p in pages))
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('built', ?)", (str(time.time()),))
+        logging.info(f"Page catalog rebuilt with {len(pages)} pages in {time.perf_counter() - start:.1f}s")
+
+    def replace_directory(self, directory: str):
+        """
+        Register the page files of one directory, forgetting pages of it that no longer exist.
+        Called by the data sources after writing the pages of an item.
+        """
+        directory = os.path.normpath(directory)
+        pages, _ = _scan_directory(directory)
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM pages WHERE directory = ?", (directory,))
+            self.connection.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?)",
+                                        ((p, directory) for p in pages))
+
+    def pages(self, prefix: str | None = None) -> list[str]:
+        """
+        Return the registered page files, sorted, optionally only those under a directory prefix.
+        """
+        with self._lock:
+            if prefix is None:
+                rows = self.connection.execute("SELECT path FROM pages ORDER BY path")
+            else:
+                prefix = os.path.join(os.path.normpath(prefix), '')
+                rows = self.connection.execute("SELECT path FROM pages WHERE path >= ? AND path < ? ORDER BY path",
+                                               (prefix, _prefix_end(prefix)))
+            return [row[0] for row in rows]
+
+    def directories(self, prefix: str) -> list[str]:
+        """
+        Return the directories under `prefix` that hold at least one registered page.
+        """
+        prefix = os.path.join(os.path.normpath(prefix), '')
+        with self._lock:
+            rows = self.connection.execute("SELECT DISTINCT directory FROM pages WHERE directory >= ? AND directory < ?",
+                                           (prefix, _prefix_end(prefix)))
+            return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+def _prefix_end(prefix: str) -> str:
+    # Smallest string after all strings starting with `prefix`, so the range scan uses the index.
+    # Appending a high character instead would miss names that start with characters above it.
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_catalog(path: str = CATALOG_FILE) -> PageCatalog:
+    """
+    Return the process-wide catalog stored at `path`, opening (and if needed rebuilding) it on first use.
+    """
+    with _catalogs_lock:
+        if path not in _catalogs:
+            _catalogs[path] = PageCatalog(path)
+        return _catalogs[path]
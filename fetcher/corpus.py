@@ -0,0 +1,176 @@
+import gzip
+import logging
+import os
+import re
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_EXTENSIONS = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+def compression_for_path(path: str) -> str | None:
+    """
+    Infer the compression of a JSONL file from its extension.
+    """
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if extension and path.endswith(extension):
+            return compression
+    return None
+
+def open_jsonl(path: str, mode: str = 'r'):
+    """
+    Open a JSONL file in text mode, transparently (de)compressing .gz and .zst files.
+    :param path: Path to the file
+    :param mode: 'r', 'w' or 'a'
+    """
+    compression = compression_for_path(path)
+    if compression == 'gzip':
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("The 'zstandard' package is required to read or write .zst files")
+        if mode == 'a':
+            raise ValueError("Appending to zstd-compressed JSONL files is not supported")
+        return zstandard.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def delta_filename(path: str) -> str:
+    """
+    Return the path of the delta corpus written next to a corpus by incremental gathers,
+    e.g. data/all.delta.jsonl for data/all.jsonl.
+    """
+    base = path[:-len('.jsonl')] if path.endswith('.jsonl') else path
+    return base + '.delta.jsonl'
+
+def resolve_inputs(path: str) -> list[str]:
+    """
+    Return the JSONL files making up a corpus.
+    Either the file itself, or the shards listed in '<path>.shards' by a ShardedJsonlWriter.
+    """
+    if os.path.exists(path):
+        return [path]
+
+    listing = path + '.shards'
+    if os.path.exists(listing):
+        with open(listing, 'r', encoding='utf-8') as file:
+            return [line.strip() for line in file if line.strip()]
+
+    raise FileNotFoundError(f"JSONL file '{path}' does not exist.")
+
+class ShardedJsonlWriter:
+    """
+    Write JSON lines to one or more, optionally compressed, JSONL files.
+
+    Without sharding or compression everything goes to `filename` itself. Otherwise shards are named
+    '<base>[-<key>]-<index>.jsonl[.gz|.zst]' next to `filename`, and their paths are listed
+    in '<filename>.shards' so that insert.py can find them again.
+    When overwriting, the output of earlier runs is removed first, in whatever layout it was written:
+    the shards listed in '<filename>.shards' and any other file named like a shard of `filename`.
+    """
+
+    def __init__(self,
+                 filename: str,
+                 compression: str | None = None,
+                 shard_size: int | None = None,
+                 shard_by_source: bool = False,
+                 mode: str = 'w'):
+        """
+        :param filename: Path of the JSONL corpus, e.g. data/all.jsonl
+        :param compression: None, 'gzip' or 'zstd'
+        :param shard_size: Start a new shard after this many uncompressed bytes
+        :param shard_by_source: Write one series of shards per source
+        :param mode: 'w' to overwrite or 'a' to append (only without sharding)
+        """
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unknown compression '{compression}'")
+        if mode == 'a' and (shard_size or shard_by_source):
+            raise ValueError("Appending is not supported for sharded output")
+
+        self.filename = filename
+        self.compression = compression
+        self.shard_size = shard_size
+        self.shard_by_source = shard_by_source
+        self.mode = mode
+        self.paths = []
+
+        self._base = filename[:-len('.jsonl')] if filename.endswith('.jsonl') else filename
+        self._sharded = bool(compression or shard_size or shard_by_source)
+        self._open = {}
+
+        if mode == 'w':
+            self._remove_previous_output()
+
+        if not shard_by_source:
+            self._open_shard(None, 0)
+
+    def write(self, lines: list[str], source: str | None = None):
+        """
+        Write JSON lines belonging to one source.
+        """
+        key = source if self.shard_by_source else None
+        shard = self._open.get(key)
+        if shard is None:
+            shard = self._open_shard(key, 0)
+        elif self.shard_size and shard['size'] >= self.shard_size:
+            # Rotate only once there is more to write, so no empty shard is left at the end
+            shard['file'].close()
+            shard = self._open_shard(key, shard['index'] + 1)
+
+        for line in lines:
+            shard['file'].write(line)
+            shard['size'] += len(line.encode('utf-8'))
+
+    def close(self):
+        for shard in self._open.values():
+            shard['file'].close()
+        self._open = {}
+
+        if self._sharded:
+            with open(self.filename + '.shards', 'w', encoding='utf-8') as listing:
+                listing.writelines(path + '\n' for path in self.paths)
+            logging.info(f"{len(self.paths)} shards listed in {self.filename}.shards")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _remove_previous_output(self):
+        directory = os.path.dirname(self.filename) or '.'
+        shard_name = re.compile(re.escape(os.path.basename(self._base)) + r'(-.+)?-\d{5}\.jsonl(\.gz|\.zst)?$')
+        compressed = {self._base + '.jsonl' + extension for extension in COMPRESSION_EXTENSIONS.values() if extension}
+
+        listing = self.filename + '.shards'
+        stale = {self.filename, listing} | compressed
+        if os.path.exists(listing):
+            with open(listing, 'r', encoding='utf-8') as file:
+                stale.update(line.strip() for line in file if line.strip())
+        if os.path.isdir(directory):
+            stale.update(os.path.join(directory, name) for name in os.listdir(directory) if shard_name.match(name))
+
+        for path in stale:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _open_shard(self, key, index):
+        if not self._sharded:
+            path = self.filename
+        else:
+            name = self._base
+            if key is not None:
+                name += f"-{key}"
+            if self.shard_size or self.shard_by_source:
+                name += f"-{index:05d}"
+            path = name + '.jsonl' + COMPRESSION_EXTENSIONS[self.compression]
+
+        shard = {'file': open_jsonl(path, self.mode), 'size': 0, 'index': index}
+        self._open[key] = shard
+        self.paths.append(path)
+        return shard
@@ -1,20 +1,440 @@
 from abc import ABC, abstractmethod
 
+import argparse
+import asyncio
+import json
+import email.utils
+import glob
+import logging
+import os
+import random
+import threading
+import time
+import requests
 import requests_cache
 
+from urllib.parse import urlparse
+
+import metrics
+import utils
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+DATA_DIRECTORY = "data"
+
+CACHE_BACKENDS = ['sqlite', 'filesystem', 'memory', 'none']
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_DELAY = 300
+# Seconds to wait for a connection or for data from the server, unless a request sets its own timeout
+DEFAULT_TIMEOUT = 60
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Raised instead of sending a request to a host whose circuit breaker is open.
+    """
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. After `threshold` consecutive failed requests to a host, requests to it
+    fail immediately for `cooldown` seconds; then one trial request is let through to probe the host.
+    """
+
+    def __init__(self, threshold: int = 10, cooldown: float = 60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._opened = {}
+        self._lock = threading.Lock()
+
+    def before_request(self, host: str):
+        with self._lock:
+            opened = self._opened.get(host)
+            if opened is None:
+                return
+            if time.monotonic() - opened < self.cooldown:
+                raise CircuitOpenError(f"Circuit breaker open for {host}")
+            # Half-open: let this request through and give the next ones a new cooldown
+            self._opened[host] = time.monotonic()
+
+    def record(self, host: str, ok: bool):
+        with self._lock:
+            if ok:
+                self._failures.pop(host, None)
+                if self._opened.pop(host, None) is not None:
+                    logging.info(f"Circuit breaker closed for {host}")
+                return
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self.threshold and self._failures[host] >= self.threshold and host not in self._opened:
+                logging.warning(f"Circuit breaker opened for {host} after {self._failures[host]} failed requests")
+                self._opened[host] = time.monotonic()
+
+class FailureLog:
+    """
+    Thread-safe list of requests that still failed after all retries, reported at the end of a run.
+    """
+
+    def __init__(self):
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def record(self, url: str, reason: str):
+        with self._lock:
+            self.failures.append((url, reason))
+
+    def __len__(self):
+        return len(self.failures)
+
+    def write(self, path: str, label: str):
+        """
+        Log the number of failed requests and list them with their reason in a TSV file at `path`.
+        Without failures, a list left at `path` by an earlier run is removed.
+        """
+        if not self.failures:
+            if os.path.exists(path):
+                os.remove(path)
+                logging.info(f"{label}: no failed requests, removed {path} from an earlier run")
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            for url, reason in self.failures:
+                file.write(f"{url}\t{reason}\n")
+        logging.warning(f"{label}: {len(self.failures)} requests failed after retries, listed in {path}")
+
+def retry_delay(response, attempt: int, backoff: float) -> float:
+    """
+    Seconds to wait before retrying: the server's Retry-After if it sent one,
+    otherwise exponential backoff with full jitter.
+    """
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        if retry_after.strip().isdigit():
+            return min(int(retry_after), MAX_RETRY_DELAY)
+        try:
+            date = email.utils.parsedate_to_datetime(retry_after)
+            return min(max(date.timestamp() - time.time(), 0), MAX_RETRY_DELAY)
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(backoff * 2 ** attempt, MAX_RETRY_DELAY))
+
+class CacheStats:
+    """
+    Thread-safe counters of cache hits, misses, retries and response bytes for one session.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record(self, response):
+        from_cache = getattr(response, 'from_cache', False)
+        length = response.headers.get('Content-Length')
+        if length is not None and length.isdigit():
+            size = int(length)
+        elif from_cache:
+            size = len(response.content)
+        else:
+            size = 0
+
+        with self._lock:
+            if from_cache:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.bytes += size
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'bytes': self.bytes, 'retries': self.retries}
+
+class InstrumentedSession(requests_cache.CachedSession):
+    """
+    Cached session shared by all data sources. It counts cache hits and misses, retries transient
+    failures with backoff, stops hammering hosts that keep failing (circuit breaker) and records
+    requests that failed for good. It can be restricted to the cache (offline mode), in which case
+    requests missing from the cache get a 504 response instead of going to the network.
+    """
+
+    def __init__(self,
+                 *args,
+                 offline: bool = False,
+                 max_retries: int = 5,
+                 backoff: float = 1.0,
+                 pool_size: int = 10,
+                 breaker: CircuitBreaker | None = None,
+                 timeout: float | None = DEFAULT_TIMEOUT,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.offline = offline
+        self.timeout = timeout or None
+        self.stats = CacheStats()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.failures = FailureLog()
+
+        # Keep one connection per worker thread alive instead of reconnecting for every page. The pool blocks
+        # when all of a host's connections are in use, which caps the requests in flight per host for all
+        # threads sharing this session, however many titles they work on.
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def send(self, request, **kwargs):
+        # A server that stops answering would otherwise hold a worker thread and a pooled connection forever
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+
+        if self.offline:
+            kwargs['only_if_cached'] = True
+            response = super().send(request, **kwargs)
+            self.stats.record(response)
+            return response
+
+        host = urlparse(request.url).netloc
+        attempt = 0
+        while True:
+            response = None
+            try:
+                self.breaker.before_request(host)
+                response = super().send(request, **kwargs)
+                self.stats.record(response)
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record(host, True)
+                    if response.status_code >= 400:
+                        self.failures.record(request.url, f"HTTP {response.status_code}")
+                    return response
+                error = None
+            except CircuitOpenError as e:
+                self.failures.record(request.url, str(e))
+                raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            self.breaker.record(host, False)
+            if attempt >= self.max_retries:
+                self.failures.record(request.url, str(error) if error else f"HTTP {response.status_code}")
+                if error:
+                    raise error
+                return response
+
+            delay = retry_delay(response, attempt, self.backoff)
+            reason = error or f"HTTP {response.status_code}"
+            logging.warning(f"Retrying {request.url} in {delay:.1f}s ({reason})")
+            self.stats.record_retry()
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+def _cache_path(cache_dir: str, name: str, backend: str) -> str:
+    """
+    Return the path of a persistent HTTP cache.
+    The '.sqlite' suffix is added explicitly, as requests_cache would take e.g. the '.at' of a
+    source ID for an extension and not add one.
+    """
+    path = os.path.join(cache_dir, name)
+    return path + '.sqlite' if backend == 'sqlite' else path
+
+def _cache_exists(cache_dir: str, name: str, backend: str) -> bool:
+    """
+    Return whether a persistent HTTP cache of the given name exists on disk.
+    """
+    return backend in ('sqlite', 'filesystem') and os.path.exists(_cache_path(cache_dir, name, backend))
+
+def create_session(cache_name: str = "devel",
+                   namespace: str = "",
+                   backend: str = "sqlite",
+                   cache_dir: str = ".",
+                   expire_after: int = -1,
+                   offline: bool = False,
+                   max_retries: int = 5,
+                   backoff: float = 1.0,
+                   pool_size: int = 10,
+                   breaker_threshold: int = 10,
+                   timeout: float | None = DEFAULT_TIMEOUT) -> InstrumentedSession:
+    """
+    Create the HTTP session used by a data source.
+    :param cache_name: Name of the cache for requests
+    :param namespace: Suffix that gives each source its own cache (e.g. its own SQLite file), or '' to share one.
+        If only the shared cache exists on disk, it is used instead.
+    :param backend: One of CACHE_BACKENDS; 'none' disables caching
+    :param cache_dir: Directory the sqlite and filesystem backends write to
+    :param expire_after: Seconds after which cached responses expire (-1 never expires)
+    :param offline: Only answer from the cache and never touch the network
+    :param max_retries: Retries of a request after connection errors and 429/5xx responses
+    :param backoff: Base delay in seconds of the exponential backoff between retries
+    :param pool_size: Maximum number of connections per host; further requests wait for a free connection
+    :param breaker_threshold: Consecutive failures after which a host is given a rest (0 disables the breaker)
+    :param timeout: Seconds to wait for a connection or for data from the server, for requests that set no timeout (0 or None: wait forever)
+    """
+    name = f"{cache_name}-{namespace}" if namespace else cache_name
+    if namespace and not _cache_exists(cache_dir, name, backend) and _cache_exists(cache_dir, cache_name, backend):
+        # Caches filled before they were split per source stay in use rather than being orphaned
+        logging.info(f"Using the existing shared cache '{cache_name}' for {namespace}; "
+                     f"rename or remove it to start a per-source cache '{name}'")
+        name = cache_name
+    kwargs = {}
+    if backend == 'none':
+        backend = 'memory'
+        expire_after = requests_cache.DO_NOT_CACHE
+    elif backend == 'sqlite':
+        # Write-ahead logging lets concurrent fetcher threads read while another one writes
+        kwargs['wal'] = True
+    if offline:
+        expire_after = requests_cache.NEVER_EXPIRE
+
+    return InstrumentedSession(_cache_path(cache_dir, name, backend),
+                               backend=backend,
+                               expire_after=expire_after,
+                               offline=offline,
+                               max_retries=max_retries,
+                               backoff=backoff,
+                               pool_size=pool_size,
+                               breaker=CircuitBreaker(threshold=breaker_threshold),
+                               timeout=timeout,
+                               **kwargs)
+
+def add_cache_args(parser: argparse.ArgumentParser):
+    """
+    Add HTTP cache and retry arguments to the argument parser.
+    """
+    parser.add_argument('--cache-backend', choices=CACHE_BACKENDS, default='sqlite', help='Backend for the HTTP cache')
+    parser.add_argument('--cache-dir', type=str, default='.', help='Directory for the HTTP cache')
+    parser.add_argument('--cache-expire-after', type=int, default=-1, help='Seconds after which cached responses expire (-1: never)')
+    parser.add_argument('--cache-shared', action='store_true', help='Use one cache for all sources instead of one per source')
+    parser.add_argument('--offline', action='store_true', help='Only use cached responses and never touch the network')
+    parser.add_argument('--refresh', action='store_true', help='Revalidate fetched manifests and issues with conditional requests and re-download changed ones')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries of a request after connection errors and 429/5xx responses')
+    parser.add_argument('--retry-backoff', type=float, default=1.0, help='Base delay in seconds of the exponential backoff between retries')
+    parser.add_argument('--breaker-threshold', type=int, default=10, help='Consecutive failures after which requests to a host are paused (0: never)')
+    parser.add_argument('--request-timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds to wait for a connection or for data from the server before retrying (0: wait forever)')
+    return parser
+
+def cache_kwargs(args: argparse.Namespace) -> dict:
+    """
+    Return DataSource keyword arguments for the arguments added by add_cache_args.
+    """
+    return {
+        'cache_backend': args.cache_backend,
+        'cache_dir': args.cache_dir,
+        'cache_expire_after': args.cache_expire_after,
+        'cache_shared': args.cache_shared,
+        'offline': args.offline,
+        'refresh': args.refresh,
+        'max_retries': args.max_retries,
+        'retry_backoff': args.retry_backoff,
+        'breaker_threshold': args.breaker_threshold,
+        'request_timeout': args.request_timeout,
+    }
+
 class DataSource(ABC):
     """
     Abstract base class for data sources.
     """
 
     @abstractmethod
-    def __init__(self, source_id: str, cache_name: str = "devel"):
+    def __init__(self,
+                 source_id: str,
+                 cache_name: str = "devel",
+                 max_workers: int = 4,
+                 cache_backend: str = "sqlite",
+                 cache_dir: str = ".",
+                 cache_expire_after: int = -1,
+                 cache_shared: bool = False,
+                 offline: bool = False,
+                 refresh: bool = False,
+                 max_retries: int = 5,
+                 retry_backoff: float = 1.0,
+                 breaker_threshold: int = 10,
+                 request_timeout: float = DEFAULT_TIMEOUT):
         """
         Initialize the data source
         :param cache_name: Name of the cache for requests
+        :param max_workers: Maximum number of concurrent requests to the source host, shared by all titles fetched at once
+        :param cache_backend: Backend for the HTTP cache (see create_session)
+        :param cache_dir: Directory for the HTTP cache
+        :param cache_expire_after: Seconds after which cached responses expire (-1 never expires)
+        :param cache_shared: Share one cache between all sources instead of namespacing it by source_id
+        :param offline: Only answer requests from the cache
+        :param refresh: Revalidate items fetched earlier and download them again if they changed upstream
+        :param max_retries: Retries of a request after connection errors and 429/5xx responses
+        :param retry_backoff: Base delay in seconds of the exponential backoff between retries
+        :param breaker_threshold: Consecutive failures after which requests to a host are paused
+        :param request_timeout: Seconds to wait for a connection or for data from the server (0: wait forever)
         """
-        self.session = requests_cache.CachedSession(cache_name)
+        self.session = create_session(cache_name,
+                                      namespace="" if cache_shared else source_id,
+                                      backend=cache_backend,
+                                      cache_dir=cache_dir,
+                                      expire_after=cache_expire_after,
+                                      offline=offline,
+                                      max_retries=max_retries,
+                                      backoff=retry_backoff,
+                                      pool_size=max_workers,
+                                      breaker_threshold=breaker_threshold,
+                                      timeout=request_timeout)
         self.source_id = source_id
+        self.max_workers = max_workers
+
+        if refresh and offline:
+            logging.warning("Ignoring --refresh in offline mode")
+        self.refresh = refresh and not offline
+
+    def log_cache_stats(self):
+        """
+        Log the cache hit, miss and byte counters of this source's session.
+        """
+        stats = self.session.stats.summary()
+        logging.info(f"{self.source_id} cache: {stats['hits']} hits, {stats['misses']} misses, {stats['bytes']} bytes")
+
+    def record_metrics(self):
+        """
+        Add the cache, retry and failure counters of this source's session to the run metrics.
+        """
+        stats = self.session.stats.summary()
+        metrics.registry.inc('cache_hits', stats['hits'], source=self.source_id)
+        metrics.registry.inc('cache_misses', stats['misses'], source=self.source_id)
+        metrics.registry.inc('bytes_fetched', stats['bytes'], source=self.source_id)
+        metrics.registry.inc('retries', stats['retries'], source=self.source_id)
+        metrics.registry.inc('failed_requests', len(self.session.failures), source=self.source_id)
+
+    def log_failures(self, path: str | None = None):
+        """
+        Log the requests of this source that failed after all retries and write them to
+        `path` (default data/failed-<source_id>.tsv) for a targeted retry.
+        Items with failed pages are not marked complete, so rerunning the fetch downloads only those pages.
+        """
+        self.session.failures.write(path or os.path.join(DATA_DIRECTORY, f"failed-{self.source_id}.tsv"), self.source_id)
+
+    def revalidate(self, url: str, validators: utils.ValidatorStore):
+        """
+        Revalidate a resource fetched earlier with a conditional GET, bypassing the HTTP cache.
+        Resources fetched before validators were recorded have nothing to compare against: their
+        validators are seeded from the response and they count as unchanged.
+        The caller saves `validators` afterwards.
+        :return: The new response if the resource changed upstream, otherwise None
+        """
+        seeded = url not in validators
+        try:
+            response, changed = utils.conditional_get(url, self.session, validators)
+        except requests.RequestException as e:
+            logging.warning(f"Could not revalidate {url}: {e}")
+            return None
+        if seeded:
+            logging.info(f"Recorded validators for {url}; changes are detected from the next refresh on")
+            return None
+        return response if changed else None
 
     @abstractmethod
     def fetch(self, item_id: str):
@@ -23,6 +443,335 @@ class DataSource(ABC):
         """
         pass
 
+    def item_directory(self, item_id: str) -> str | None:
+        """
+        Return the directory holding the page .txt files of an item, or None if the source stores none.
+        """
+        return None
+
+    def fetch_records(self, item_id: str, *args, page_files: bool = True, **kwargs):
+        """
+        Fetch an item and yield a processed record for each of its pages.
+        Used by the pipeline mode in fetcher.py to stream records into Typesense while fetching continues.
+        :param page_files: Whether per-page .txt files are needed; sources that download pages as files always write them
+        """
+        self.fetch(item_id, *args, **kwargs)
+
+        directory = self.item_directory(item_id)
+        if directory is None:
+            return
+
+        for file_path in sorted(glob.glob(os.path.join(directory, '*.txt'))):
+            record = self.process(file_path, DATA_DIRECTORY)
+            if record:
+                yield record
+
+    @staticmethod
+    @abstractmethod
+    def process(file_path: str, data_directory: str):
+        """
+        Process data from a data file based on an item_id query.
+        """
+        pass
+
+
+def add_async_args(parser: argparse.ArgumentParser):
+    """
+    Add arguments for fetching with the async data sources.
+    """
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Fetch with the asyncio data sources (requires aiohttp)')
+    parser.add_argument('--max-concurrency', type=int, default=100, help='With --async, maximum number of concurrent requests')
+    parser.add_argument('--max-per-host', type=int, default=16, help='With --async, maximum number of concurrent requests per host')
+    return parser
+
+def async_kwargs(args: argparse.Namespace) -> dict:
+    """
+    Return AsyncDataSource keyword arguments for the arguments added by add_cache_args and add_async_args.
+    The async client does not use the HTTP cache, so the cache options are ignored.
+    """
+    if args.offline:
+        logging.warning("Ignoring --offline with --async: the async client has no HTTP cache")
+    return {
+        'refresh': args.refresh,
+        'max_concurrency': args.max_concurrency,
+        'max_per_host': args.max_per_host,
+        'max_retries': args.max_retries,
+        'retry_backoff': args.retry_backoff,
+        'breaker_threshold': args.breaker_threshold,
+        'timeout': args.request_timeout,
+    }
+
+class AsyncResponse:
+    """
+    Fully read response of the async client, with the parts of the requests API the sources use.
+    """
+
+    def __init__(self, url: str, status_code: int, headers, content: bytes, encoding: str | None = None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code} for {self.url}")
+
+class AsyncHttpClient:
+    """
+    aiohttp client that can be shared by any number of async data sources in one event loop.
+    Concurrency is bounded in total and per host by the connection pool. Transient failures are
+    retried like in InstrumentedSession, with the same circuit breaker and failure log.
+    Responses are not cached.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = 100,
+                 max_per_host: int = 16,
+                 max_retries: int = 5,
+                 retry_backoff: float = 1.0,
+                 breaker_threshold: int = 10,
+                 timeout: float | None = DEFAULT_TIMEOUT):
+        """
+        :param max_concurrency: Maximum number of concurrent requests
+        :param max_per_host: Maximum number of concurrent requests to one host
+        :param max_retries: Retries of a request after connection errors and 429/5xx responses
+        :param retry_backoff: Base delay in seconds of the exponential backoff between retries
+        :param breaker_threshold: Consecutive failures after which a host is given a rest (0 disables the breaker)
+        :param timeout: Seconds to wait for a connection or for data from the server, as in InstrumentedSession (0 or None: wait forever)
+        """
+        if aiohttp is None:
+            raise ImportError("The 'aiohttp' package is required for the async data sources")
+
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.max_retries = max_retries
+        self.backoff = retry_backoff
+        self.timeout = timeout or None
+        self.breaker = CircuitBreaker(threshold=breaker_threshold)
+        self.failures = FailureLog()
+        self.retries = 0
+        # Request, byte, retry and failure counters per source, as the client is shared by all sources
+        self.stats = {}
+        self._session = None
+
+    async def open(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.max_per_host)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(sock_connect=self.timeout, sock_read=self.timeout))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _count(self, source: str | None, counter: str, value: int = 1):
+        stats = self.stats.setdefault(source, {})
+        stats[counter] = stats.get(counter, 0) + value
+
+    def _fail(self, source: str | None, url: str, reason: str):
+        self.failures.record(url, reason)
+        self._count(source, 'failed_requests')
+
+    async def get(self, url: str, headers: dict | None = None, source: str | None = None) -> AsyncResponse:
+        """
+        GET a URL and read the whole body, retrying transient failures.
+        :param source: ID of the requesting data source, used to label the request counters
+        :raises requests.ConnectionError: if the request still fails after all retries
+        """
+        await self.open()
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            response = None
+            try:
+                self.breaker.before_request(host)
+                self._count(source, 'requests')
+                async with self._session.get(url, headers=headers) as r:
+                    response = AsyncResponse(url, r.status, r.headers, await r.read(), r.charset)
+                self._count(source, 'bytes_fetched', len(response.content))
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record(host, True)
+                    if response.status_code >= 400:
+                        self._fail(source, url, f"HTTP {response.status_code}")
+                    return response
+                error = None
+            except CircuitOpenError as e:
+                self._fail(source, url, str(e))
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            self.breaker.record(host, False)
+            reason = repr(error) if error else f"HTTP {response.status_code}"
+            if attempt >= self.max_retries:
+                self._fail(source, url, reason)
+                if error:
+                    raise requests.ConnectionError(f"{url}: {reason}") from error
+                return response
+
+            delay = retry_delay(response, attempt, self.backoff)
+            logging.warning(f"Retrying {url} in {delay:.1f}s ({reason})")
+            self.retries += 1
+            self._count(source, 'retries')
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def record_metrics(self):
+        """
+        Add the request, byte, retry and failure counters of each source using this client to the run metrics.
+        """
+        for source, stats in self.stats.items():
+            labels = {'source': source} if source else {}
+            for counter, value in stats.items():
+                metrics.registry.inc(counter, value, **labels)
+
+    async def download(self, url: str, path: str, source: str | None = None) -> bool:
+        """
+        Download a remote file to `path`, renaming a temporary file into place once complete.
+        :param source: ID of the requesting data source, used to label the request counters
+        :return: True if the file was downloaded
+        """
+        try:
+            response = await self.get(url, source=source)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logging.error(f"Error downloading {url}: {e}")
+            return False
+        await asyncio.to_thread(write_file, path, response.content)
+        logging.info(f"File downloaded successfully to {path}")
+        return True
+
+def write_file(path: str, content: bytes):
+    """
+    Write `content` to `path` through a temporary file, so readers never see a truncated file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.part'
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+class AsyncDataSource(ABC):
+    """
+    Abstract base class for asyncio data sources.
+    Fetching is done with an AsyncHttpClient, which may be shared with other sources in the same event loop.
+    """
+
+    @abstractmethod
+    def __init__(self,
+                 source_id: str,
+                 client: AsyncHttpClient | None = None,
+                 max_workers: int = 16,
+                 refresh: bool = False,
+                 **client_kwargs):
+        """
+        Initialize the data source
+        :param client: Shared HTTP client; a client of its own is created from `client_kwargs` if None
+        :param max_workers: Maximum number of concurrent page requests per item
+        :param refresh: Revalidate items fetched earlier and download them again if they changed upstream
+        :param client_kwargs: max_concurrency, max_per_host, max_retries, retry_backoff, breaker_threshold and timeout
+        """
+        if client is None:
+            client = AsyncHttpClient(**client_kwargs)
+        self.client = client
+        self.source_id = source_id
+        self.max_workers = max_workers
+        self.refresh = refresh
+
+    def run(self, *args, **kwargs):
+        """
+        Run fetch(*args, **kwargs) in a new event loop and close the client afterwards.
+        """
+        async def main():
+            async with self.client:
+                await self.fetch(*args, **kwargs)
+        asyncio.run(main())
+
+    def log_failures(self, path: str | None = None):
+        """
+        Log the requests that failed after all retries and write them to `path`
+        (default data/failed-<source_id>.tsv) for a targeted retry.
+        """
+        self.client.failures.write(path or os.path.join(DATA_DIRECTORY, f"failed-{self.source_id}.tsv"), self.source_id)
+
+    async def get_hrefs(self, url: str, match=None) -> list[str]:
+        """
+        Async counterpart of utils.get_all_hrefs.
+        """
+        response = await self.client.get(url, source=self.source_id)
+        if response.status_code == 200:
+            return utils.extract_hrefs(response.text, match=match)
+        return []
+
+    async def revalidate(self, url: str, validators: utils.ValidatorStore):
+        """
+        Revalidate a resource fetched earlier with a conditional GET.
+        As in DataSource.revalidate, resources without stored validators are seeded and count as unchanged.
+        :return: The new response if the resource changed upstream, otherwise None
+        """
+        seeded = url not in validators
+        try:
+            response = await self.client.get(url, headers=validators.headers(url), source=self.source_id)
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logging.warning(f"Could not revalidate {url}: {e}")
+            return None
+        changed = validators.update(url, response)
+        if seeded:
+            logging.info(f"Recorded validators for {url}; changes are detected from the next refresh on")
+            return None
+        return response if changed else None
+
+    async def download_files(self, jobs, journal: utils.DownloadJournal | None = None) -> list[str]:
+        """
+        Download (url, path) jobs concurrently, at most max_workers at a time.
+        :param journal: Optional DownloadJournal; files it lists are skipped and completed downloads are recorded in it
+        :return: Paths of the files that could not be downloaded
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+        if journal is not None:
+            # Journal lookups and writes touch the disk, so they run in threads rather than on the event loop
+            jobs = await asyncio.to_thread(lambda: [(url, path) for url, path in jobs if not journal.is_done(path)])
+
+        async def download(url, path):
+            async with semaphore:
+                ok = await self.client.download(url, path, source=self.source_id)
+            if not ok:
+                return path
+            if journal is not None:
+                await asyncio.to_thread(journal.record, path)
+            return None
+
+        results = await asyncio.gather(*(download(url, path) for url, path in jobs))
+        failed = [path for path in results if path is not None]
+        if failed:
+            logging.error(f"{len(failed)} of {len(jobs)} downloads failed")
+        return failed
+
+    @abstractmethod
+    async def fetch(self, item_id: str):
+        """
+        Fetch data from the data source based on an item_id query.
+        """
+        pass
+
     @staticmethod
     @abstractmethod
     def process(file_path: str, data_directory: str):
@@ -1,103 +1,386 @@
 #!/usr/bin/env python
 import argparse
+import asyncio
+import contextlib
+import functools
 import logging
 import json
+import os
+import queue
+import threading
+import time
 import yaml
-import glob
 
 from tqdm import tqdm
 
+import catalog
+import corpus
 import insert
 import gather
+import metrics
+import profiling
+import schema
+import utils
 
-from mdz import MDZDataSource
-from abo import ABODataSource
-from anno import AnnoDataSource
-from bsb import BSBDataSource
-from datasource import DataSource
+from mdz import AsyncMDZDataSource, MDZDataSource
+from abo import AsyncABODataSource, ABODataSource
+from anno import AsyncAnnoDataSource, AnnoDataSource
+from bsb import AsyncBSBDataSource, BSBDataSource
+from datasource import DATA_DIRECTORY, AsyncDataSource, AsyncHttpClient, DataSource, add_async_args, add_cache_args, async_kwargs, cache_kwargs
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures import wait as futures_wait
 
-def get_items(yaml_file: str):
+# Map YAML source names to their respective DataSource implementations
+FETCHER_CLASSES: dict[str, type[DataSource]] = {
+    "mdz": MDZDataSource,
+    "abo": ABODataSource,
+    "anno": AnnoDataSource,
+    "bsb": BSBDataSource
+}
+
+ASYNC_FETCHER_CLASSES: dict[str, type[AsyncDataSource]] = {
+    "mdz": AsyncMDZDataSource,
+    "abo": AsyncABODataSource,
+    "anno": AsyncAnnoDataSource,
+    "bsb": AsyncBSBDataSource
+}
+
+def load_sources(yaml_file: str) -> dict[str, dict]:
     """
-    Retrieve and save items listed in the provided sources YAML file
+    Read the provided sources YAML file.
+    `title_ids` is either a list of IDs (MDZ, ABO) or a mapping of ID to min/max metadata (ANNO).
+    An optional per-source `concurrency` sets how many titles are fetched from that host at once.
+
+    :return: Mapping of source name to {'titles': [(title_id, extra fetch arguments)], 'concurrency': int | None}
     """
     with open(yaml_file, 'r') as file:
         sources = yaml.safe_load(file)
 
-    # Map YAML source names to their respective DataSource implementations
-    fetcher_classes: dict[str, type[DataSource]] = {
-        "mdz": MDZDataSource,
-        "abo": ABODataSource,
-        "anno": AnnoDataSource,
-        "bsb": BSBDataSource
-    }
-
+    loaded = {}
     for source in sources:
-        logging.info(f"Processing source: {source}")
-        source_class = fetcher_classes[source]() # type: ignore
-
-        for title_id in sources[source]['title_ids']:
-            tid = sources[source]['title_ids']
-            logging.info(f"Fetching data for title ID: {title_id}")
-
+        tid = sources[source]['title_ids']
+        titles = []
+        for title_id in tid:
             # MDZ, ABO
             if isinstance(tid, list):
-                source_class.fetch(title_id)
+                titles.append((title_id, ()))
             # ANNO has extra metadata for min/max
             elif isinstance(tid, dict):
-                source_class.fetch(title_id, *tid[title_id].values())
+                titles.append((title_id, tuple(tid[title_id].values())))
+        loaded[source] = {'titles': titles, 'concurrency': sources[source].get('concurrency')}
+
+    return loaded
+
+def schedule_titles(yaml_file: str, work, titles_per_host: int = 1, source_kwargs: dict | None = None) -> list[DataSource]:
+    """
+    Run `work(data_source, title_id, extra)` for every title in the sources YAML file.
+    Sources live on different hosts and run in parallel; within a source at most
+    `titles_per_host` titles (or the source's own `concurrency` setting) are worked on at once.
+    The titles of a source share its session, whose connection pool caps the requests in flight to the
+    host at the source's `max_workers` however many titles run at once.
+    Errors are logged per title, so a failing or slow host does not hold up the others.
+
+    :param yaml_file: Path to the sources YAML file
+    :param work: Callable taking a data source, a title ID and a tuple of extra fetch arguments
+    :param titles_per_host: Default number of titles fetched concurrently from each source
+    :param source_kwargs: Keyword arguments (e.g. HTTP cache options) used to create each data source
+    :return: The data sources that were used
+    """
+    sources = load_sources(yaml_file)
+    data_sources = []
+
+    def run_title(source_class, title_id, extra):
+        logging.info(f"Fetching data for title ID: {title_id}")
+        try:
+            work(source_class, title_id, extra)
+        except Exception as e:
+            logging.error(f"Error fetching {title_id}: {e}")
+
+    def run_source(source, config):
+        logging.info(f"Processing source: {source}")
+        source_class = FETCHER_CLASSES[source](**(source_kwargs or {})) # type: ignore
+        data_sources.append(source_class)
+        with metrics.registry.timer('fetch', source=source_class.source_id), \
+                ThreadPoolExecutor(max_workers=config['concurrency'] or titles_per_host) as executor:
+            for title_id, extra in config['titles']:
+                executor.submit(run_title, source_class, title_id, extra)
+
+    with ThreadPoolExecutor(max_workers=max(len(sources), 1)) as executor:
+        futures = {executor.submit(run_source, source, config): source for source, config in sources.items()}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Error processing source {futures[future]}: {e}")
+
+    return data_sources
+
+def get_items(yaml_file: str, titles_per_host: int = 1, source_kwargs: dict | None = None) -> list[DataSource]:
+    """
+    Retrieve and save items listed in the provided sources YAML file
+    """
+    def fetch(source_class, title_id, extra):
+        source_class.fetch(title_id, *extra)
+
+    return schedule_titles(yaml_file, fetch, titles_per_host=titles_per_host, source_kwargs=source_kwargs)
+
+async def get_items_async(yaml_file: str, titles_per_host: int = 1, source_kwargs: dict | None = None) -> AsyncHttpClient:
+    """
+    Async counterpart of get_items: fetch every title in one event loop, with one HTTP client shared by all sources.
+    Titles are scheduled per source like in schedule_titles.
+
+    :param source_kwargs: AsyncDataSource keyword arguments (see datasource.async_kwargs); the client options configure the shared client
+    :return: The client, whose failure log covers all sources
+    """
+    sources = load_sources(yaml_file)
+    client_kwargs = dict(source_kwargs or {})
+    refresh = client_kwargs.pop('refresh', False)
+
+    async with AsyncHttpClient(**client_kwargs) as client:
+
+        async def run_source(source, config):
+            logging.info(f"Processing source: {source}")
+            data_source = ASYNC_FETCHER_CLASSES[source](client=client, refresh=refresh) # type: ignore
+            semaphore = asyncio.Semaphore(config['concurrency'] or titles_per_host)
+
+            async def run_title(title_id, extra):
+                async with semaphore:
+                    logging.info(f"Fetching data for title ID: {title_id}")
+                    try:
+                        await data_source.fetch(title_id, *extra)
+                    except Exception as e:
+                        logging.error(f"Error fetching {title_id}: {e}")
+
+            with metrics.registry.timer('fetch', source=data_source.source_id):
+                await asyncio.gather(*(run_title(title_id, extra) for title_id, extra in config['titles']))
+
+        await asyncio.gather(*(run_source(source, config) for source, config in sources.items()))
+
+    return client
+
+def run_pipeline(yaml_file: str, client, jsonl_file: str | None = None, queue_size: int = 1024, titles_per_host: int = 1, projection: dict[str, str] | None = None, source_kwargs: dict | None = None, page_files: bool = False, **insert_kwargs):
+    """
+    Fetch, process and index in one streaming pass.
+    Page records are produced by DataSource.fetch_records in a background thread and handed to the
+    Typesense importer through a bounded queue, so fetching blocks when indexing falls behind.
 
-def run_gather(batch):
+    :param yaml_file: Path to the sources YAML file
+    :param client: Typesense client, or None to only write the JSONL file
+    :param jsonl_file: Optional path to also write the records to as JSON lines
+    :param queue_size: Maximum number of records waiting to be indexed
+    :param titles_per_host: Default number of titles fetched concurrently from each source
+    :param projection: Field projection (see schema.py) applied to each record and used for the schema
+    :param source_kwargs: Keyword arguments (e.g. HTTP cache options) used to create each data source
+    :param page_files: Also write per-page .txt files for sources that split their pages out of larger downloads (ANNO)
+    :param insert_kwargs: Keyword arguments passed on to insert.insert_lines
+    """
+    records = queue.Queue(maxsize=queue_size)
+    done = object()
+    # Set once the consumer is gone, so the producer stops instead of blocking on the full queue forever
+    stopped = threading.Event()
+    data_sources = []
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                records.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        def fetch_records(source_class, title_id, extra):
+            if stopped.is_set():
+                return
+            for record in source_class.fetch_records(title_id, *extra, page_files=page_files):
+                record['id'] = schema.document_id(record['local_path'])
+                source = record['source']
+                if projection:
+                    record = schema.project(record, projection)
+                line = json.dumps(record) + "\n"
+                metrics.registry.inc('records_gathered', source=source)
+                metrics.registry.inc('bytes_gathered', len(line), source=source)
+                if not put(line):
+                    return
+
+        try:
+            data_sources.extend(schedule_titles(yaml_file, fetch_records, titles_per_host=titles_per_host, source_kwargs=source_kwargs))
+        finally:
+            put(done)
+
+    def consume(outfile):
+        while (line := records.get()) is not done:
+            if outfile:
+                outfile.write(line)
+            yield line
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        with open(jsonl_file, 'w') if jsonl_file else contextlib.nullcontext() as outfile:
+            if client is None:
+                for _ in consume(outfile):
+                    pass
+            else:
+                insert.insert_lines(consume(outfile), client, projection=projection, **insert_kwargs)
+    finally:
+        # If the import failed, the titles still being fetched give up at their next record
+        stopped.set()
+        producer.join()
+
+    for data_source in data_sources:
+        data_source.log_cache_stats()
+        data_source.log_failures()
+        data_source.record_metrics()
+
+def run_gather(batch, projection=None):
     """
     Ingest a list of .txt files and process into JSON lines.
     Used by ThreadPoolExecutor to parallelize the processing in convert_files_to_jsonl.
 
     :param batch: List of file paths to process
-    :return: List of JSON lines
+    :param projection: Optional field projection (see schema.py) applied to each record
+    :return: Dicts mapping each source to its JSON lines and to the seconds spent processing its files
     """
 
     # Process each file in the batch and collect JSON lines
-    lines = []
+    lines = {}
+    seconds = {}
     for file_path in batch:
-        json_nl = gather.process_file(file_path)
+        start = time.perf_counter()
+        try:
+            json_nl = gather.process_file(file_path)
+        except FileNotFoundError:
+            # Removed since it was registered in the page catalog
+            logging.warning(f"Skipping {file_path}, which no longer exists (see --rebuild-catalog)")
+            continue
         if json_nl:
             # If process_file returns a dict, append as JSON line
-            lines.append(json.dumps(json_nl) + "\n")
-    return lines
+            source = json_nl['source']
+            json_nl['id'] = schema.document_id(json_nl['local_path'])
+            if projection:
+                json_nl = schema.project(json_nl, projection)
+            lines.setdefault(source, []).append(json.dumps(json_nl) + "\n")
+            seconds[source] = seconds.get(source, 0.0) + time.perf_counter() - start
+    return lines, seconds
 
 
-def convert_files_to_jsonl(filename: str = 'data/all.jsonl', batch_size: int = 64, max_workers: int = 4):
+def convert_files_to_jsonl(filename: str = 'data/all.jsonl',
+                           batch_size: int = 64,
+                           max_workers: int = 4,
+                           use_processes: bool = False,
+                           max_in_flight: int | None = None,
+                           ordered: bool = False,
+                           incremental: str | None = None,
+                           state_file: str = gather.STATE_FILE,
+                           compression: str | None = None,
+                           shard_size: int | None = None,
+                           shard_by_source: bool = False,
+                           projection: dict[str, str] | None = None) -> list[str]:
     """
-      Find all .txt files under 'data' directory and save them to all.jsonl
+      Take all .txt files registered in the page catalog and save them to all.jsonl
         in chunks of 64 files.
+
+    :param filename: Path of the JSONL file to write
+    :param batch_size: Number of files processed by each task
+    :param max_workers: Number of worker threads or processes
+    :param use_processes: Use a process pool instead of a thread pool
+    :param max_in_flight: Maximum number of batches submitted but not yet written (defaults to 2 * max_workers)
+    :param ordered: Write batches in file order rather than as they complete
+    :param incremental: Only gather files that are new or changed since the last delta imported by insert.update
+        into the delta corpus (see corpus.delta_filename), either leaving `filename` alone ('delta') or also appending
+        them to it ('append'). Deleted files are listed one per line in '<filename>.deleted'. A delta that was not
+        imported yet is folded into the new one (see gather.GatherState).
+        In 'append' mode a changed page keeps its earlier record, so the newer one appears later in the file
+        and replaces it on import, as records have a stable id.
+    :param state_file: Path of the gather state store used in incremental mode
+    :param compression: Compress the output with 'gzip' or 'zstd'
+    :param shard_size: Start a new output shard after this many bytes
+    :param shard_by_source: Write separate output shards per source
+    :param projection: Field projection (see schema.py) applied to each record
+    :return: List of the JSONL files written
     """
     def chunked(iterable, n):
         """Yield successive n-sized chunks from iterable."""
         for i in range(0, len(iterable), n):
             yield iterable[i:i + n]
-            
-    files = glob.glob('data/**/*.txt', recursive=True)
+
+    def write_output(item, outfiles):
+        future, batch = item
+        try:
+            output, seconds = future.result()
+            for source, lines in output.items():
+                for outfile in outfiles:
+                    outfile.write(lines, source)
+                metrics.registry.inc('records_gathered', len(lines), source=source)
+                metrics.registry.inc('bytes_gathered', sum(len(line) for line in lines), source=source)
+                # Worker time, summed over the workers, so pages_per_s in the report is the rate of one worker
+                metrics.registry.observe('gather', seconds[source], source=source)
+                logging.debug(lines[-1][:120]) # log first 120 chars of last entry
+            if state:
+                state.mark_gathered(batch)
+        except Exception as e:
+            logging.error("Error converting file")
+            logging.error(e)
+            logging.error(e.__traceback__)
+        progress.update(1)
+
+    # The page catalog is kept up to date by the data sources, so the data tree is not walked here
+    files = catalog.get_catalog().pages()
+
+    state = None
+    if incremental:
+        state = gather.GatherState(state_file)
+        files, deleted = state.diff(files)
+        with open(f"{filename}.deleted", 'w') as deleted_file:
+            deleted_file.writelines(path + "\n" for path in deleted)
+        state.forget(deleted)
+        logging.info(f"{len(deleted)} deleted files listed in {filename}.deleted")
+
     logging.info(f"{len(files)} files to process")
-    total = len(files)
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor, open(filename, 'w') as outfile:
-        futures = [executor.submit(run_gather, batch) for batch in chunked(files, batch_size)]
-        for future in tqdm(as_completed(futures), total=len(futures), desc="Converting JSONL"):
-            try:
-                output = future.result()
-                outfile.writelines(output)
-                
-                total = total - batch_size if total > batch_size else 0
-                logging.debug(output[-1][:120]) # log first 120 chars of last entry
-                logging.info(f"{len(files)-total}/{len(files)} files")
-                
-            except Exception as e:
-                logging.error("Error converting file")
-                logging.error(e)
-                logging.error(e.__traceback__)
+    executor_class = functools.partial(ProcessPoolExecutor, mp_context=utils.process_pool_context()) if use_processes else ThreadPoolExecutor
+    window = max_in_flight or 2 * max_workers
+    total_batches = (len(files) + batch_size - 1) // batch_size
+
+    writer_kwargs = dict(compression=compression, shard_size=shard_size, shard_by_source=shard_by_source)
+
+    with executor_class(max_workers=max_workers) as executor, \
+            contextlib.ExitStack() as writers, \
+            tqdm(total=total_batches, desc="Converting JSONL") as progress:
+        outfiles = []
+        if incremental:
+            outfiles.append(writers.enter_context(corpus.ShardedJsonlWriter(corpus.delta_filename(filename), **writer_kwargs)))
+        if incremental != 'delta':
+            outfiles.append(writers.enter_context(corpus.ShardedJsonlWriter(filename, mode='a' if incremental == 'append' else 'w', **writer_kwargs)))
 
-    logging.info(f"{len(files)} files gathered into {filename}")
+        # Keep at most `window` batches pending so finished output never piles up in memory
+        pending = deque()
+        for batch in chunked(files, batch_size):
+            if len(pending) >= window:
+                if ordered:
+                    write_output(pending.popleft(), outfiles)
+                else:
+                    done, _ = futures_wait([f for f, _ in pending], return_when=FIRST_COMPLETED)
+                    for item in [item for item in pending if item[0] in done]:
+                        write_output(item, outfiles)
+                    pending = deque(item for item in pending if item[0] not in done)
+            pending.append((executor.submit(run_gather, batch, projection), batch))
+
+        while pending:
+            write_output(pending.popleft(), outfiles)
+
+    if state:
+        state.close()
+
+    paths = [path for outfile in outfiles for path in outfile.paths]
+    logging.info(f"{len(files)} files gathered into {', '.join(paths)}")
+
+    return paths
 
 
 def parse_args() -> argparse.Namespace:
@@ -114,43 +397,162 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('--skip-gather', action='store_true', help='Do not gather JSONL file from .txt files')
     parser.add_argument('--skip-fetch', action='store_true', help='Do not download source data from repositories')
     parser.add_argument('--skip-insert', action='store_true', help='Do not insert values into typesense')
+    parser.add_argument('--titles-per-host', type=int, default=1, help='Number of titles fetched concurrently from each source (overridden by a source\'s "concurrency" in the YAML file)')
+    parser.add_argument('--gather-workers', type=int, default=4, help='Number of workers used to gather the JSONL file')
+    parser.add_argument('--gather-processes', action='store_true', help='Gather with a process pool instead of threads')
+    parser.add_argument('--ordered', action='store_true', help='Write gathered records in file order')
+    parser.add_argument('--incremental', choices=['delta', 'append'], help='Only gather new or changed .txt files into <jsonl_file base>.delta.jsonl (with append, also append them to the JSONL file), then upsert them into the existing collection and remove the deleted pages')
+    parser.add_argument('--gather-state', type=str, default=gather.STATE_FILE, help='Path to the state store used by --incremental')
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], help='Compress the gathered JSONL output')
+    parser.add_argument('--shard-size', type=int, help='Split the gathered JSONL output into shards of about this many MB')
+    parser.add_argument('--shard-by-source', action='store_true', help='Write separate JSONL shards per source')
+    parser.add_argument('--pipeline', action='store_true', help='Stream records from fetch straight into typesense instead of running the stages in turn (requires --use-alias)')
+    parser.add_argument('--pipeline-jsonl', action='store_true', help='In pipeline mode, also write the records to the JSONL file')
+    parser.add_argument('--pipeline-page-files', action='store_true', help='In pipeline mode, also write the split ANNO pages to per-page .txt files')
+    parser.add_argument('--rebuild-catalog', action='store_true', help='Rescan the data directory into the page catalog before running')
+    parser.add_argument('--report', type=str, default=None, help='Path of the JSON run report (default: <jsonl_file>.report.json)')
+    parser.add_argument('--prometheus-textfile', type=str, default=None, help='Also write the run metrics to this file in the Prometheus text format')
    
     parser = insert.add_insert_args(parser)
     parser = insert.add_typesense_args(parser)
+    parser = add_cache_args(parser)
+    parser = add_async_args(parser)
+    parser = profiling.add_profile_args(parser)
 
     args = parser.parse_args()
+    validate_args(parser, args)
     insert.validate_typesense_args(args)
 
     return args
 
+def validate_args(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """
+    Reject combinations of command line arguments that cannot work together.
+    :param parser: Argument parser used to report the error
+    :param args: Parsed arguments
+    """
+    if args.pipeline:
+        if args.skip_fetch:
+            parser.error("--pipeline fetches the records it indexes and cannot be combined with --skip-fetch")
+        # The pipeline imports while it fetches, so recreating 'documents' would leave search empty for the whole run
+        if not args.skip_insert and not args.use_alias:
+            parser.error("--pipeline requires --use-alias (or --skip-insert)")
+        if args.use_async:
+            parser.error("--pipeline streams records from the threaded data sources and cannot be combined with --async")
+
 def main():
     logging.basicConfig(level=logging.INFO)
 
     args = parse_args()
 
-    if not args.skip_fetch:
-        get_items(args.yaml_file)
+    client = None
+    if not args.skip_insert:
+        client = insert.create_typesense_client(
+            host=args.typesense_fetcher_host,
+            port=args.typesense_port,
+            protocol=args.typesense_protocol,
+            path=args.typesense_path,
+            api_key=args.api_key
+        )
+
+    try:
+        with profiling.profiled(args.jsonl_file, **profiling.profile_kwargs(args)):
+            run_stages(args, client)
+    finally:
+        metrics.registry.write_json(args.report or f"{args.jsonl_file}.report.json")
+        if args.prometheus_textfile:
+            metrics.registry.write_prometheus(args.prometheus_textfile)
+
+@contextlib.contextmanager
+def stage(name: str):
+    """
+    Time a stage in the run metrics and attribute profiler samples to it.
+    """
+    with metrics.registry.timer(name), profiling.stage(name):
+        yield
+
+def run_stages(args: argparse.Namespace, client):
+    """
+    Run the fetch, gather and insert stages (or the pipeline) selected by the command line arguments,
+    timing each stage in the run metrics and the profiler.
+    :param client: Typesense client, or None with --skip-insert
+    """
+    if args.rebuild_catalog:
+        catalog.get_catalog().rebuild()
+
+    if args.pipeline:
+        with stage('pipeline'):
+            run_pipeline(
+                args.yaml_file,
+                client,
+                jsonl_file=args.jsonl_file if args.pipeline_jsonl else None,
+                titles_per_host=args.titles_per_host,
+                projection=args.projection,
+                source_kwargs=cache_kwargs(args),
+                page_files=args.pipeline_page_files,
+                wait=args.wait_for_healthy,
+                batch_size=args.batch_size,
+                concurrency=args.import_concurrency,
+                use_alias=args.use_alias
+            )
+        return
+
+    if not args.skip_fetch and args.use_async:
+        with stage('fetch'):
+            http_client = asyncio.run(get_items_async(args.yaml_file, titles_per_host=args.titles_per_host, source_kwargs=async_kwargs(args)))
+        http_client.failures.write(os.path.join(DATA_DIRECTORY, "failed.tsv"), "fetch")
+        http_client.record_metrics()
+    elif not args.skip_fetch:
+        with stage('fetch'):
+            data_sources = get_items(args.yaml_file, titles_per_host=args.titles_per_host, source_kwargs=cache_kwargs(args))
+        for data_source in data_sources:
+            data_source.log_cache_stats()
+            data_source.log_failures()
+            data_source.record_metrics()
 
     if not args.skip_gather:
-        convert_files_to_jsonl(filename=args.jsonl_file, batch_size=args.batch_size)
+        with stage('gather'):
+            convert_files_to_jsonl(
+                filename=args.jsonl_file,
+                batch_size=args.batch_size,
+                max_workers=args.gather_workers,
+                use_processes=args.gather_processes,
+                ordered=args.ordered,
+                incremental=args.incremental,
+                state_file=args.gather_state,
+                compression=args.compression,
+                shard_size=args.shard_size * 1024 * 1024 if args.shard_size else None,
+                shard_by_source=args.shard_by_source,
+                projection=args.projection
+            )
 
     if args.skip_insert:
         return
     
-    client = insert.create_typesense_client(
-        host=args.typesense_fetcher_host,
-        port=args.typesense_port,
-        protocol=args.typesense_protocol,
-        path=args.typesense_path,
-        api_key=args.api_key
-    )
-    
-    insert.insert(
-        jsonl_file=args.jsonl_file,
-        client=client,
-        wait=args.wait_for_healthy,
-        batch_size=args.batch_size
-    )
+    with stage('insert'):
+        if args.incremental:
+            # Only the new and changed pages are imported and the deleted ones removed, keeping the collection
+            insert.update(
+                jsonl_file=corpus.resolve_inputs(corpus.delta_filename(args.jsonl_file)),
+                client=client,
+                deleted_file=f"{args.jsonl_file}.deleted",
+                wait=args.wait_for_healthy,
+                batch_size=args.batch_size,
+                concurrency=args.import_concurrency,
+                use_alias=args.use_alias,
+                projection=args.projection,
+                state_file=args.gather_state
+            )
+        else:
+            insert.insert(
+                jsonl_file=corpus.resolve_inputs(args.jsonl_file),
+                client=client,
+                wait=args.wait_for_healthy,
+                batch_size=args.batch_size,
+                concurrency=args.import_concurrency,
+                use_alias=args.use_alias,
+                projection=args.projection
+            )
 
 if __name__ == '__main__':
     main()
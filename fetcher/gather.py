@@ -1,11 +1,14 @@
 import argparse
+import hashlib
 import os
 import json
+import sqlite3
 from abo import ABODataSource
 from mdz import MDZDataSource
 from anno import AnnoDataSource
 
 DATA_DIRECTORY = "data"
+STATE_FILE = os.path.join(DATA_DIRECTORY, "gather_state.sqlite")
 
 def process_file(file_path):
     """Process a single file based on its source."""
@@ -19,6 +22,110 @@ def process_file(file_path):
     else:
         return None
 
+def file_digest(file_path, chunk_size=1 << 20) -> str:
+    """Return the SHA-1 hex digest of a file's content."""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class GatherState:
+    """
+    Record of the page files already gathered and indexed (path, size, mtime and content hash),
+    stored in SQLite so that later runs only reprocess new or changed files.
+
+    Files gathered into a delta and files found deleted are kept as pending until apply() is called once
+    the delta has been imported. Until then every diff reports them again, so a delta that was never
+    imported (a failed insert, or --skip-insert) is folded into the next one instead of being lost.
+    """
+
+    def __init__(self, state_file: str = STATE_FILE):
+        os.makedirs(os.path.dirname(state_file) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(state_file)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha1 TEXT)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS pending (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha1 TEXT)"
+            )
+            self.connection.execute("CREATE TABLE IF NOT EXISTS pending_deleted (path TEXT PRIMARY KEY)")
+        self._pending = {}
+
+    def diff(self, files):
+        """
+        Compare files on disk with the stored state of the last applied delta, starting a new delta.
+        Files whose size and mtime are unchanged are skipped without reading them;
+        otherwise the content hash decides whether the file has changed.
+
+        :param files: List of file paths currently on disk
+        :return: Tuple of (new or changed files, deleted files)
+        """
+        # The new delta covers everything the unapplied one did
+        with self.connection:
+            self.connection.execute("DELETE FROM pending")
+            self.connection.execute("DELETE FROM pending_deleted")
+
+        known = {path: (size, mtime_ns, sha1) for path, size, mtime_ns, sha1
+                 in self.connection.execute("SELECT path, size, mtime_ns, sha1 FROM files")}
+
+        changed = []
+        touched = []
+        present = set()
+        for path in files:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Listed in the page catalog but removed since; reported as deleted below
+                continue
+            present.add(path)
+            previous = known.get(path)
+            if previous and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+                continue
+            sha1 = file_digest(path)
+            if previous and previous[2] == sha1:
+                touched.append((path, stat.st_size, stat.st_mtime_ns, sha1))
+                continue
+            self._pending[path] = (path, stat.st_size, stat.st_mtime_ns, sha1)
+            changed.append(path)
+
+        # Unchanged content, so nothing to import: only the stored mtime is brought up to date
+        self._write(touched)
+
+        deleted = sorted(set(known) - present)
+        return changed, deleted
+
+    def mark_gathered(self, paths):
+        """Mark files whose records were written to the delta successfully as pending."""
+        rows = [self._pending.pop(path) for path in paths if path in self._pending]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?)", rows)
+
+    def forget(self, paths):
+        """Mark deleted files as pending removal from the stored state."""
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO pending_deleted VALUES (?)", [(p,) for p in paths])
+
+    def apply(self):
+        """
+        Store the pending files and remove the pending deletions, once the delta was imported successfully.
+        :return: Tuple of (number of files stored, number of files removed)
+        """
+        with self.connection:
+            stored = self.connection.execute("INSERT OR REPLACE INTO files SELECT * FROM pending").rowcount
+            removed = self.connection.execute("DELETE FROM files WHERE path IN (SELECT path FROM pending_deleted)").rowcount
+            self.connection.execute("DELETE FROM pending")
+            self.connection.execute("DELETE FROM pending_deleted")
+        return stored, removed
+
+    def close(self):
+        self.connection.close()
+
+    def _write(self, rows):
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", rows)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process .txt files and produce line-delimited JSON output.")
     parser.add_argument("files", nargs='+', help="List of .txt files to process.")
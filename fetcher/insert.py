@@ -1,56 +1,329 @@
 import argparse
+import itertools
 import json
+import logging
 import os
 import time
 
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED
+from concurrent.futures import wait as futures_wait
 from tqdm import tqdm
 import typesense
 
-def insert(jsonl_file: str, client: typesense.Client, wait: bool = False, batch_size: int = 256):
+import corpus
+import gather
+import metrics
+import schema
+
+COLLECTION_NAME = 'documents'
+
+def get_schema(name: str = COLLECTION_NAME, projection: dict[str, str] | None = None):
+    """
+    Return the Typesense collection schema for OCR page documents.
+    :param name: Name of the collection
+    :param projection: Field projection from schema.resolve(), defaults to the default projection
+    """
+    return {
+        'name': name,
+        'fields': schema.schema_fields(projection or schema.resolve()),
+    }
+
+def insert(jsonl_file: str | list[str], client: typesense.Client, wait: bool = False, batch_size: int = 256, concurrency: int = 2, use_alias: bool = False, projection: dict[str, str] | None = None):
     """
     Load data from JSONL file and insert it into Typesense collection.
+    By default the 'documents' collection is deleted and recreated. With `use_alias`, the data is imported
+    into a new timestamped collection, the 'documents' alias is repointed to it, and the old collection is dropped,
+    so searches keep working during the import.
+    :param jsonl_file: Path to a JSONL file, or a list of (possibly .gz/.zst compressed) JSONL shards imported in parallel
     :param client: Typesense client
     :param wait: Wait for Typesense service to be healthy before inserting data
+    :param batch_size: Number of documents to send in each import request
+    :param concurrency: Maximum number of import requests in flight
+    :param use_alias: Import into a new collection and swap the 'documents' alias to it
+    :param projection: Field projection used to generate the schema (see schema.py)
+    :return: Tuple of (documents sent, documents that failed to import)
+    """
+    jsonl_files = [jsonl_file] if isinstance(jsonl_file, str) else list(jsonl_file)
+
+    def load(collection):
+        # Share the in-flight budget between shards that are read at the same time
+        parallel_files = max(1, min(len(jsonl_files), concurrency))
+        per_file = max(1, concurrency // parallel_files)
+
+        def import_file(path):
+            with corpus.open_jsonl(path) as f:
+                return import_lines(f, client, collection, batch_size=batch_size, concurrency=per_file, desc=os.path.basename(path))
+
+        with ThreadPoolExecutor(max_workers=parallel_files) as executor:
+            results = list(executor.map(import_file, jsonl_files))
+        return sum(r[0] for r in results), sum(r[1] for r in results)
+
+    return _reindex(client, load, wait=wait, use_alias=use_alias, projection=projection)
+
+def update(jsonl_file: str | list[str], client: typesense.Client, deleted_file: str | None = None, wait: bool = False, batch_size: int = 256, concurrency: int = 2, use_alias: bool = False, projection: dict[str, str] | None = None, state_file: str | None = None):
+    """
+    Apply an incremental gather to the existing 'documents' collection (or the collection its alias points to):
+    records are upserted by id, replacing the earlier documents of changed pages, and the documents of the
+    pages listed in `deleted_file` are removed. Without an existing collection this is a full insert().
+    :param jsonl_file: Path to the delta JSONL file, or a list of its shards
+    :param client: Typesense client
+    :param deleted_file: Path of the file listing the local paths of deleted pages, one per line
+    :param wait: Wait for Typesense service to be healthy before updating
+    :param batch_size: Number of documents to send in each import or delete request
+    :param concurrency: Maximum number of import requests in flight
+    :param use_alias: Create the collection behind the 'documents' alias if there is none yet
+    :param projection: Field projection used to generate the schema of a new collection
+    :param state_file: Gather state store that produced the delta (see gather.GatherState). Its pending files and
+        deletions are applied once every document was imported, so a failed update is repeated by the next delta.
+    :return: Number of documents that failed to import
     """
     if wait:
         wait_for_healthy(client)
 
-    schema = {
-        'name': 'documents',
-        'fields': [
-            {'name': 'local_path', 'type': 'string'},
-            {'name': 'source', 'type': 'string'},
-            {'name': 'title_id', 'type': 'string'},
-            {'name': 'title_full', 'type': 'string'},
-            {'name': 'datum', 'type': 'string', 'optional': True},
-            {'name': 'page_number', 'type': 'string'},
-            {'name': 'remote_path', 'type': 'string'},
-            {'name': 'image_url', 'type': 'string'},
-            {'name': 'ocr_text_original', 'type': 'string', 'locale': 'de'},
-            {'name': 'ocr_text_stripped', 'type': 'string', 'locale': 'de'},
-        ]
-    }
+    collection = _alias_target(client, COLLECTION_NAME) or COLLECTION_NAME
+    try:
+        client.collections[collection].retrieve()
+        exists = True
+    except typesense.exceptions.ObjectNotFound:
+        exists = False
+
+    if exists:
+        failed = 0
+        for path in [jsonl_file] if isinstance(jsonl_file, str) else jsonl_file:
+            with corpus.open_jsonl(path) as f:
+                failed += import_lines(f, client, collection, batch_size=batch_size, concurrency=concurrency, desc=os.path.basename(path))[1]
+
+        if deleted_file and os.path.exists(deleted_file):
+            with open(deleted_file, 'r', encoding='utf-8') as f:
+                delete_documents((line.strip() for line in f if line.strip()), client, collection, batch_size=batch_size)
+    else:
+        print(f"Collection '{COLLECTION_NAME}' does not exist. Inserting all documents.")
+        _, failed = insert(jsonl_file, client, batch_size=batch_size, concurrency=concurrency, use_alias=use_alias, projection=projection)
+
+    if state_file:
+        if failed:
+            logging.warning(f"{failed} documents failed to import; the gather state is left pending, so the next delta includes these pages again")
+        else:
+            state = gather.GatherState(state_file)
+            try:
+                stored, removed = state.apply()
+            finally:
+                state.close()
+            logging.info(f"Gather state updated: {stored} pages stored, {removed} deleted pages removed")
+    return failed
+
+def delete_documents(local_paths: Iterable[str], client: typesense.Client, collection: str, batch_size: int = 256):
+    """
+    Delete the documents of pages by their local paths.
+    :param local_paths: Local paths of the deleted pages
+    :param client: Typesense client
+    :param collection: Name of the collection to delete from
+    :param batch_size: Number of documents to delete in each request
+    :return: Number of documents deleted
+    """
+    deleted = 0
+    for batch in read_batches(local_paths, batch_size):
+        ids = ','.join(schema.document_id(path.rstrip('\n')) for path in batch)
+        response = client.collections[collection].documents.delete({'filter_by': f"id:[{ids}]"})
+        deleted += response.get('num_deleted', 0)
+
+    metrics.registry.inc('documents_deleted', deleted)
+    print(f"{deleted} documents of deleted pages removed from '{collection}'.")
+    return deleted
+
+def insert_lines(lines: Iterable[str], client: typesense.Client, wait: bool = False, batch_size: int = 256, concurrency: int = 2, use_alias: bool = False, projection: dict[str, str] | None = None):
+    """
+    Insert an iterable of JSONL lines into the Typesense collection, as described for insert().
+    The iterable is consumed lazily, so it can be a file or a generator fed by a running fetch.
+    :param lines: Iterable of JSON lines
+    :param client: Typesense client
+    """
+    def load(collection):
+        return import_lines(lines, client, collection, batch_size=batch_size, concurrency=concurrency)
+
+    return _reindex(client, load, wait=wait, use_alias=use_alias, projection=projection)
+
+def _reindex(client: typesense.Client, load, wait: bool = False, use_alias: bool = False, projection: dict[str, str] | None = None):
+    """
+    Create the target collection, fill it with `load(collection)` and, with `use_alias`, swap the alias to it.
+    :param load: Callable importing documents into the named collection and returning (sent, failed)
+    :param projection: Field projection used to generate the schema
+    :return: Tuple of (documents sent, documents that failed to import)
+    """
+    if wait:
+        wait_for_healthy(client)
+
+    if not use_alias:
+        # Recreating a collection named like the alias would leave searches on the alias' target
+        if _alias_target(client, COLLECTION_NAME):
+            raise RuntimeError(f"'{COLLECTION_NAME}' is an alias; use --use-alias to reindex, or delete the alias first.")
+
+        # Delete the collection if it already exists
+        try:
+            client.collections[COLLECTION_NAME].delete()
+            print(f"Existing collection '{COLLECTION_NAME}' deleted.")
+        except typesense.exceptions.ObjectNotFound:
+            print(f"Collection '{COLLECTION_NAME}' does not exist. Creating a new one.")
+
+        client.collections.create(get_schema(COLLECTION_NAME, projection))
+        return load(COLLECTION_NAME)
+
+    collection = _create_timestamped_collection(client, projection)
+    print(f"Created collection '{collection}'.")
 
-    # Delete the collection if it already exists
     try:
-        client.collections['documents'].delete()
-        print("Existing collection 'documents' deleted.")
+        imported, failed = load(collection)
+    except BaseException:
+        _drop_collection(client, collection)
+        raise
+
+    if imported - failed <= 0:
+        _drop_collection(client, collection)
+        raise RuntimeError(f"No documents imported into '{collection}'; alias '{COLLECTION_NAME}' left unchanged.")
+
+    swap_alias(client, COLLECTION_NAME, collection)
+    return imported, failed
+
+def _create_timestamped_collection(client: typesense.Client, projection: dict[str, str] | None = None):
+    """
+    Create a new collection named after the current time, adding a counter if a reindex already used that second.
+    :return: Name of the created collection
+    """
+    base = f"{COLLECTION_NAME}_{time.strftime('%Y%m%d%H%M%S')}"
+    for attempt in itertools.count():
+        collection = base if attempt == 0 else f"{base}_{attempt}"
+        try:
+            client.collections.create(get_schema(collection, projection))
+            return collection
+        except typesense.exceptions.ObjectAlreadyExists:
+            continue
+
+def _alias_target(client: typesense.Client, alias: str):
+    """
+    Return the name of the collection an alias points to, or None if there is no such alias.
+    """
+    try:
+        return client.aliases[alias].retrieve()['collection_name']
     except typesense.exceptions.ObjectNotFound:
-        print("Collection 'documents' does not exist. Creating a new one.")
-
-    client.collections.create(schema)
-
-    with open(jsonl_file, 'r') as f:
-        lines = f.readlines()
-        batch = []
-        for line in tqdm(lines, desc="Loading data"):
-            document = json.loads(line)
-            batch.append(document)
-            if len(batch) == batch_size:
-                client.collections['documents'].documents.import_(batch)
-                batch = []
-        if batch:
-            client.collections['documents'].documents.import_(batch)
+        return None
+
+def _drop_collection(client: typesense.Client, collection: str):
+    """
+    Delete a collection that was left unfinished by a failed import.
+    """
+    try:
+        client.collections[collection].delete()
+        print(f"Collection '{collection}' deleted.")
+    except typesense.exceptions.ObjectNotFound:
+        pass
+
+def import_lines(lines: Iterable[str], client: typesense.Client, collection: str, batch_size: int = 256, concurrency: int = 2, desc: str = "Loading data"):
+    """
+    Stream JSONL lines into a Typesense collection.
+    Lines are read lazily and each batch of raw JSONL lines is sent to the import endpoint as-is,
+    with up to `concurrency` import requests in flight at once.
+    :param lines: Iterable of JSON lines, e.g. an open JSONL file
+    :param client: Typesense client
+    :param collection: Name of the collection to import into
+    :param batch_size: Number of documents to send in each import request
+    :param concurrency: Maximum number of import requests in flight
+    :param desc: Description for the progress bar
+    :return: Tuple of (number of documents sent, number of documents that failed)
+    """
+    failed = 0
+    with tqdm(desc=desc, unit="docs") as progress, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        in_flight = set()
+        for batch in read_batches(lines, batch_size):
+            if len(in_flight) >= concurrency:
+                done, in_flight = futures_wait(in_flight, return_when=FIRST_COMPLETED)
+                failed += _collect_imports(done, progress)
+            in_flight.add(executor.submit(import_batch, client, collection, batch))
+        failed += _collect_imports(in_flight, progress)
+        imported = progress.n
+
+    metrics.registry.inc('documents_imported', imported - failed)
+    metrics.registry.inc('import_failures', failed)
+    if failed:
+        print(f"{failed} documents failed to import.")
+
+    return imported, failed
+
+def swap_alias(client: typesense.Client, alias: str, collection: str):
+    """
+    Atomically point an alias at a collection and drop the collection it pointed to before.
+    :param client: Typesense client
+    :param alias: Name of the alias
+    :param collection: Name of the collection the alias should point to
+    """
+    previous = _alias_target(client, alias)
+    if previous is None:
+        # A collection created by the delete-and-recreate mode would shadow the alias
+        try:
+            client.collections[alias].delete()
+            print(f"Existing collection '{alias}' deleted to make way for the alias.")
+        except typesense.exceptions.ObjectNotFound:
+            pass
+
+    client.aliases.upsert(alias, {'collection_name': collection})
+    print(f"Alias '{alias}' now points to '{collection}'.")
+
+    if previous and previous != collection:
+        try:
+            client.collections[previous].delete()
+            print(f"Previous collection '{previous}' deleted.")
+        except typesense.exceptions.ObjectNotFound:
+            pass
+
+def read_batches(lines: Iterable[str], batch_size: int):
+    """
+    Yield lists of raw JSONL lines from an open file or other iterable, skipping blank lines.
+    :param lines: Iterable of lines to read from
+    :param batch_size: Number of lines in each batch
+    """
+    batch = []
+    for line in lines:
+        if not line.strip():
+            continue
+        batch.append(line if line.endswith('\n') else line + '\n')
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def import_batch(client: typesense.Client, collection: str, batch: list[str]):
+    """
+    Send a batch of raw JSONL lines to the Typesense import endpoint.
+    Documents are upserted, so a record replaces an earlier document with the same id.
+    :param client: Typesense client
+    :param collection: Name of the collection to import into
+    :param batch: List of JSONL lines
+    :return: Tuple of (number of documents sent, number of documents that failed)
+    """
+    response = client.collections[collection].documents.import_(''.join(batch), {'action': 'upsert'})
+
+    failed = 0
+    for result in response.splitlines():
+        if not result.strip():
+            continue
+        result = json.loads(result)
+        if not result.get('success', False):
+            failed += 1
+            logging.error(f"Failed to import document: {result.get('error')}")
+    return len(batch), failed
+
+def _collect_imports(done, progress):
+    """
+    Wait for finished import futures, update progress and return the number of failed documents.
+    """
+    failed = 0
+    for future in done:
+        sent, batch_failed = future.result()
+        progress.update(sent)
+        failed += batch_failed
+    return failed
 
 def wait_for_healthy(client):
     while True:
@@ -95,15 +368,17 @@ def parse_args() -> argparse.Namespace:
 
     parser = argparse.ArgumentParser(description='Load JSONL data into a Typesense collection.')
 
-    parser.add_argument('jsonl_file', type=str, help='Path to the JSONL file')
+    parser.add_argument('jsonl_file', type=str, help='Path to the JSONL file (or to the corpus whose shards are listed in <jsonl_file>.shards)')
+    parser.add_argument('--update', action='store_true', help="Upsert the documents into the existing collection instead of recreating it, as after an incremental gather")
+    parser.add_argument('--deleted', type=str, default=None, help='With --update, file listing the local paths of deleted pages whose documents are removed')
+    parser.add_argument('--gather-state', type=str, default=gather.STATE_FILE, help='With --update, state store of the incremental gather that wrote the delta; marked applied once the update succeeded')
     parser = add_insert_args(parser)
     parser = add_typesense_args(parser)
     
     args = parser.parse_args()
     validate_typesense_args(args)
 
-    if not os.path.exists(args.jsonl_file):
-        raise FileNotFoundError(f"JSONL file '{args.jsonl_file}' does not exist.")
+    args.jsonl_files = corpus.resolve_inputs(args.jsonl_file)
 
     return args
 
@@ -113,6 +388,9 @@ def add_insert_args(parser: argparse.ArgumentParser):
     """
     parser.add_argument('--batch-size', type=int, default=256, help='Number of documents to insert in each batch')
     parser.add_argument('--wait-for-healthy', action='store_true', help='Wait for Typesense service to be healthy before inserting data')
+    parser.add_argument('--import-concurrency', type=int, default=2, help='Number of import requests to keep in flight')
+    parser.add_argument('--projection', type=schema.parse_projection, default=schema.resolve(), help="Comma-separated field=mode pairs (mode: index, store or drop), e.g. 'ocr_text_stripped=drop,local_path=store'")
+    parser.add_argument('--use-alias', action='store_true', help="Import into a new timestamped collection and swap the 'documents' alias to it")
     return parser
 
 def add_typesense_args(parser: argparse.ArgumentParser):
@@ -158,5 +436,8 @@ if __name__ == '__main__':
         api_key=args.api_key
     )
 
-    insert(args.jsonl_file, client, wait=args.wait_for_healthy, batch_size=args.batch_size)
+    if args.update:
+        update(args.jsonl_files, client, deleted_file=args.deleted, wait=args.wait_for_healthy, batch_size=args.batch_size, concurrency=args.import_concurrency, use_alias=args.use_alias, projection=args.projection, state_file=args.gather_state if os.path.exists(args.gather_state) else None)
+    else:
+        insert(args.jsonl_files, client, wait=args.wait_for_healthy, batch_size=args.batch_size, concurrency=args.import_concurrency, use_alias=args.use_alias, projection=args.projection)
     print("Data inserted into Typesense collection 'documents'.")
@@ -1,70 +1,170 @@
-from datasource import DataSource
+from datasource import AsyncDataSource, DataSource, add_async_args, add_cache_args, async_kwargs, cache_kwargs
 
+import asyncio
+import functools
 import json
 import logging
 import os
-import tqdm
 
+import catalog
+import metrics
+import profiling
 import utils
 
 SOURCE_ID = "api.digitale-sammlungen.de"
 IIIF_MANIFEST_URL = f"https://{SOURCE_ID}" + "/iiif/presentation/v2/{id}/manifest"
 
+MANIFEST_CACHE_SIZE = 64
+
+@functools.lru_cache(maxsize=MANIFEST_CACHE_SIZE)
+def load_manifest_index(manifest_path: str) -> dict:
+    """
+    Load a stored MDZ manifest once and index its canvases by label.
+    Results are memoized per manifest path, keeping the most recently used titles.
+
+    :param manifest_path: Path to the manifest.json file
+    :return: Dict with the manifest 'title_full' and a 'canvases' map of label to (hOCR URL or None, image URL)
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+
+    canvases = {}
+    for sequence in manifest['sequences']:
+        for canvas in sequence['canvases']:
+            image_url = None
+            for image in canvas['images']:
+                original_image_url = image['resource']['@id']
+                image_url = original_image_url.replace('/full/full/', '/full/2400,/')
+                break
+            canvases[canvas['label']] = (canvas_hocr_url(canvas), image_url)
+
+    return {
+        'title_full': manifest['label'],
+        'canvases': canvases,
+    }
+
+def canvas_hocr_url(canvas: dict) -> str | None:
+    """
+    Return the hOCR URL a canvas links to with 'seeAlso', or None for canvases without OCR.
+    :param canvas: IIIF canvas from the manifest
+    """
+    see_also = canvas.get('seeAlso')
+    if isinstance(see_also, list):
+        see_also = see_also[0] if see_also else None
+    if isinstance(see_also, dict):
+        return see_also.get('@id')
+    return see_also
+
+def clear_item_pages(item_dir: str):
+    """
+    Remove the downloaded hOCR files and converted pages of an item.
+    """
+    utils.remove_files(os.path.join(item_dir, 'hocr'), '*.hocr')
+    utils.remove_files(os.path.join(item_dir, 'txt'), '*.txt')
+
+def save_manifest(manifest: dict, output_dir: str):
+    """
+    Store a fetched manifest as json/manifest.json in the item directory.
+    """
+    json_dir = os.path.join(output_dir, 'json')
+    os.makedirs(json_dir, exist_ok=True)
+    manifest_filename = os.path.join(json_dir, 'manifest.json')
+    with open(manifest_filename, 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, ensure_ascii=False, indent=4)
+    load_manifest_index.cache_clear()
+
+def hocr_jobs(manifest: dict, output_dir: str) -> list[tuple[str, str]]:
+    """
+    Return (hOCR URL, local path) download jobs for the canvases of a manifest.
+    """
+    hocr_dir = os.path.join(output_dir, 'hocr')
+    os.makedirs(hocr_dir, exist_ok=True)
+
+    jobs = []
+    for sequence in manifest['sequences']:
+        for canvas in sequence['canvases']:
+            label = canvas['label']
+            hocr_url = canvas_hocr_url(canvas)
+            if hocr_url is None:
+                logging.debug(f"Canvas {label} has no hOCR, skipping.")
+                continue
+            hocr_filename = os.path.join(hocr_dir, f"{label}.hocr")
+            jobs.append((hocr_url, hocr_filename))
+    return jobs
+
 class MDZDataSource(DataSource):
 
     def __init__(self, 
                  source_id: str = SOURCE_ID, 
                  manifest_url: str = IIIF_MANIFEST_URL, 
-                 cache_name: str = "devel"):
+                 cache_name: str = "devel",
+                 max_workers: int = 4,
+                 **kwargs):
 
         self.source_id = source_id
         self.manifest_url = manifest_url
         
-        super().__init__(source_id=source_id, cache_name=cache_name)
+        super().__init__(source_id=source_id, cache_name=cache_name, max_workers=max_workers, **kwargs)
 
     def fetch(self, item_id: str):
 
-        item_dir = os.path.join('data', self.source_id)
-        os.makedirs(item_dir, exist_ok=True)        
+        item_dir = os.path.join('data', self.source_id, item_id)
 
-        already = utils.list_directories(f"data/{self.source_id}")
-        if item_id not in already:
-            item_dir = os.path.join('data', self.source_id, item_id)
-            os.makedirs(item_dir, exist_ok=True)
-            self._download_hocr_files(item_id=item_id, output_dir=item_dir)
-        
-            input_dir = os.path.join(item_dir, 'hocr')
-            output_dir = os.path.join(item_dir, 'txt')
-            os.makedirs(output_dir, exist_ok=True)
-            utils.convert_all_hocr_files(input_dir, output_dir)
+        # Skip items whose journal says every page was downloaded and converted; resume the others
+        journal = utils.DownloadJournal(os.path.join(item_dir, utils.JOURNAL_FILENAME))
+        refetch = False
+        if journal.is_complete():
+            if not self.refresh or not self._manifest_changed(item_id, item_dir):
+                return
+            # The manifest changed upstream: download and convert every page again
+            logging.info(f"Manifest of {item_id} changed, downloading it again")
+            journal.reset()
+            # Canvases dropped from the manifest must not keep their old hOCR and pages
+            clear_item_pages(item_dir)
+            refetch = True
 
-    def _download_hocr_files(self, item_id, output_dir):
+        os.makedirs(item_dir, exist_ok=True)
+        failed = self._download_hocr_files(item_id=item_id, output_dir=item_dir, journal=journal, refetch=refetch)
+    
+        input_dir = os.path.join(item_dir, 'hocr')
+        output_dir = os.path.join(item_dir, 'txt')
         os.makedirs(output_dir, exist_ok=True)
+        with metrics.registry.timer('convert', source=self.source_id):
+            failed += utils.convert_all_hocr_files(input_dir, output_dir)
+        catalog.get_catalog().replace_directory(output_dir)
+
+        if not failed:
+            journal.mark_complete()
+
+    def item_directory(self, item_id: str) -> str:
+        return os.path.join('data', self.source_id, item_id, 'txt')
 
+    def _manifest_changed(self, item_id, item_dir) -> bool:
         manifest_url = self.manifest_url.format(id=item_id)
-        manifest = self.session.get(manifest_url).json()
-        
-        json_dir = os.path.join(output_dir, 'json')
-        os.makedirs(json_dir, exist_ok=True)
-        manifest_filename = os.path.join(json_dir, 'manifest.json')
-        with open(manifest_filename, 'w', encoding='utf-8') as manifest_file:
-            json.dump(manifest, manifest_file, ensure_ascii=False, indent=4)
-
-        hocr_dir = os.path.join(output_dir, 'hocr')
-        os.makedirs(hocr_dir, exist_ok=True)
-        
-        for sequence in manifest['sequences']:
-            for canvas in tqdm.tqdm(sequence['canvases'], desc=f"Downloading {item_id}"):
-                label = canvas['label']
-                hocr_url = canvas['seeAlso']['@id']
-                
-                hocr_response = self.session.get(hocr_url)
-                hocr_filename = os.path.join(hocr_dir, f"{label}.hocr")
-                
-                with open(hocr_filename, 'wb') as file:
-                    file.write(hocr_response.content)
-                
-                logging.info(f"Downloaded HOCR file for {label} to {hocr_filename}")
+        validators = utils.ValidatorStore(os.path.join(item_dir, utils.VALIDATORS_FILENAME))
+        changed = self.revalidate(manifest_url, validators) is not None
+        validators.save()
+        return changed
+
+    def _download_hocr_files(self, item_id, output_dir, journal=None, refetch=False) -> list[str]:
+        """
+        :param refetch: Bypass the HTTP cache for the hOCR files, because the manifest changed upstream
+        """
+        os.makedirs(output_dir, exist_ok=True)
+
+        manifest_url = self.manifest_url.format(id=item_id)
+        response = self.session.get(manifest_url)
+        manifest = response.json()
+        save_manifest(manifest, output_dir)
+
+        validators = utils.ValidatorStore(os.path.join(output_dir, utils.VALIDATORS_FILENAME))
+        validators.update(manifest_url, response)
+        validators.save()
+
+        jobs = hocr_jobs(manifest, output_dir)
+
+        request_kwargs = utils.refresh_kwargs(self.session) if refetch else {}
+        return utils.download_remote_files(jobs, session=self.session, max_workers=self.max_workers, desc=f"Downloading {item_id}", journal=journal, **request_kwargs)
 
     @staticmethod
     def process(file_path, data_directory):
@@ -74,24 +174,12 @@ class MDZDataSource(DataSource):
         title_id = parts[2]
         label = parts[-1].split('.')[0]
 
-        with open(os.path.join(data_directory, SOURCE_ID, title_id, 'json', 'manifest.json'), 'r', encoding='utf-8') as file:
-            manifest = json.load(file)
-        
-        title_full = manifest['label']
-
-        remote_path = None
-        image_url = None
-        for sequence in manifest['sequences']:
-            for canvas in sequence['canvases']:
-                if label == canvas['label']:
-                    remote_path = canvas['seeAlso']['@id']
-                    for image in canvas['images']:
-                        original_image_url = image['resource']['@id']
-                        image_url = original_image_url.replace('/full/full/', '/full/2400,/')
-                        break
-        
-        with open(file_path, 'r') as file:
-            ocr_text = file.read()
+        manifest_index = load_manifest_index(os.path.join(data_directory, SOURCE_ID, title_id, 'json', 'manifest.json'))
+
+        title_full = manifest_index['title_full']
+        remote_path, image_url = manifest_index['canvases'].get(label, (None, None))
+
+        ocr_text, encoding = utils.read_text(file_path)
 
         ocr_text_stripped = utils.remove_newlines(ocr_text)
 
@@ -105,15 +193,84 @@ class MDZDataSource(DataSource):
             "image_url": image_url,
             "ocr_text_original": ocr_text,
             "ocr_text_stripped": ocr_text_stripped,
+            "encoding": encoding,
         }
 
+class AsyncMDZDataSource(AsyncDataSource):
+    """
+    asyncio port of MDZDataSource.
+    """
+
+    def __init__(self,
+                 source_id: str = SOURCE_ID,
+                 manifest_url: str = IIIF_MANIFEST_URL,
+                 **kwargs):
+        """
+        :param kwargs: Client and concurrency options passed on to AsyncDataSource
+        """
+        self.manifest_url = manifest_url
+
+        super().__init__(source_id, **kwargs)
+
+    async def fetch(self, item_id: str):
+        item_dir = os.path.join('data', self.source_id, item_id)
+        manifest_url = self.manifest_url.format(id=item_id)
+        # File and catalog access runs in threads, so it does not stall the other titles on the event loop
+        validators = await asyncio.to_thread(utils.ValidatorStore, os.path.join(item_dir, utils.VALIDATORS_FILENAME))
+
+        journal = await asyncio.to_thread(utils.DownloadJournal, os.path.join(item_dir, utils.JOURNAL_FILENAME))
+        if journal.is_complete():
+            if not self.refresh:
+                return
+            changed = await self.revalidate(manifest_url, validators)
+            await asyncio.to_thread(validators.save)
+            if changed is None:
+                return
+            logging.info(f"Manifest of {item_id} changed, downloading it again")
+            await asyncio.to_thread(journal.reset)
+            await asyncio.to_thread(clear_item_pages, item_dir)
+
+        os.makedirs(item_dir, exist_ok=True)
+        response = await self.client.get(manifest_url, source=self.source_id)
+        manifest = response.json()
+        await asyncio.to_thread(save_manifest, manifest, item_dir)
+
+        validators.update(manifest_url, response)
+        await asyncio.to_thread(validators.save)
+
+        failed = await self.download_files(hocr_jobs(manifest, item_dir), journal=journal)
+
+        # Converting is CPU-bound and uses a process pool; keep it off the event loop
+        output_dir = os.path.join(item_dir, 'txt')
+        os.makedirs(output_dir, exist_ok=True)
+        with metrics.registry.timer('convert', source=self.source_id):
+            failed += await asyncio.to_thread(utils.convert_all_hocr_files, os.path.join(item_dir, 'hocr'), output_dir)
+        await asyncio.to_thread(catalog.get_catalog().replace_directory, output_dir)
+
+        if not failed:
+            await asyncio.to_thread(journal.mark_complete)
+
+    process = staticmethod(MDZDataSource.process)
+
 if __name__ == "__main__":
     import argparse
     logging.basicConfig(level=logging.INFO)
 
     parser = argparse.ArgumentParser(description="Download HOCR files for given item IDs.")
     parser.add_argument("item_id", type=str, help="The item ID to download HOCR files for.")
+    parser.add_argument("--max-workers", type=int, default=4, help="Maximum number of concurrent HOCR downloads.")
+    add_cache_args(parser)
+    add_async_args(parser)
+    profiling.add_profile_args(parser)
     args = parser.parse_args()
 
-    data_source = MDZDataSource(source_id=SOURCE_ID, manifest_url=IIIF_MANIFEST_URL)
-    data_source.fetch(args.item_id)
+    with profiling.profiled(os.path.join('data', SOURCE_ID), **profiling.profile_kwargs(args)), profiling.stage('fetch'):
+        if args.use_async:
+            data_source = AsyncMDZDataSource(source_id=SOURCE_ID, manifest_url=IIIF_MANIFEST_URL, max_workers=args.max_workers, **async_kwargs(args))
+            data_source.run(args.item_id)
+            data_source.log_failures()
+        else:
+            data_source = MDZDataSource(source_id=SOURCE_ID, manifest_url=IIIF_MANIFEST_URL, max_workers=args.max_workers, **cache_kwargs(args))
+            data_source.fetch(args.item_id)
+            data_source.log_cache_stats()
+            data_source.log_failures()
@@ -0,0 +1,153 @@
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+PROMETHEUS_PREFIX = "tgv_fetcher"
+
+class Metrics:
+    """
+    Thread-safe registry of stage timings and counters for one run, with optional labels (e.g. source).
+    Exported as a JSON run report or in the Prometheus textfile format.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.timings = {}
+        self.counters = {}
+        # Number of running timers and the start of the earliest one, per stage and labels
+        self._running = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def observe(self, stage: str, seconds: float, **labels):
+        """Add `seconds` of wall-clock time to a stage."""
+        key = self._key(stage, labels)
+        with self._lock:
+            self.timings[key] = self.timings.get(key, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def timer(self, stage: str, **labels):
+        """
+        Time the enclosed block as part of a stage.
+        Blocks timed at the same time in several threads count once: the stage is charged the
+        wall-clock time during which at least one of them was running.
+        """
+        key = self._key(stage, labels)
+        with self._lock:
+            count, start = self._running.get(key, (0, time.perf_counter()))
+            self._running[key] = (count + 1, start)
+        try:
+            yield
+        finally:
+            with self._lock:
+                count, start = self._running[key]
+                if count == 1:
+                    del self._running[key]
+                    self.timings[key] = self.timings.get(key, 0.0) + time.perf_counter() - start
+                else:
+                    self._running[key] = (count - 1, start)
+
+    def inc(self, counter: str, value: int | float = 1, **labels):
+        """Increase a counter."""
+        key = self._key(counter, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def report(self) -> dict:
+        """
+        Return the run report: stage timings, counters, and per-source totals with derived throughput.
+        """
+        with self._lock:
+            timings = dict(self.timings)
+            counters = dict(self.counters)
+
+        stages = {}
+        sources = {}
+        for (stage, labels), seconds in timings.items():
+            labels = dict(labels)
+            if 'source' in labels:
+                sources.setdefault(labels['source'], {})[f"{stage}_seconds"] = seconds
+            else:
+                stages[stage] = seconds
+        for (counter, labels), value in counters.items():
+            labels = dict(labels)
+            if 'source' in labels:
+                source = sources.setdefault(labels['source'], {})
+                source[counter] = source.get(counter, 0) + value
+
+        for source in sources.values():
+            fetch_seconds = source.get('fetch_seconds')
+            if fetch_seconds:
+                # The async client does not cache, so it counts plain requests
+                requests = source.get('requests', source.get('cache_hits', 0) + source.get('cache_misses', 0))
+                source['requests_per_s'] = requests / fetch_seconds
+                source['bytes_per_s'] = source.get('bytes_fetched', 0) / fetch_seconds
+            # Records come out of the gather stage, or out of the fetch in pipeline mode
+            gather_seconds = source.get('gather_seconds') or fetch_seconds
+            if gather_seconds and 'records_gathered' in source:
+                source['pages_per_s'] = source['records_gathered'] / gather_seconds
+
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'duration_seconds': time.time() - self.started,
+            'stages': stages,
+            'sources': sources,
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                         for (name, labels), value in sorted(counters.items())],
+        }
+
+    def write_json(self, path: str):
+        """Write the run report as JSON."""
+        _write_atomic(path, json.dumps(self.report(), indent=2) + '\n')
+        logging.info(f"Run report written to {path}")
+
+    def write_prometheus(self, path: str):
+        """
+        Write the metrics in the Prometheus text format, e.g. for the node_exporter textfile collector.
+        """
+        with self._lock:
+            timings = dict(self.timings)
+            counters = dict(self.counters)
+
+        lines = [
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds gauge",
+        ]
+        for (stage, labels), seconds in sorted(timings.items()):
+            lines.append(f"{PROMETHEUS_PREFIX}_stage_seconds{_labels(dict(labels, stage=stage))} {seconds}")
+
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f"{PROMETHEUS_PREFIX}_{name}{_labels(dict(labels))} {value}")
+
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds {time.time()}")
+        _write_atomic(path, '\n'.join(lines) + '\n')
+        logging.info(f"Prometheus metrics written to {path}")
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ''
+
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items())) + '}'
+
+def _write_atomic(path: str, text: str):
+    # Scrapers must never read a half-written file
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+# Registry of the current run, shared by the fetch, convert, gather and insert stages
+registry = Metrics()
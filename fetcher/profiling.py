@@ -0,0 +1,175 @@
+import argparse
+import collections
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.01
+TOP_N = 25
+
+# Leaf frames (function, file) of threads that are waiting for work rather than doing any:
+# lock and event waits, thread joins, queue reads, event loops polling for I/O and idle pool workers
+IDLE_FRAMES = {
+    ('wait', 'threading.py'),
+    ('_wait_for_tstate_lock', 'threading.py'),
+    ('get', 'queue.py'),
+    ('select', 'selectors.py'),
+    ('wait', 'connection.py'),
+    ('_worker', 'thread.py'),
+}
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler. A background thread samples the Python stacks of all other
+    threads every `interval` seconds and counts them per pipeline stage, without tracing every call.
+    Samples are written as collapsed stacks ('stage;frame;frame count' per line), which flamegraph.pl,
+    speedscope and inferno read directly, plus a summary of the hottest functions.
+
+    Only the current process is sampled, so work done in a process pool (e.g. --gather-processes
+    or hOCR conversion) shows up as time spent waiting on the pool.
+    Threads that are waiting (see IDLE_FRAMES) are not added to the stacks; they are only counted
+    per stage, so idle pool workers do not drown out the threads doing the work.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.idle = collections.Counter()
+        self.current_stage = 'main'
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Attribute the samples taken while the enclosed block runs to a stage."""
+        previous = self.current_stage
+        self.current_stage = name
+        try:
+            yield
+        finally:
+            self.current_stage = previous
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stage = self.current_stage
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if self._is_idle(frame):
+                    self.idle[stage] += 1
+                else:
+                    self.samples[(stage,) + self._collapse(frame)] += 1
+
+    @staticmethod
+    def _is_idle(frame) -> bool:
+        return (frame.f_code.co_name, os.path.basename(frame.f_code.co_filename)) in IDLE_FRAMES
+
+    @staticmethod
+    def _collapse(frame) -> tuple:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    def write_collapsed(self, path: str):
+        """Write the samples as collapsed stacks for flamegraph tools."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in sorted(self.samples.items()):
+                file.write(';'.join(frame.replace(';', ':') for frame in stack) + f" {count}\n")
+
+    def summary(self, top_n: int = TOP_N) -> str:
+        """
+        Return a text summary: samples per stage and the `top_n` functions by self and total samples.
+        Self samples count a function at the top of the stack, total samples anywhere on it.
+        """
+        total = sum(self.samples.values())
+        stages = collections.Counter()
+        own = collections.Counter()
+        inclusive = collections.Counter()
+        for stack, count in self.samples.items():
+            stages[stack[0]] += count
+            if len(stack) > 1:
+                own[stack[-1]] += count
+            for frame in set(stack[1:]):
+                inclusive[frame] += count
+
+        lines = [f"{total} samples of busy threads every {self.interval * 1000:.0f} ms"]
+        lines.append("Samples per stage: " + ', '.join(f"{stage} {count}" for stage, count in stages.most_common()))
+        lines.append("Idle thread samples per stage (not in the stacks): " + ', '.join(f"{stage} {count}" for stage, count in self.idle.most_common()))
+        lines.append("")
+        lines.append(f"Top {top_n} functions by self samples:")
+        lines.append(f"{'self %':>8} {'total %':>8}  function")
+        for frame, count in own.most_common(top_n):
+            lines.append(f"{100 * count / total:8.1f} {100 * inclusive[frame] / total:8.1f}  {frame}")
+        return '\n'.join(lines) + '\n'
+
+    def write_summary(self, path: str, top_n: int = TOP_N):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(self.summary(top_n))
+
+# Profiler of the current run, if --profile was given
+active = None
+
+def stage(name: str):
+    """
+    Attribute profiler samples to a stage while the enclosed block runs (a no-op without --profile).
+    """
+    if active is None:
+        return contextlib.nullcontext()
+    return active.stage(name)
+
+@contextlib.contextmanager
+def profiled(output_prefix: str, interval: float = DEFAULT_INTERVAL, top_n: int = TOP_N, enabled: bool = True):
+    """
+    Profile the enclosed block and write '<output_prefix>.profile.collapsed' and '<output_prefix>.profile.txt'.
+    """
+    global active
+    if not enabled:
+        yield None
+        return
+
+    active = SamplingProfiler(interval)
+    active.start()
+    start = time.perf_counter()
+    try:
+        yield active
+    finally:
+        active.stop()
+        profiler, active = active, None
+        profiler.write_collapsed(f"{output_prefix}.profile.collapsed")
+        profiler.write_summary(f"{output_prefix}.profile.txt", top_n)
+        logging.info(f"Profile of {time.perf_counter() - start:.1f}s written to {output_prefix}.profile.collapsed and {output_prefix}.profile.txt")
+
+def add_profile_args(parser: argparse.ArgumentParser):
+    """
+    Add sampling profiler arguments to the argument parser.
+    """
+    parser.add_argument('--profile', action='store_true', help='Sample the running stages and write collapsed stacks and a hot-function summary')
+    parser.add_argument('--profile-interval', type=float, default=DEFAULT_INTERVAL * 1000, help='Milliseconds between profiler samples')
+    parser.add_argument('--profile-top', type=int, default=TOP_N, help='Number of functions listed in the profile summary')
+    return parser
+
+def profile_kwargs(args: argparse.Namespace) -> dict:
+    """
+    Return profiled() keyword arguments for the arguments added by add_profile_args.
+    """
+    return {'interval': args.profile_interval / 1000, 'top_n': args.profile_top, 'enabled': args.profile}
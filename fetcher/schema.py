@@ -0,0 +1,97 @@
+import argparse
+import hashlib
+
+# How a document field is handled between gather and insert
+INDEX = 'index' # stored and searchable
+STORE = 'store' # stored and returned with results, but not indexed
+DROP = 'drop'   # removed from the records before they are written or imported
+
+MODES = (INDEX, STORE, DROP)
+
+# Typesense field definitions for the page records produced by the DataSource process() methods.
+# `source` and `title_id` are facets for filtering and counting, and `datum` (YYYYMMDD, ANNO only) is an
+# integer so that date ranges can be filtered with `datum:[18200101..18201231]` and results sorted by date.
+FIELDS = [
+    {'name': 'local_path', 'type': 'string'},
+    {'name': 'source', 'type': 'string', 'facet': True},
+    {'name': 'title_id', 'type': 'string', 'facet': True},
+    {'name': 'title_full', 'type': 'string'},
+    {'name': 'datum', 'type': 'int64', 'optional': True, 'sort': True},
+    {'name': 'page_number', 'type': 'string'},
+    {'name': 'remote_path', 'type': 'string'},
+    {'name': 'image_url', 'type': 'string'},
+    {'name': 'ocr_text_original', 'type': 'string', 'locale': 'de'},
+    {'name': 'ocr_text_stripped', 'type': 'string', 'locale': 'de'},
+    {'name': 'encoding', 'type': 'string', 'optional': True},
+]
+
+# The frontend only searches and displays ocr_text_original, so the stripped copy is not kept by default.
+# Paths and URLs are only ever displayed, never searched, so they are stored without an index.
+DEFAULT_PROJECTION = {
+    'local_path': STORE,
+    'remote_path': STORE,
+    'image_url': STORE,
+    'ocr_text_stripped': DROP,
+    'encoding': STORE,
+}
+
+def document_id(local_path: str) -> str:
+    """
+    Return the Typesense document id of a page.
+    It is derived from the page's local path, so it is the same in every run and in pipeline mode,
+    and importing a changed page replaces its earlier document.
+    """
+    return hashlib.sha1(local_path.encode('utf-8')).hexdigest()
+
+def resolve(overrides: dict[str, str] | None = None) -> dict[str, str]:
+    """
+    Return the mode of every known field, applying overrides on top of the defaults.
+    :param overrides: Mapping of field name to 'index', 'store' or 'drop'
+    """
+    projection = {field['name']: INDEX for field in FIELDS}
+    projection.update(DEFAULT_PROJECTION)
+    projection.update(overrides or {})
+    return projection
+
+def project(record: dict, projection: dict[str, str]) -> dict:
+    """
+    Remove the dropped fields from a record.
+    """
+    return {key: value for key, value in record.items() if projection.get(key) != DROP}
+
+def schema_fields(projection: dict[str, str]) -> list[dict]:
+    """
+    Return the Typesense field definitions matching a projection.
+    Dropped fields are left out and stored-only fields are declared with `index: false`.
+    """
+    fields = []
+    for field in FIELDS:
+        mode = projection.get(field['name'], INDEX)
+        if mode == DROP:
+            continue
+        field = dict(field)
+        if mode == STORE:
+            field['index'] = False
+            field['optional'] = True
+            # Faceting and sorting need the field to be indexed
+            field.pop('facet', None)
+            field.pop('sort', None)
+        fields.append(field)
+    return fields
+
+def parse_projection(spec: str) -> dict[str, str]:
+    """
+    Parse a projection given on the command line, e.g. 'ocr_text_stripped=drop,local_path=store'.
+    """
+    overrides = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, _, mode = item.partition('=')
+        name, mode = name.strip(), mode.strip()
+        if name not in {field['name'] for field in FIELDS}:
+            raise argparse.ArgumentTypeError(f"Unknown field '{name}'")
+        if mode not in MODES:
+            raise argparse.ArgumentTypeError(f"Mode for '{name}' must be one of {', '.join(MODES)}")
+        overrides[name] = mode
+    return resolve(overrides)
@@ -0,0 +1,148 @@
+import itertools
+import json
+import os
+import sys
+
+import pytest
+import typesense
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog  # noqa: E402
+
+
+class FakeDocuments:
+    """
+    In-memory stand-in for a Typesense collection's documents endpoint.
+    """
+    _ids = itertools.count()
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.docs = {}
+
+    def import_(self, documents, params=None):
+        action = (params or {}).get('action', 'create')
+        results = []
+        for line in documents.splitlines():
+            if not line.strip():
+                continue
+            doc = json.loads(line)
+            doc_id = str(doc.get('id', next(self._ids)))
+            if action == 'create' and doc_id in self.docs:
+                results.append({'success': False, 'error': f"A document with id {doc_id} already exists."})
+                continue
+            self.docs[doc_id] = doc
+            results.append({'success': True})
+        return '\n'.join(json.dumps(r) for r in results)
+
+    def delete(self, params):
+        filter_by = params['filter_by']
+        assert filter_by.startswith('id:[') and filter_by.endswith(']')
+        ids = [i.strip('` ') for i in filter_by[4:-1].split(',')]
+        deleted = sum(self.docs.pop(i, None) is not None for i in ids)
+        return {'num_deleted': deleted}
+
+
+class FakeCollection:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    @property
+    def documents(self):
+        return self.client.resolve(self.name).documents_store
+
+    def retrieve(self):
+        if self.name not in self.client.collection_store:
+            raise typesense.exceptions.ObjectNotFound(404, 'Not Found')
+        return self.client.collection_store[self.name].schema
+
+    def delete(self):
+        self.retrieve()
+        del self.client.collection_store[self.name]
+
+
+class FakeCollections:
+    def __init__(self, client):
+        self.client = client
+
+    def __getitem__(self, name):
+        return FakeCollection(self.client, name)
+
+    def create(self, schema):
+        name = schema['name']
+        if name in self.client.collection_store or name in self.client.alias_store:
+            raise typesense.exceptions.ObjectAlreadyExists(409, 'Conflict')
+        store = type('Stored', (), {})()
+        store.schema = schema
+        store.documents_store = FakeDocuments(name)
+        self.client.collection_store[name] = store
+        return schema
+
+
+class FakeAlias:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def retrieve(self):
+        if self.name not in self.client.alias_store:
+            raise typesense.exceptions.ObjectNotFound(404, 'Not Found')
+        return {'name': self.name, 'collection_name': self.client.alias_store[self.name]}
+
+    def delete(self):
+        self.retrieve()
+        del self.client.alias_store[self.name]
+
+
+class FakeAliases:
+    def __init__(self, client):
+        self.client = client
+
+    def __getitem__(self, name):
+        return FakeAlias(self.client, name)
+
+    def upsert(self, name, mapping):
+        self.client.alias_store[name] = mapping['collection_name']
+        return {'name': name, **mapping}
+
+
+class FakeTypesense:
+    """
+    Minimal in-memory Typesense client covering the calls made by insert.py.
+    """
+    def __init__(self):
+        self.collection_store = {}
+        self.alias_store = {}
+        self.collections = FakeCollections(self)
+        self.aliases = FakeAliases(self)
+
+    def resolve(self, name):
+        name = self.alias_store.get(name, name)
+        if name not in self.collection_store:
+            raise typesense.exceptions.ObjectNotFound(404, 'Not Found')
+        return self.collection_store[name]
+
+    def documents(self, name='documents'):
+        """
+        Return the documents stored under a collection or alias name, keyed by id.
+        """
+        return self.resolve(name).documents_store.docs
+
+
+@pytest.fixture
+def typesense_client():
+    return FakeTypesense()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Run the test from an empty directory with its own page catalog, as the fetcher runs from its data root.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(catalog, '_catalogs', {})
+    yield tmp_path
+    for page_catalog in catalog._catalogs.values():
+        page_catalog.close()
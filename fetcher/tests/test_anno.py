@@ -0,0 +1,134 @@
+import os
+
+import pytest
+import requests
+
+import anno
+import catalog
+import fetcher
+import utils
+
+BASE = 'https://anno.onb.ac.at'
+TITLE_PAGE = f'{BASE}/cgi-content/anno?apm=0&aid=sam'
+
+
+def year_href(year):
+    return f'/cgi-content/anno?aid=sam&datum={year}&zoom=33'
+
+
+def issue_href(datum):
+    return f'/cgi-content/anno?aid=sam&datum={datum}&zoom=33'
+
+
+def fake_site(pages):
+    """
+    Return a stand-in for utils.get_all_hrefs serving the given hrefs per URL.
+    A value of None fails the request, a missing URL returns no links.
+    """
+    def get_all_hrefs(url, session, match=None):
+        hrefs = pages.get(url, [])
+        if hrefs is None:
+            raise requests.ConnectionError(f"{url} is down")
+        return hrefs
+    return get_all_hrefs
+
+
+def test_failed_and_empty_years_are_not_saved(workdir, monkeypatch):
+    source = anno.AnnoDataSource(cache_backend='none')
+    pages = {
+        TITLE_PAGE: [year_href(1820), year_href(1821), year_href(1822)],
+        BASE + year_href(1820): [issue_href(18200101), issue_href(18200102)],
+        BASE + year_href(1821): None,
+        BASE + year_href(1822): [],
+    }
+    monkeypatch.setattr(utils, 'get_all_hrefs', fake_site(pages))
+
+    assert sorted(source._get_valid_datums('sam')) == [18200101, 18200102]
+    index = source._load_datum_index('data/anno.onb.ac.at/sam/' + anno.DATUM_INDEX_FILENAME)
+    assert list(index['years']) == [BASE + year_href(1820)]
+    assert index['updated'] == 0
+
+    # The next run crawls the missing years again despite the TTL
+    pages[BASE + year_href(1821)] = [issue_href(18210101)]
+    pages[BASE + year_href(1822)] = [issue_href(18220101)]
+    assert sorted(source._get_valid_datums('sam')) == [18200101, 18200102, 18210101, 18220101]
+    index = source._load_datum_index('data/anno.onb.ac.at/sam/' + anno.DATUM_INDEX_FILENAME)
+    assert index['updated'] > 0
+
+
+def test_failed_title_page_keeps_stored_index(workdir, monkeypatch):
+    source = anno.AnnoDataSource(cache_backend='none', datum_index_ttl=0)
+    pages = {
+        TITLE_PAGE: [year_href(1820)],
+        BASE + year_href(1820): [issue_href(18200101)],
+    }
+    monkeypatch.setattr(utils, 'get_all_hrefs', fake_site(pages))
+    assert source._get_valid_datums('sam') == [18200101]
+
+    pages[TITLE_PAGE] = None
+    assert source._get_valid_datums('sam') == [18200101]
+    index = source._load_datum_index('data/anno.onb.ac.at/sam/' + anno.DATUM_INDEX_FILENAME)
+    assert list(index['years']) == [BASE + year_href(1820)]
+
+
+ISSUE = b"[ Seite 1 ]\nErste Seite\n[ Seite 2 ]\nZweite Seite\n"
+
+
+@pytest.mark.parametrize('data, expected', [
+    (ISSUE, [(1, 'Erste Seite'), (2, 'Zweite Seite')]),
+    # Blank text before the first header is not a page
+    (b"\r\n  \n" + ISSUE, [(1, 'Erste Seite'), (2, 'Zweite Seite')]),
+    # Text before the first header is
+    (b"Titelblatt\n" + ISSUE, [(1, 'Titelblatt'), (2, 'Erste Seite'), (3, 'Zweite Seite')]),
+    # Empty pages keep their number
+    (b"[ Seite 1 ]\n[ Seite 2 ]\nZweite Seite\n", [(1, ''), (2, 'Zweite Seite')]),
+    (b"Ohne Kopfzeile", [(1, 'Ohne Kopfzeile')]),
+    (b"", []),
+])
+def test_iter_anno_pages_numbering(data, expected):
+    assert [(number, text) for number, text, _ in utils.iter_anno_pages(data)] == expected
+
+
+@pytest.mark.parametrize('mmap_threshold', [1, utils.MMAP_THRESHOLD])
+def test_iter_anno_file_pages_reads_and_maps_files(tmp_path, mmap_threshold):
+    path = tmp_path / 'issue.raw'
+    path.write_bytes(b"  \n" + ISSUE.replace(b"Zweite", "Zweite Seite für".encode('latin-1')))
+    pages = list(utils.iter_anno_file_pages(str(path), mmap_threshold=mmap_threshold))
+    assert pages == [(1, 'Erste Seite', 'utf-8'), (2, 'Zweite Seite für Seite', 'latin-1')]
+
+
+def test_pipeline_reruns_keep_issues_without_page_files(workdir, typesense_client, monkeypatch):
+    with open('items.yaml', 'w') as file:
+        file.write("anno:\n  title_ids:\n    sam:\n      min: 18500101\n      max: 18500102\n")
+    monkeypatch.setattr(anno.AnnoDataSource, '_get_valid_datums', lambda self, title_id: [18500101, 18500102])
+    downloads = []
+
+    def download_remote_file(url, path, session, **kwargs):
+        downloads.append(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(ISSUE)
+        return True
+    monkeypatch.setattr(utils, 'download_remote_file', download_remote_file)
+
+    def run_pipeline():
+        fetcher.run_pipeline('items.yaml', typesense_client, source_kwargs={'cache_backend': 'none'}, use_alias=True)
+        return sorted(doc['local_path'] for doc in typesense_client.documents().values())
+
+    expected = [f"data/anno.onb.ac.at/sam/{datum}/txt/{page}.txt" for datum in (18500101, 18500102) for page in (1, 2)]
+    assert run_pipeline() == expected
+    assert len(downloads) == 2
+    assert os.path.exists('data/anno.onb.ac.at/sam/18500101/' + anno.ISSUE_FILENAME)
+    assert not os.path.exists('data/anno.onb.ac.at/sam/18500101/txt')
+
+    # The rerun rebuilds the pages from the kept text instead of dropping the issues
+    assert run_pipeline() == expected
+    assert len(downloads) == 2
+
+    # A plain fetch writes the page files from the kept text, and the pipeline then reads those
+    anno.AnnoDataSource(cache_backend='none').fetch('sam', 18500101, 18500102)
+    assert len(downloads) == 2
+    assert not os.path.exists('data/anno.onb.ac.at/sam/18500101/' + anno.ISSUE_FILENAME)
+    assert catalog.get_catalog().pages('data/anno.onb.ac.at/sam') == expected
+    assert run_pipeline() == expected
+    assert len(downloads) == 2
@@ -0,0 +1,64 @@
+import os
+
+import catalog
+
+
+def write(path, text='page'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+
+def open_catalog(tmp_path):
+    return catalog.PageCatalog(str(tmp_path / 'catalog.sqlite'), root=str(tmp_path / 'data'))
+
+
+def test_replace_directory_registers_and_forgets_pages(tmp_path):
+    item = str(tmp_path / 'data' / 'mdz' / 'bsb1' / 'txt')
+    other = str(tmp_path / 'data' / 'mdz' / 'bsb2' / 'txt')
+    write(os.path.join(other, '1.txt'))
+    pages = open_catalog(tmp_path)
+    assert pages.pages() == [os.path.join(other, '1.txt')]
+
+    for name in ['1.txt', '2.txt', 'manifest.json']:
+        write(os.path.join(item, name))
+    write(os.path.join(item, 'nested', '3.txt'))
+    pages.replace_directory(item + '/')
+    assert pages.pages(item) == [os.path.join(item, '1.txt'), os.path.join(item, '2.txt')]
+
+    os.remove(os.path.join(item, '2.txt'))
+    pages.replace_directory(item)
+    assert pages.pages(item) == [os.path.join(item, '1.txt')]
+    assert pages.pages(other) == [os.path.join(other, '1.txt')]
+
+    # A directory that no longer exists loses all its pages
+    os.remove(os.path.join(item, '1.txt'))
+    os.rename(item, item + '.old')
+    pages.replace_directory(item)
+    assert pages.pages(item) == []
+    pages.close()
+
+
+def test_pages_prefix_matches_whole_directory_names(tmp_path):
+    data = tmp_path / 'data' / 'anno.onb.ac.at'
+    paths = [
+        str(data / 'sam' / '18500101' / 'txt' / '1.txt'),
+        str(data / 'sam' / '18500101' / 'txt' / '2.txt'),
+        str(data / 'sam' / 'über' / 'txt' / '1.txt'),
+        str(data / 'sam' / '\U0001d50a' / 'txt' / '1.txt'),
+        str(data / 'sam-extra' / '18500101' / 'txt' / '1.txt'),
+        str(data / 'sam0' / '18500101' / 'txt' / '1.txt'),
+        str(data / 'sammler' / '18500101' / 'txt' / '1.txt'),
+    ]
+    for path in paths:
+        write(path)
+    pages = open_catalog(tmp_path)
+
+    sam = sorted(paths[:4])
+    assert pages.pages(str(data / 'sam')) == sam
+    assert pages.pages(str(data / 'sam') + '/') == sam
+    assert pages.pages(str(data / 'sam' / '.' / '18500101')) == sorted(paths[:2])
+    assert pages.pages(str(data / 'sa')) == []
+    assert pages.pages() == sorted(paths)
+    assert sorted(pages.directories(str(data / 'sam'))) == sorted({os.path.dirname(p) for p in paths[:4]})
+    pages.close()
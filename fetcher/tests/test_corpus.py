@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+
+import pytest
+
+import corpus
+
+
+def records(source, count, text='x'):
+    return [json.dumps({'source': source, 'n': n, 'text': text}, ensure_ascii=False) + '\n' for n in range(count)]
+
+
+def read_corpus(path):
+    lines = []
+    for shard in corpus.resolve_inputs(path):
+        with corpus.open_jsonl(shard) as file:
+            lines.extend(file)
+    return lines
+
+
+def test_unsharded_output_is_the_file_itself(tmp_path):
+    path = str(tmp_path / 'all.jsonl')
+    with corpus.ShardedJsonlWriter(path) as writer:
+        writer.write(records('a', 3))
+
+    assert writer.paths == [path]
+    assert corpus.resolve_inputs(path) == [path]
+    assert read_corpus(path) == records('a', 3)
+
+
+def test_shards_rotate_on_encoded_size(tmp_path):
+    path = str(tmp_path / 'all.jsonl')
+    # Each line is well over 100 bytes once encoded, but not in characters
+    lines = records('a', 4, text='ä' * 40)
+    assert all(len(line) < 100 < len(line.encode('utf-8')) for line in lines)
+
+    with corpus.ShardedJsonlWriter(path, shard_size=100) as writer:
+        for line in lines:
+            writer.write([line])
+
+    assert [os.path.basename(p) for p in writer.paths] == [f'all-{i:05d}.jsonl' for i in range(4)]
+    assert corpus.resolve_inputs(path) == writer.paths
+    assert read_corpus(path) == lines
+
+
+def test_shards_by_source_and_compression(tmp_path):
+    path = str(tmp_path / 'all.jsonl')
+    with corpus.ShardedJsonlWriter(path, compression='gzip', shard_by_source=True) as writer:
+        writer.write(records('anno.onb.ac.at', 2), 'anno.onb.ac.at')
+        writer.write(records('api.digitale-sammlungen.de', 1), 'api.digitale-sammlungen.de')
+
+    assert [os.path.basename(p) for p in writer.paths] == [
+        'all-anno.onb.ac.at-00000.jsonl.gz',
+        'all-api.digitale-sammlungen.de-00000.jsonl.gz',
+    ]
+    with gzip.open(writer.paths[0], 'rt', encoding='utf-8') as file:
+        assert file.readlines() == records('anno.onb.ac.at', 2)
+    assert read_corpus(path) == records('anno.onb.ac.at', 2) + records('api.digitale-sammlungen.de', 1)
+
+
+def test_overwrite_removes_shards_of_earlier_runs(tmp_path):
+    path = str(tmp_path / 'all.jsonl')
+    with corpus.ShardedJsonlWriter(path, shard_size=1) as writer:
+        writer.write(records('a', 1))
+        writer.write(records('a', 1))
+        writer.write(records('a', 1))
+    assert len(writer.paths) == 3
+    # Left behind by an interrupted run that never wrote its listing
+    (tmp_path / 'all-b-00007.jsonl.zst').write_bytes(b'')
+    # Unrelated files next to the corpus are kept
+    (tmp_path / 'all.delta.jsonl').write_text('{}\n')
+    (tmp_path / 'other-00000.jsonl').write_text('{}\n')
+
+    with corpus.ShardedJsonlWriter(path, shard_size=1000) as writer:
+        writer.write(records('a', 1))
+
+    assert sorted(os.listdir(tmp_path)) == ['all-00000.jsonl', 'all.delta.jsonl', 'all.jsonl.shards', 'other-00000.jsonl']
+    assert read_corpus(path) == records('a', 1)
+
+    # Switching back to a single file removes the shards and their listing
+    with corpus.ShardedJsonlWriter(path) as writer:
+        writer.write(records('a', 2))
+    assert sorted(os.listdir(tmp_path)) == ['all.delta.jsonl', 'all.jsonl', 'other-00000.jsonl']
+    assert corpus.resolve_inputs(path) == [path]
+
+
+def test_append_keeps_existing_lines(tmp_path):
+    path = str(tmp_path / 'all.jsonl')
+    with corpus.ShardedJsonlWriter(path) as writer:
+        writer.write(records('a', 1))
+    with corpus.ShardedJsonlWriter(path, mode='a') as writer:
+        writer.write(records('b', 1))
+
+    assert read_corpus(path) == records('a', 1) + records('b', 1)
+
+
+def test_resolve_inputs_without_corpus(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        corpus.resolve_inputs(str(tmp_path / 'missing.jsonl'))
+
+
+def test_delta_filename():
+    assert corpus.delta_filename('data/all.jsonl') == 'data/all.delta.jsonl'
@@ -0,0 +1,149 @@
+import asyncio
+import http.server
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import datasource
+import metrics
+import utils
+
+
+class CountingHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serve a short body slowly, recording the highest number of requests handled at once.
+    """
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        time.sleep(0.05)
+        # Leave before responding, as the client may reuse the connection as soon as it has the body
+        with cls.lock:
+            cls.active -= 1
+        body = b'page'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    handler = type('Handler', (CountingHandler,), {'lock': threading.Lock(), 'active': 0, 'peak': 0})
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_session_caps_connections_per_host(server, tmp_path):
+    session = datasource.create_session(backend='none', pool_size=2)
+    url = f"http://127.0.0.1:{server.server_port}/page"
+
+    # As schedule_titles does: several titles at once, each downloading with several threads
+    def title(index):
+        jobs = [(url, str(tmp_path / f"{index}-{page}.txt")) for page in range(4)]
+        return utils.download_remote_files(jobs, session=session, max_workers=2, desc=f"title {index}")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        failed = list(executor.map(title, range(3)))
+
+    assert failed == [[], [], []]
+    assert len(list(tmp_path.iterdir())) == 12
+    assert server.RequestHandlerClass.peak <= 2
+
+
+def test_per_source_cache_by_default(tmp_path):
+    session = datasource.create_session(namespace='anno.onb.ac.at', cache_dir=str(tmp_path))
+
+    assert session.cache.db_path == tmp_path / 'devel-anno.onb.ac.at.sqlite'
+
+
+def test_existing_shared_cache_is_kept_in_use(tmp_path):
+    shared = datasource.create_session(cache_dir=str(tmp_path))
+    assert len(shared.cache.responses) == 0
+    assert (tmp_path / 'devel.sqlite').exists()
+
+    session = datasource.create_session(namespace='anno.onb.ac.at', cache_dir=str(tmp_path))
+
+    assert session.cache.db_path == tmp_path / 'devel.sqlite'
+
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(1)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_requests_time_out_by_default():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        session = datasource.create_session(backend='none', max_retries=0, timeout=0.2)
+        url = f"http://127.0.0.1:{httpd.server_port}/slow"
+        start = time.perf_counter()
+        with pytest.raises(requests.Timeout):
+            session.get(url)
+        assert time.perf_counter() - start < 0.9
+        assert len(session.failures) == 1
+
+        # A timeout given by the caller still wins
+        assert session.get(url, timeout=5).status_code == 200
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_failure_log_removes_stale_list(tmp_path):
+    path = tmp_path / 'failed-test.tsv'
+    failures = datasource.FailureLog()
+    failures.record('https://example.org/1', 'HTTP 503')
+    failures.write(str(path), 'test')
+    assert path.read_text() == 'https://example.org/1\tHTTP 503\n'
+
+    datasource.FailureLog().write(str(path), 'test')
+    assert not path.exists()
+
+
+def test_async_client_counts_per_source(server, monkeypatch):
+    registry = metrics.Metrics()
+    monkeypatch.setattr(metrics, 'registry', registry)
+    url = f"http://127.0.0.1:{server.server_port}/page"
+    # Nothing listens on the port of a closed server
+    closed = http.server.ThreadingHTTPServer(('127.0.0.1', 0), CountingHandler)
+    closed.server_close()
+    refused = f"http://127.0.0.1:{closed.server_port}/page"
+
+    async def main():
+        async with datasource.AsyncHttpClient(max_retries=1, retry_backoff=0, breaker_threshold=0) as client:
+            await client.get(url, source='anno')
+            await client.get(url, source='mdz')
+            with pytest.raises(requests.ConnectionError):
+                await client.get(refused, source='mdz')
+            return client
+
+    client = asyncio.run(main())
+    client.record_metrics()
+
+    sources = registry.report()['sources']
+    assert sources['anno'] == {'requests': 1, 'bytes_fetched': 4}
+    assert sources['mdz'] == {'requests': 3, 'bytes_fetched': 4, 'retries': 1, 'failed_requests': 1}
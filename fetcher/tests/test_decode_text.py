@@ -0,0 +1,35 @@
+import codecs
+
+import pytest
+
+import utils
+
+TEXT = "Wiener Zeitung\nGrüße aus Österreich – 1848\n"
+
+
+@pytest.mark.parametrize('data, expected', [
+    (b'', ('', 'utf-8')),
+    (b'Wiener Zeitung\n', ('Wiener Zeitung\n', 'utf-8')),
+    (TEXT.encode('utf-8'), (TEXT, 'utf-8')),
+    (codecs.BOM_UTF8 + TEXT.encode('utf-8'), (TEXT, 'utf-8')),
+    (codecs.BOM_UTF8 + b'ASCII after the mark\n', ('ASCII after the mark\n', 'utf-8')),
+    ("Grüße aus Österreich\n".encode('latin-1'), ("Grüße aus Österreich\n", 'latin-1')),
+    # Invalid UTF-8 behind a byte order mark is Latin-1 text like any other
+    (codecs.BOM_UTF8 + "Grüße\n".encode('latin-1'), ("ï»¿Grüße\n", 'latin-1')),
+])
+def test_decode_text_picks_the_encoding(data, expected):
+    assert utils.decode_text(data) == expected
+
+
+@pytest.mark.parametrize('encoding', ['ascii', 'utf-8', 'latin-1'])
+def test_decode_text_normalises_line_endings(encoding):
+    text = "Seite 1\r\nZeile\rEnde\n" if encoding == 'ascii' else "Seite 1\r\nZeile für\rEnde\n"
+    decoded, _ = utils.decode_text(text.encode(encoding))
+    assert decoded == text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def test_read_text_matches_decode_text(tmp_path):
+    path = tmp_path / 'page.txt'
+    path.write_bytes("Grüße\r\n".encode('latin-1'))
+    assert utils.read_text(str(path)) == ("Grüße\n", 'latin-1')
+    assert utils.read_multi_encoding(str(path)) == "Grüße\n"
@@ -0,0 +1,32 @@
+import sys
+
+import pytest
+
+import fetcher
+
+TYPESENSE_ARGS = ['--api-key', 'key', '--typesense-port', '8108', '--typesense-protocol', 'http',
+                  '--typesense-path', '/', '--typesense-fetcher-host', 'localhost']
+
+
+def parse(monkeypatch, *argv):
+    monkeypatch.setattr(sys, 'argv', ['fetcher.py', 'sources.yaml', *argv, *TYPESENSE_ARGS])
+    return fetcher.parse_args()
+
+
+@pytest.mark.parametrize('argv', [
+    ['--pipeline', '--use-alias', '--skip-fetch'],
+    ['--pipeline'],
+    ['--pipeline', '--use-alias', '--async'],
+])
+def test_rejects_invalid_pipeline_arguments(monkeypatch, argv):
+    with pytest.raises(SystemExit):
+        parse(monkeypatch, *argv)
+
+
+@pytest.mark.parametrize('argv', [
+    ['--pipeline', '--use-alias'],
+    ['--pipeline', '--skip-insert'],
+    ['--skip-fetch'],
+])
+def test_accepts_valid_arguments(monkeypatch, argv):
+    parse(monkeypatch, *argv)
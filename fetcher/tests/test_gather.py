@@ -0,0 +1,170 @@
+import json
+import os
+
+import pytest
+
+import catalog
+import corpus
+import fetcher
+import gather
+import insert
+import schema
+
+
+def write_page(datum, page, text, title='sam'):
+    directory = os.path.join('data', 'anno.onb.ac.at', title, str(datum), 'txt')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{page}.txt')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    catalog.get_catalog().replace_directory(directory)
+    return path
+
+
+def remove_page(path):
+    os.remove(path)
+    catalog.get_catalog().replace_directory(os.path.dirname(path))
+
+
+def touch(path, offset_ns):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + offset_ns))
+
+
+def test_gather_state_diff(workdir):
+    kept = write_page(18200101, 1, 'unchanged')
+    touched = write_page(18200101, 2, 'same content')
+    changed = write_page(18200101, 3, 'old')
+    deleted = write_page(18200101, 4, 'gone')
+
+    state = gather.GatherState('data/state.sqlite')
+    new, removed = state.diff(catalog.get_catalog().pages())
+    assert new == [kept, touched, changed, deleted]
+    assert removed == []
+    state.mark_gathered(new)
+    state.apply()
+
+    touch(touched, 10**9)
+    with open(changed, 'w', encoding='utf-8') as file:
+        file.write('new content')
+    touch(changed, 2 * 10**9)
+    os.remove(deleted)
+    added = write_page(18200102, 1, 'added')
+
+    new, removed = state.diff(catalog.get_catalog().pages())
+    assert new == [changed, added]
+    assert removed == [deleted]
+    state.forget(removed)
+    state.mark_gathered(new)
+    assert state.apply() == (2, 1)
+
+    new, removed = state.diff(catalog.get_catalog().pages())
+    assert (new, removed) == ([], [])
+    state.close()
+
+
+def gather_and_update(client, incremental):
+    paths = fetcher.convert_files_to_jsonl('data/all.jsonl', incremental=incremental, state_file='data/state.sqlite', projection=schema.resolve())
+    insert.update(corpus.resolve_inputs(corpus.delta_filename('data/all.jsonl')), client, deleted_file='data/all.jsonl.deleted', state_file='data/state.sqlite')
+    return paths
+
+
+def indexed_texts(client):
+    return {doc['local_path']: doc['ocr_text_original'] for doc in client.documents().values()}
+
+
+def test_incremental_delta_updates_collection_in_place(workdir, typesense_client):
+    first = write_page(18200101, 1, 'first')
+    second = write_page(18200101, 2, 'second')
+
+    gather_and_update(typesense_client, 'delta')
+    assert indexed_texts(typesense_client) == {first: 'first', second: 'second'}
+    collections = set(typesense_client.collection_store)
+
+    with open(first, 'w', encoding='utf-8') as file:
+        file.write('first, corrected')
+    touch(first, 10**9)
+    remove_page(second)
+    third = write_page(18200102, 1, 'third')
+
+    paths = gather_and_update(typesense_client, 'delta')
+
+    assert paths == ['data/all.delta.jsonl']
+    assert not os.path.exists('data/all.jsonl')
+    with open('data/all.delta.jsonl', encoding='utf-8') as file:
+        assert sorted(json.loads(line)['local_path'] for line in file) == [first, third]
+    assert set(typesense_client.collection_store) == collections
+    assert indexed_texts(typesense_client) == {first: 'first, corrected', third: 'third'}
+
+
+def test_incremental_append_keeps_one_document_per_page(workdir, typesense_client):
+    page = write_page(18200101, 1, 'old')
+    gather_and_update(typesense_client, 'append')
+
+    with open(page, 'w', encoding='utf-8') as file:
+        file.write('new')
+    touch(page, 10**9)
+    gather_and_update(typesense_client, 'append')
+
+    with open('data/all.jsonl', encoding='utf-8') as file:
+        assert len(file.readlines()) == 2
+    assert indexed_texts(typesense_client) == {page: 'new'}
+
+    # A full reindex from the appended file keeps the newest record of each page
+    insert.insert('data/all.jsonl', typesense_client, use_alias=True)
+    assert indexed_texts(typesense_client) == {page: 'new'}
+
+
+def test_unapplied_delta_is_folded_into_the_next_one(workdir, typesense_client, monkeypatch):
+    first = write_page(18200101, 1, 'first')
+    second = write_page(18200101, 2, 'second')
+    gather_and_update(typesense_client, 'delta')
+
+    with open(first, 'w', encoding='utf-8') as file:
+        file.write('first, corrected')
+    touch(first, 10**9)
+    remove_page(second)
+
+    # The import fails, e.g. because Typesense is down
+    def import_batch(client, collection, batch):
+        raise ConnectionError("typesense down")
+    with monkeypatch.context() as patch:
+        patch.setattr(insert, 'import_batch', import_batch)
+        with pytest.raises(ConnectionError):
+            gather_and_update(typesense_client, 'delta')
+
+    # A gather with --skip-insert in between must not lose the changes either
+    third = write_page(18200102, 1, 'third')
+    fetcher.convert_files_to_jsonl('data/all.jsonl', incremental='delta', state_file='data/state.sqlite', projection=schema.resolve())
+
+    gather_and_update(typesense_client, 'delta')
+    with open('data/all.delta.jsonl', encoding='utf-8') as file:
+        assert sorted(json.loads(line)['local_path'] for line in file) == [first, third]
+    with open('data/all.jsonl.deleted', encoding='utf-8') as file:
+        assert file.read() == second + '\n'
+    assert indexed_texts(typesense_client) == {first: 'first, corrected', third: 'third'}
+
+    # Once applied, nothing is left over for the next delta
+    gather_and_update(typesense_client, 'delta')
+    with open('data/all.delta.jsonl', encoding='utf-8') as file:
+        assert file.read() == ''
+    with open('data/all.jsonl.deleted', encoding='utf-8') as file:
+        assert file.read() == ''
+
+
+def test_failed_documents_leave_the_delta_pending(workdir, typesense_client, monkeypatch):
+    page = write_page(18200101, 1, 'page')
+    gather_and_update(typesense_client, 'delta')
+    with open(page, 'w', encoding='utf-8') as file:
+        file.write('changed')
+    touch(page, 10**9)
+
+    def import_batch(client, collection, batch):
+        return len(batch), len(batch)
+    with monkeypatch.context() as patch:
+        patch.setattr(insert, 'import_batch', import_batch)
+        fetcher.convert_files_to_jsonl('data/all.jsonl', incremental='delta', state_file='data/state.sqlite', projection=schema.resolve())
+        assert insert.update('data/all.delta.jsonl', typesense_client, state_file='data/state.sqlite') == 1
+
+    gather_and_update(typesense_client, 'delta')
+    assert indexed_texts(typesense_client) == {page: 'changed'}
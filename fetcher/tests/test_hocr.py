@@ -0,0 +1,44 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import utils
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+SAMPLE_HOCR = os.path.join(DATA_DIR, 'sample.hocr')
+# Output of `hocr-lines sample.hocr` from hocr-tools
+SAMPLE_LINES = os.path.join(DATA_DIR, 'sample.lines.txt')
+
+
+def expected_text():
+    with open(SAMPLE_LINES, encoding='utf-8') as file:
+        return file.read()
+
+
+def test_hocr_lines_matches_hocr_tools_output():
+    assert '\n'.join(utils.hocr_lines(SAMPLE_HOCR)) + '\n' == expected_text()
+
+
+def test_hocr_lines_is_independent_of_chunk_size():
+    assert utils.hocr_lines(SAMPLE_HOCR, chunk_size=7) == utils.hocr_lines(SAMPLE_HOCR)
+
+
+@pytest.mark.skipif(shutil.which('hocr-lines') is None, reason="hocr-tools is not installed")
+def test_hocr_lines_matches_live_hocr_tools():
+    output = subprocess.run(['hocr-lines', SAMPLE_HOCR], capture_output=True, check=True).stdout.decode('utf-8')
+    assert '\n'.join(utils.hocr_lines(SAMPLE_HOCR)) + '\n' == output
+
+
+def test_convert_all_hocr_files_in_process_pool(tmp_path):
+    hocr_dir = tmp_path / 'hocr'
+    hocr_dir.mkdir()
+    for name in ('1.hocr', '2.hocr'):
+        shutil.copy(SAMPLE_HOCR, hocr_dir / name)
+
+    failed = utils.convert_all_hocr_files(str(hocr_dir), str(tmp_path / 'txt'), max_workers=2)
+
+    assert failed == []
+    for name in ('1.txt', '2.txt'):
+        assert (tmp_path / 'txt' / name).read_text(encoding='utf-8') == expected_text()
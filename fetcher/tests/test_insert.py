@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import insert
+
+
+def lines(*ids):
+    return [json.dumps({'id': i, 'source': 'test', 'ocr_text': f'page {i}'}) + '\n' for i in ids]
+
+
+def test_alias_reindex_swaps_to_new_collection(typesense_client):
+    insert.insert_lines(lines('a', 'b'), typesense_client, use_alias=True)
+    first = typesense_client.alias_store['documents']
+
+    insert.insert_lines(lines('c'), typesense_client, use_alias=True)
+
+    assert typesense_client.alias_store['documents'] != first
+    assert list(typesense_client.collection_store) == [typesense_client.alias_store['documents']]
+    assert set(typesense_client.documents()) == {'c'}
+
+
+def test_alias_reindex_drops_collection_when_load_raises(typesense_client):
+    insert.insert_lines(lines('a'), typesense_client, use_alias=True)
+    current = typesense_client.alias_store['documents']
+
+    def broken():
+        yield lines('b')[0]
+        raise OSError("truncated input")
+
+    with pytest.raises(OSError):
+        insert.insert_lines(broken(), typesense_client, use_alias=True)
+
+    assert typesense_client.alias_store['documents'] == current
+    assert list(typesense_client.collection_store) == [current]
+
+
+def test_alias_reindex_refuses_empty_import(typesense_client):
+    insert.insert_lines(lines('a'), typesense_client, use_alias=True)
+    current = typesense_client.alias_store['documents']
+
+    with pytest.raises(RuntimeError):
+        insert.insert_lines([], typesense_client, use_alias=True)
+
+    assert typesense_client.alias_store['documents'] == current
+    assert set(typesense_client.documents()) == {'a'}
+
+
+def test_recreate_refuses_existing_alias(typesense_client):
+    insert.insert_lines(lines('a'), typesense_client, use_alias=True)
+
+    with pytest.raises(RuntimeError):
+        insert.insert_lines(lines('b'), typesense_client)
+
+    assert set(typesense_client.documents()) == {'a'}
+
+
+def test_recreate_replaces_collection(typesense_client):
+    insert.insert_lines(lines('a'), typesense_client)
+    insert.insert_lines(lines('b'), typesense_client)
+
+    assert list(typesense_client.collection_store) == ['documents']
+    assert set(typesense_client.documents()) == {'b'}
+
+
+def test_benchmark_stub_client_accepts_imports():
+    benchmark = pytest.importorskip('benchmark')
+    assert insert.import_lines(lines('a', 'b', 'c'), benchmark.NullTypesenseClient(), 'documents', batch_size=2) == (3, 0)
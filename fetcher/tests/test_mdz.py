@@ -0,0 +1,38 @@
+import json
+
+import mdz
+
+
+def canvas(label, hocr=True):
+    canvas = {
+        'label': label,
+        'images': [{'resource': {'@id': f'https://api.example/iiif/{label}/full/full/0/default.jpg'}}],
+    }
+    if hocr:
+        canvas['seeAlso'] = {'@id': f'https://api.example/ocr/{label}.hocr'}
+    return canvas
+
+
+def write_manifest(path, canvases):
+    manifest = {'label': 'Test title', 'sequences': [{'canvases': canvases}]}
+    path.write_text(json.dumps(manifest), encoding='utf-8')
+    return manifest
+
+
+def test_manifest_index_records_canvases_without_hocr(tmp_path):
+    manifest_path = tmp_path / 'manifest.json'
+    write_manifest(manifest_path, [canvas('1'), canvas('2', hocr=False)])
+
+    index = mdz.load_manifest_index(str(manifest_path))
+
+    assert index['title_full'] == 'Test title'
+    assert index['canvases']['1'] == ('https://api.example/ocr/1.hocr', 'https://api.example/iiif/1/full/2400,/0/default.jpg')
+    assert index['canvases']['2'] == (None, 'https://api.example/iiif/2/full/2400,/0/default.jpg')
+
+
+def test_hocr_jobs_skip_canvases_without_hocr(tmp_path):
+    manifest = write_manifest(tmp_path / 'manifest.json', [canvas('1'), canvas('2', hocr=False)])
+
+    jobs = mdz.hocr_jobs(manifest, str(tmp_path))
+
+    assert jobs == [('https://api.example/ocr/1.hocr', str(tmp_path / 'hocr' / '1.hocr'))]
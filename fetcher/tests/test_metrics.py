@@ -0,0 +1,39 @@
+import threading
+import time
+
+import metrics
+
+
+def test_overlapping_timers_count_once():
+    registry = metrics.Metrics()
+    started = threading.Barrier(3)
+
+    def convert():
+        with registry.timer('convert', source='mdz'):
+            started.wait()
+            time.sleep(0.1)
+
+    threads = [threading.Thread(target=convert) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with registry.timer('convert', source='mdz'):
+        time.sleep(0.05)
+
+    seconds = registry.report()['sources']['mdz']['convert_seconds']
+    assert 0.15 <= seconds < 0.3
+
+
+def test_pages_per_s_uses_the_time_of_each_source():
+    registry = metrics.Metrics()
+    registry.observe('gather', 10.0)
+    registry.observe('gather', 2.0, source='anno')
+    registry.inc('records_gathered', 100, source='anno')
+    registry.observe('fetch', 4.0, source='abo')
+    registry.inc('records_gathered', 100, source='abo')
+
+    sources = registry.report()['sources']
+    assert sources['anno']['pages_per_s'] == 50
+    # Pipeline mode has no gather stage: records come out of the fetch
+    assert sources['abo']['pages_per_s'] == 25
@@ -0,0 +1,54 @@
+import threading
+
+import fetcher
+import insert
+
+
+class StubSource:
+    """
+    Data source producing far more records than the pipeline queue holds.
+    """
+    source_id = 'stub'
+
+    def __init__(self, **kwargs):
+        pass
+
+    def fetch_records(self, title_id, page_files=False):
+        for page in range(1000):
+            yield {'local_path': f"data/stub/{title_id}/txt/{page}.txt", 'source': self.source_id, 'ocr_text_original': 'page'}
+
+    def log_cache_stats(self):
+        pass
+
+    def log_failures(self):
+        pass
+
+    def record_metrics(self):
+        pass
+
+
+def test_failed_import_stops_the_pipeline(workdir, typesense_client, monkeypatch):
+    with open('items.yaml', 'w') as file:
+        file.write("stub:\n  title_ids:\n    - a\n    - b\n    - c\n")
+    monkeypatch.setitem(fetcher.FETCHER_CLASSES, 'stub', StubSource)
+
+    def import_batch(client, collection, batch):
+        raise RuntimeError("typesense down")
+    monkeypatch.setattr(insert, 'import_batch', import_batch)
+
+    errors = []
+
+    def run():
+        try:
+            fetcher.run_pipeline('items.yaml', typesense_client, queue_size=4, titles_per_host=3, use_alias=True, batch_size=2)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "run_pipeline did not return after the import failed"
+    assert len(errors) == 1 and isinstance(errors[0], RuntimeError)
+    # The fetch threads gave up as well, instead of blocking on the full queue
+    assert not [t for t in threading.enumerate() if t.name.startswith('ThreadPoolExecutor') and not t.daemon and t.is_alive()]
+    assert typesense_client.collection_store == {}
@@ -0,0 +1,37 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_collapsed_output_only_has_busy_threads(tmp_path):
+    profiler = profiling.SamplingProfiler(interval=0.005)
+    event = threading.Event()
+    waiting = threading.Thread(target=event.wait)
+    waiting.start()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(lambda: None).result()
+        profiler.start()
+        with profiler.stage('gather'):
+            busy = threading.Thread(target=spin, args=(0.3,))
+            busy.start()
+            busy.join()
+        profiler.stop()
+    event.set()
+    waiting.join()
+
+    path = tmp_path / 'run.profile.collapsed'
+    profiler.write_collapsed(str(path))
+    stacks = path.read_text().splitlines()
+    assert stacks
+    assert all(';spin (test_profiling.py:' in line for line in stacks if line.startswith('gather;'))
+    assert not any('wait (threading.py' in line or '_worker (thread.py' in line for line in stacks)
+    assert profiler.idle['gather'] > 0
+    assert 'Idle thread samples per stage (not in the stacks): gather' in profiler.summary()
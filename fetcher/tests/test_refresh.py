@@ -0,0 +1,98 @@
+import os
+
+import requests
+
+import abo
+import mdz
+import utils
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    """
+    Serve one body for every URL, without validators, so changes are detected by content hash.
+    """
+    def __init__(self, content):
+        self.content = content
+
+    def get(self, url, headers=None, **kwargs):
+        return FakeResponse(self.content)
+
+
+def test_revalidate_seeds_legacy_validators(workdir):
+    source = abo.ABODataSource(cache_backend='none', refresh=True)
+    source.session = FakeSession(b'version 1')
+    validators = utils.ValidatorStore('data/validators.json')
+    url = 'https://iiif.example/manifest'
+
+    # Fetched before validators were recorded: seeded, not reported as changed
+    assert source.revalidate(url, validators) is None
+    assert url in validators
+
+    assert source.revalidate(url, validators) is None
+    source.session.content = b'version 2'
+    assert source.revalidate(url, validators).content == b'version 2'
+
+
+def complete_item(item_dir, manifest_url, pages):
+    """
+    Lay out an item fetched completely by an earlier run, with its validators recorded.
+    """
+    journal = utils.DownloadJournal(os.path.join(item_dir, utils.JOURNAL_FILENAME))
+    for directory, name in pages:
+        os.makedirs(os.path.join(item_dir, directory), exist_ok=True)
+        with open(os.path.join(item_dir, directory, name), 'w', encoding='utf-8') as file:
+            file.write('old')
+    journal.mark_complete()
+    validators = utils.ValidatorStore(os.path.join(item_dir, utils.VALIDATORS_FILENAME))
+    validators.remember(manifest_url, b'old manifest')
+    validators.save()
+
+
+def test_abo_refetch_removes_old_pages(workdir, monkeypatch):
+    source = abo.ABODataSource(cache_backend='none', refresh=True)
+    item_dir = os.path.join('data', source.source_id, source.project_id, 'item')
+    complete_item(item_dir, source.manifest_url.format(project=source.project_id, id='item'), [('txt', '0001.txt')])
+    source.session = FakeSession(b'new manifest')
+    downloads = []
+    monkeypatch.setattr(source, '_download_files', lambda item_id, *args, **kwargs: downloads.append((item_id, kwargs['refetch'])))
+
+    source.fetch('item')
+
+    assert downloads == [('item', True)]
+    assert os.listdir(os.path.join(item_dir, 'txt')) == []
+
+
+def test_mdz_refetch_removes_old_hocr_and_pages(workdir, monkeypatch):
+    source = mdz.MDZDataSource(cache_backend='none', refresh=True)
+    item_dir = os.path.join('data', source.source_id, 'item')
+    complete_item(item_dir, source.manifest_url.format(id='item'), [('hocr', '0001.hocr'), ('txt', '0001.txt')])
+    source.session = FakeSession(b'new manifest')
+    monkeypatch.setattr(source, '_download_hocr_files', lambda item_id, **kwargs: [])
+
+    source.fetch('item')
+
+    assert os.listdir(os.path.join(item_dir, 'hocr')) == []
+    assert os.listdir(os.path.join(item_dir, 'txt')) == []
+
+
+def test_unchanged_item_is_not_refetched(workdir, monkeypatch):
+    source = abo.ABODataSource(cache_backend='none', refresh=True)
+    item_dir = os.path.join('data', source.source_id, source.project_id, 'item')
+    complete_item(item_dir, source.manifest_url.format(project=source.project_id, id='item'), [('txt', '0001.txt')])
+    source.session = FakeSession(b'old manifest')
+    monkeypatch.setattr(source, '_download_files', lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("refetched")))
+
+    source.fetch('item')
+
+    assert os.listdir(os.path.join(item_dir, 'txt')) == ['0001.txt']
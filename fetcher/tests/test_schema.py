@@ -0,0 +1,54 @@
+import argparse
+
+import pytest
+
+import schema
+
+
+def fields_by_name(projection):
+    return {field['name']: field for field in schema.schema_fields(projection)}
+
+
+def test_default_projection():
+    fields = fields_by_name(schema.resolve())
+
+    assert 'ocr_text_stripped' not in fields
+    assert fields['ocr_text_original'] == {'name': 'ocr_text_original', 'type': 'string', 'locale': 'de'}
+    assert fields['source'] == {'name': 'source', 'type': 'string', 'facet': True}
+    assert fields['datum'] == {'name': 'datum', 'type': 'int64', 'optional': True, 'sort': True}
+    for name in ('local_path', 'remote_path', 'image_url', 'encoding'):
+        assert fields[name]['index'] is False
+        assert fields[name]['optional'] is True
+
+
+def test_stored_fields_lose_facet_and_sort():
+    fields = fields_by_name(schema.parse_projection('source=store,datum=store'))
+
+    assert fields['source'] == {'name': 'source', 'type': 'string', 'index': False, 'optional': True}
+    assert fields['datum'] == {'name': 'datum', 'type': 'int64', 'index': False, 'optional': True}
+
+
+def test_overrides_index_and_drop():
+    fields = fields_by_name(schema.parse_projection('ocr_text_stripped=index, local_path=drop'))
+
+    assert 'local_path' not in fields
+    assert fields['ocr_text_stripped'] == {'name': 'ocr_text_stripped', 'type': 'string', 'locale': 'de'}
+    # schema_fields does not change the shared field definitions
+    assert 'index' not in schema.FIELDS[0]
+
+
+def test_project_removes_dropped_fields_only():
+    record = {'id': 'abc', 'local_path': 'p', 'ocr_text_original': 'a', 'ocr_text_stripped': 'a', 'extra': 1}
+
+    assert schema.project(record, schema.resolve()) == {'id': 'abc', 'local_path': 'p', 'ocr_text_original': 'a', 'extra': 1}
+
+
+@pytest.mark.parametrize('spec', ['unknown=drop', 'local_path=hide'])
+def test_parse_projection_rejects_invalid_items(spec):
+    with pytest.raises(argparse.ArgumentTypeError):
+        schema.parse_projection(spec)
+
+
+def test_document_id_is_stable():
+    assert schema.document_id('data/a/1.txt') == schema.document_id('data/a/1.txt')
+    assert schema.document_id('data/a/1.txt') != schema.document_id('data/a/2.txt')
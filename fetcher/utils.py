@@ -1,13 +1,21 @@
-import bs4
+import codecs
+import glob
 import os
 import re
 import mistune
+import hashlib
+import json
 import logging
-import subprocess
 import argparse
+import mmap
+import multiprocessing
+import threading
 import requests
+import requests_cache
 from tqdm import tqdm
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from html.parser import HTMLParser
 from requests.exceptions import ConnectionError, HTTPError
 from urllib.parse import urlparse, parse_qs
 
@@ -25,30 +33,172 @@ def extract_hrefs_from_markdown(markdown_file):
     
     as_html = mistune.html(content)
     
-    soup = bs4.BeautifulSoup(as_html, 'html.parser')
-    hrefs = [a.get('href') for a in soup.find_all('a', href=True)]
-    
-    return hrefs
-    
-def hocr_to_txt(hocr_file, txt_file):
-    result = subprocess.run(['hocr-lines', hocr_file], capture_output=True, text=True)
+    return extract_hrefs(as_html)
+
+class HrefParser(HTMLParser):
+    """
+    Streaming parser collecting the href of every <a> element, without building a document tree.
+    """
+
+    def __init__(self, match=None):
+        """
+        :param match: Optional substring or compiled regex an href must contain to be kept
+        """
+        super().__init__(convert_charrefs=True)
+        self.hrefs = []
+        self._match = match
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        for name, value in attrs:
+            if name == 'href':
+                href = value or ''
+                if self._keep(href):
+                    self.hrefs.append(href)
+                return
+
+    def _keep(self, href):
+        if self._match is None:
+            return True
+        if isinstance(self._match, str):
+            return self._match in href
+        return self._match.search(href) is not None
+
+def extract_hrefs(html, match=None) -> list[str]:
+    """
+    Extract the href values of all <a> elements in an HTML string.
+    :param html: HTML content
+    :param match: Optional substring or compiled regex an href must contain to be kept
+    :return: List of hrefs in document order
+    """
+    parser = HrefParser(match=match)
+    parser.feed(html)
+    parser.close()
+    return parser.hrefs
     
-    if result.returncode == 0:
+class HocrLineParser(HTMLParser):
+    """
+    Streaming hOCR parser collecting the text of every ocr_line element in document order,
+    with runs of whitespace collapsed and the ends stripped as hocr-lines does.
+    Unclosed elements inside a line are closed by their parent's end tag, as lxml's HTML parser does.
+    """
+    VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        # Open elements as (tag, index of the line the element starts or None)
+        self._stack = []
+        self._open_lines = {}
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.VOID_ELEMENTS:
+            return
+        index = None
+        if dict(attrs).get('class') == 'ocr_line':
+            index = len(self.lines)
+            self.lines.append('')
+            self._open_lines[index] = []
+        self._stack.append((tag, index))
+
+    def handle_endtag(self, tag):
+        if tag in self.VOID_ELEMENTS or not any(open_tag == tag for open_tag, _ in self._stack):
+            return
+        while self._stack:
+            open_tag, index = self._stack.pop()
+            if index is not None:
+                self.lines[index] = re.sub(r'\s+', ' ', ''.join(self._open_lines.pop(index))).strip()
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        for parts in self._open_lines.values():
+            parts.append(data)
+
+    def close(self):
+        super().close()
+        # Elements left open at the end of the document are closed, as by a recovering parser
+        while self._stack:
+            self.handle_endtag(self._stack[0][0])
+
+def hocr_lines(hocr_file, chunk_size=65536) -> list[str]:
+    """
+    Extract the text of all ocr_line elements in an hOCR file without building a document tree.
+    :param hocr_file: Path to the hOCR file
+    :param chunk_size: Number of characters fed to the parser at a time
+    :return: List of lines
+    """
+    parser = HocrLineParser()
+    with open(hocr_file, 'r', encoding='utf-8', errors='replace') as file:
+        while chunk := file.read(chunk_size):
+            parser.feed(chunk)
+    parser.close()
+    return parser.lines
+
+def hocr_to_txt(hocr_file, txt_file) -> bool:
+    try:
+        lines = hocr_lines(hocr_file)
         with open(txt_file, 'w', encoding='utf-8') as file:
-            file.write(result.stdout)
-        logging.info(f"Converted {hocr_file} to {txt_file}")
-    else:
-        logging.error(f"Error converting {hocr_file}: {result.stderr}")
+            file.writelines(line + '\n' for line in lines)
+    except Exception as e:
+        logging.error(f"Error converting {hocr_file}: {e}")
+        return False
 
-def convert_all_hocr_files(input_dir, output_dir):
+    logging.info(f"Converted {hocr_file} to {txt_file}")
+    return True
+
+def _hocr_to_txt_job(paths):
+    """
+    Convert one (hocr_file, txt_file) pair. Used by ProcessPoolExecutor in convert_all_hocr_files.
+    """
+    hocr_file, txt_file = paths
+    return hocr_file, hocr_to_txt(hocr_file, txt_file)
+
+def process_pool_context():
+    """
+    Return the multiprocessing context for process pools.
+    Pools are started from worker threads (and next to the profiler thread), where forking could copy held locks,
+    so workers are started by a fork server, or spawned where that is not available.
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
+
+def convert_all_hocr_files(input_dir, output_dir, max_workers=None) -> list[str]:
+    """
+    Convert all .hocr files in a directory to .txt files using a process pool.
+    :param input_dir: Directory containing hOCR files
+    :param output_dir: Directory to save TXT files
+    :param max_workers: Number of worker processes (defaults to the number of CPUs)
+    :return: List of hOCR files that failed to convert
+    """
     os.makedirs(output_dir, exist_ok=True)
-    for filename in tqdm(os.listdir(input_dir), desc="Converting hocr"):
+    jobs = []
+    for filename in os.listdir(input_dir):
         if filename.endswith('.hocr'):
             hocr_file = os.path.join(input_dir, filename)
             txt_filename = filename.replace('.hocr', '.txt')
             txt_file = os.path.join(output_dir, txt_filename)
-            
-            hocr_to_txt(hocr_file, txt_file)
+            jobs.append((hocr_file, txt_file))
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=process_pool_context()) as executor:
+        results = executor.map(_hocr_to_txt_job, jobs, chunksize=16)
+        for hocr_file, ok in tqdm(results, total=len(jobs), desc="Converting hocr"):
+            if not ok:
+                failed.append(hocr_file)
+
+    if failed:
+        logging.error(f"{len(failed)} of {len(jobs)} hOCR files failed to convert: {failed}")
+
+    return failed
+
+def remove_files(directory, pattern='*.txt'):
+    """
+    Remove the files matching a glob pattern from a directory, e.g. the pages of an earlier version of an item.
+    """
+    for file_path in glob.glob(os.path.join(glob.escape(directory), pattern)):
+        os.remove(file_path)
 
 def list_directories(path):
     directories = [name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))]
@@ -60,17 +210,27 @@ def get_query_value(url, key):
     value = query_params.get(key, [None])[0]
     return value
 
-def download_remote_file(url, path, session):
+def download_remote_file(url, path, session, **kwargs) -> bool:
+    """
+    Download a remote file, writing to a temporary file that is renamed into place once complete,
+    so an interrupted download never leaves a truncated file at `path`.
+    :param kwargs: Extra keyword arguments for session.get, e.g. refresh_kwargs(session)
+    :return: True if the file was downloaded
+    """
     os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.part'
     
     try:
-        response = session.get(url, stream=True)
-        response.raise_for_status() 
-        
-        with open(path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
+        # Closing the response hands its connection back to the pool even if the download fails halfway
+        with session.get(url, stream=True, **kwargs) as response:
+            response.raise_for_status()
+
+            with open(tmp_path, 'wb') as file:
+                for chunk in response.iter_content(chunk_size=8192):
+                    file.write(chunk)
+        os.replace(tmp_path, path)
         logging.info(f"File downloaded successfully to {path}")
+        return True
     
     except ConnectionError as e:
         logging.error(f"Connection error occurred: {e}")
@@ -79,6 +239,170 @@ def download_remote_file(url, path, session):
     except Exception as e:
         logging.error(f"An error occurred: {e}")
 
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    return False
+
+JOURNAL_FILENAME = ".journal"
+
+class DownloadJournal:
+    """
+    Append-only record of the files of an item that have been downloaded completely,
+    so that an interrupted fetch can be resumed by downloading only what is missing.
+    """
+    COMPLETE = "*complete*"
+
+    def __init__(self, path):
+        """
+        :param path: Path of the journal file, usually <item directory>/.journal
+        """
+        self.path = path
+        self.directory = os.path.dirname(path)
+        self._lock = threading.Lock()
+        self._entries = set()
+
+        # Items downloaded before journals existed: trust the files already on disk
+        self.legacy = not os.path.exists(path) and os.path.isdir(self.directory)
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self._entries = set(line.rstrip('\n') for line in file)
+
+    def is_done(self, file_path) -> bool:
+        if not os.path.exists(file_path):
+            return False
+        return self.legacy or os.path.relpath(file_path, self.directory) in self._entries
+
+    def record(self, file_path):
+        self._append(os.path.relpath(file_path, self.directory))
+
+    def is_complete(self) -> bool:
+        return self.COMPLETE in self._entries
+
+    def mark_complete(self):
+        self._append(self.COMPLETE)
+
+    def _append(self, entry):
+        with self._lock:
+            if entry in self._entries:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(entry + '\n')
+            self._entries.add(entry)
+
+    def reset(self):
+        """Forget all entries, e.g. because the item changed upstream and must be downloaded again."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self._entries = set()
+            self.legacy = False
+
+VALIDATORS_FILENAME = ".validators.json"
+
+class ValidatorStore:
+    """
+    ETag, Last-Modified and content hash per URL, stored as JSON,
+    used to revalidate remote resources with conditional GET requests.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                self._validators = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._validators = {}
+
+    def __contains__(self, url) -> bool:
+        return url in self._validators
+
+    def headers(self, url) -> dict:
+        """Return the conditional request headers for a URL."""
+        validators = self._validators.get(url, {})
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def update(self, url, response) -> bool:
+        """
+        Store the validators of a 200 response.
+        :return: True if the content differs from the previously stored version (or none was stored)
+        """
+        return self.remember(url, response.content, response.headers)
+
+    def remember(self, url, content: bytes, headers=None) -> bool:
+        """
+        Store the content hash and, if given, the ETag and Last-Modified headers of a resource.
+        :return: True if the content differs from the previously stored version (or none was stored)
+        """
+        headers = headers or {}
+        sha1 = hashlib.sha1(content).hexdigest()
+        previous = self._validators.get(url, {}).get('sha1')
+        self._validators[url] = {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'sha1': sha1,
+        }
+        return previous != sha1
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.part'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._validators, file)
+        os.replace(tmp_path, self.path)
+
+def refresh_kwargs(session) -> dict:
+    """
+    Request arguments that make a cached session go to the server and overwrite its cached copy.
+    """
+    return {'force_refresh': True} if isinstance(session, requests_cache.CachedSession) else {}
+
+def conditional_get(url, session, validators: ValidatorStore):
+    """
+    Revalidate a remote resource with If-None-Match / If-Modified-Since, bypassing the HTTP cache.
+    Servers that send no validators are compared by content hash instead.
+    :return: Tuple of (response, changed); the response is a 304 when unchanged
+    """
+    response = session.get(url, headers=validators.headers(url), **refresh_kwargs(session))
+    if response.status_code == 304:
+        return response, False
+    response.raise_for_status()
+    return response, validators.update(url, response)
+
+def download_remote_files(jobs, session, max_workers=4, desc=None, journal=None, **kwargs) -> list[str]:
+    """
+    Download several remote files concurrently, keeping at most max_workers requests in flight.
+    :param jobs: Iterable of (url, path) pairs
+    :param session: Session used for the requests
+    :param max_workers: Maximum number of concurrent downloads
+    :param desc: Description for the progress bar
+    :param journal: Optional DownloadJournal; files it lists are skipped and completed downloads are recorded in it
+    :param kwargs: Extra keyword arguments for session.get
+    :return: List of paths that failed to download
+    """
+    jobs = list(jobs)
+    if journal is not None:
+        jobs = [(url, path) for url, path in jobs if not journal.is_done(path)]
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(download_remote_file, url, path, session, **kwargs): path for url, path in jobs}
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            path = futures[future]
+            if future.result():
+                if journal is not None:
+                    journal.record(path)
+            else:
+                failed.append(path)
+
+    return failed
+
 def delete_file(file_path):
     try:
         os.remove(file_path)
@@ -93,55 +417,101 @@ def delete_file(file_path):
 def remove_newlines(text):
     return text.replace("\n", "")
 
-def split_anno_x_file(file_path, output_dir):
-    content = read_multi_encoding(file_path)
-    
-    header_pattern = re.compile(r'\[\s*.*?Seite\s*\d+\s*\]')
+ANNO_PAGE_HEADER = re.compile(rb'\[\s*.*?Seite\s*\d+\s*\]')
 
-    pages = header_pattern.split(content)
-    
-    if pages[0].strip() == '':
-        pages.pop(0)
+# Issue files at least this large are memory-mapped instead of read into memory
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+def iter_anno_pages(data):
+    """
+    Split the text of a whole ANNO issue at its '[ Seite n ]' headers, one page at a time.
+    The split runs on the raw bytes, so only the pages themselves are ever decoded (see decode_text).
+    :param data: Bytes of the issue, or any buffer such as an mmap
+    :return: Generator of (page_number, text, encoding), numbering pages from 1
+    """
+    def segments():
+        start = 0
+        for match in ANNO_PAGE_HEADER.finditer(data):
+            yield start, match.start()
+            start = match.end()
+        yield start, len(data)
+
+    page_number = 0
+    for start, end in segments():
+        text, encoding = decode_text(data[start:end])
+        text = text.strip()
+        # Text before the first header is only a page of its own if it is not blank
+        if start > 0 or text:
+            page_number += 1
+            yield page_number, text, encoding
+
+def iter_anno_file_pages(file_path, mmap_threshold: int = MMAP_THRESHOLD):
+    """
+    Split a downloaded ANNO issue file into pages, see iter_anno_pages.
+    Large files are memory-mapped, so the whole issue is never held in memory at once.
+    """
+    with open(file_path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size < mmap_threshold:
+            yield from iter_anno_pages(file.read())
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from iter_anno_pages(data)
 
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+def split_anno_x_file(file_path, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
 
-    for i, page in enumerate(pages, start=1):
+    for i, page, _ in iter_anno_file_pages(file_path):
         with open(os.path.join(output_dir, f'{i}.txt'), 'w', encoding='utf-8') as output_file:
-            output_file.write(page.strip())
+            output_file.write(page)
+
+def decode_text(data: bytes) -> tuple[str, str]:
+    """
+    Decode OCR text with the encoding picked from its bytes: ASCII and valid UTF-8 as UTF-8, anything else as Latin-1.
+    The bytes are only decoded a second time for files that turn out not to be UTF-8.
+    Line endings are normalised to '\\n', as when reading in text mode.
+    :return: Tuple of (text, encoding used)
+    """
+    if data.isascii():
+        text, encoding = data.decode('ascii'), 'utf-8'
+    else:
+        # A byte order mark is dropped, but does not make invalid UTF-8 acceptable
+        body = data[len(codecs.BOM_UTF8):] if data.startswith(codecs.BOM_UTF8) else data
+        try:
+            text, encoding = body.decode('utf-8'), 'utf-8'
+        except UnicodeDecodeError:
+            text, encoding = data.decode('latin-1'), 'latin-1'
+
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text, encoding
+
+def read_text(file_path) -> tuple[str, str]:
+    """
+    Read a text file of unknown encoding with a single read.
+    :return: Tuple of (text, encoding used), see decode_text
+    """
+    with open(file_path, 'rb') as file:
+        text, encoding = decode_text(file.read())
+    if encoding != 'utf-8':
+        logging.debug(f"File {file_path} is not UTF-8 encoded, read as {encoding}")
+    return text, encoding
 
 def read_multi_encoding(file_path) -> str:
-    encoding = 'utf-8'
-    content = None
+    """Read a text file of unknown encoding, see read_text."""
+    return read_text(file_path)[0]
 
-    while content is None:
-        try:
-            with open(file_path, 'r', encoding=encoding) as file:
-                content = file.read()
-        except UnicodeDecodeError as e:
-            logging.error(e)
-            logging.error(f"File {file_path} does not appear to be UTF-8 encoded. Trying 'latin-1'...")
-            encoding = 'latin-1' # Try 'latin-1' encoding instead!
-            continue
-        except Exception as e:
-            logging.error(f"Unable to decode file {file_path}.")
-            raise e
-        finally:
-            if encoding == 'latin-1' and content:
-                # Re-encode as utf-8
-                content = content.encode("utf-8", errors="replace").decode('utf-8')
-                logging.info(f"Re-encoded {file_path} as utf-8. Content may not be accurate.")
-
-    return content
-
-def get_all_hrefs(url, session):
+def get_all_hrefs(url, session, match=None):
+    """
+    Get the hrefs of all links on a remote page.
+    :param url: URL of the page
+    :param session: Session used for the request
+    :param match: Optional substring or compiled regex an href must contain to be kept
+    """
     response = session.get(url)
     
     if response.status_code == 200:
-        soup = bs4.BeautifulSoup(response.content, 'html.parser')
-        hrefs = [a.get('href') for a in soup.find_all('a', href=True)]
-        
-        return hrefs
+        return extract_hrefs(response.text, match=match)
     else:
         return []
     